@@ -0,0 +1,29 @@
+"""indice_vagas_veiculo_id
+
+Revision ID: 3c5d1f2a9b47
+Revises: 15820ae1a7d3
+Create Date: 2026-10-18 09:30:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '3c5d1f2a9b47'
+down_revision: Union[str, Sequence[str], None] = '15820ae1a7d3'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Busca direta da vaga ocupada por um veículo (liberação e checagem de duplicidade)
+    op.create_index(op.f('ix_vagas_veiculo_id'), 'vagas', ['veiculo_id'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index(op.f('ix_vagas_veiculo_id'), table_name='vagas')
@@ -0,0 +1,29 @@
+"""indice_vagas_entrada
+
+Revision ID: 5f7b9d3e2c14
+Revises: 8e2a4b6c1d90
+Create Date: 2026-10-18 12:30:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '5f7b9d3e2c14'
+down_revision: Union[str, Sequence[str], None] = '8e2a4b6c1d90'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Busca de vagas com tempo excedido por faixa de entrada
+    op.create_index(op.f('ix_vagas_entrada'), 'vagas', ['entrada'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index(op.f('ix_vagas_entrada'), table_name='vagas')
@@ -0,0 +1,36 @@
+"""indices_paginacao_historico
+
+Revision ID: 8e2a4b6c1d90
+Revises: 3c5d1f2a9b47
+Create Date: 2026-10-18 10:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '8e2a4b6c1d90'
+down_revision: Union[str, Sequence[str], None] = '3c5d1f2a9b47'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Paginação por cursor em (data_evento, id), geral e por matrícula
+    op.create_index('ix_historico_data_evento_id', 'historico', ['data_evento', 'id'], unique=False)
+    op.create_index(
+        'ix_historico_matricula_data_evento_id',
+        'historico',
+        ['matricula', 'data_evento', 'id'],
+        unique=False
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_historico_matricula_data_evento_id', table_name='historico')
+    op.drop_index('ix_historico_data_evento_id', table_name='historico')
@@ -2,29 +2,42 @@ import os
 import pytz
 from datetime import datetime
 
-from flask import Flask, request, jsonify, render_template, redirect, url_for
+from flask import Flask, Response, request, jsonify, render_template, redirect, url_for
 from flask_cors import CORS
 from utils.logger import system_logger
-from utils.metrics import metrics_collector, MetricsMiddleware
+from utils.metrics import metrics_collector, MetricsMiddleware, CONTENT_TYPE_PROMETHEUS
 from utils.rate_limiter import limiter
 
 import os
 from db import SessionLocal, init_db
+from db.consultas import contador_consultas
 from repositories import VagaRepository, VeiculoRepository
 from routes.supervisor_routes import supervisor_bp, login_supervisor as login_supervisor_view
 from routes.funcionarios_routes import funcionarios_bp, login_funcionario as login_funcionario_view
 from routes.veiculos_routes import veiculos_bp
+from routes.eventos_routes import eventos_bp
 from utils.csrf import init_csrf
+from utils.ocupacao_versao import resposta_versionada
+from services import vaga_service
+from services.vaga_allocator import vaga_allocator
+from services.varredor_tempo_excedido import varredor_tempo_excedido
+from utils.serializers import FastJSONProvider
 
 app = Flask(__name__)
+app.json = FastJSONProvider(app)
 CORS(app)
 
 # Middleware de métricas
-app.wsgi_app = MetricsMiddleware(app.wsgi_app, metrics_collector)  # type: ignore
+metrics_middleware = MetricsMiddleware(app.wsgi_app, metrics_collector)
+metrics_middleware.init_app(app)
+app.wsgi_app = metrics_middleware  # type: ignore
 
 # Rate limiter
 limiter.init_app(app)
 
+# Consultas SQL por requisição (X-DB-Queries/X-DB-Time em modo debug)
+contador_consultas.init_app(app)
+
 # Inicialização automática do banco (para ambientes como Render)
 if os.environ.get('AUTO_INIT_DB', '1') == '1':
     try:
@@ -33,6 +46,20 @@ if os.environ.get('AUTO_INIT_DB', '1') == '1':
         # Não derruba a aplicação por falha de criação inicial
         system_logger.error("Falha ao inicializar DB automaticamente", extra={"extra_data": {"erro": str(e)}})
 
+# Montar o alocador de vagas livres a partir da tabela de vagas
+try:
+    _db = SessionLocal()
+    try:
+        vaga_allocator.recarregar(_db)
+    finally:
+        _db.close()
+except Exception as e:
+    # O alocador é recarregado sob demanda no primeiro estacionamento
+    system_logger.error("Falha ao carregar alocador de vagas", extra={"extra_data": {"erro": str(e)}})
+
+# Publicar eventos de tempo excedido (um único worker varre cada janela)
+varredor_tempo_excedido.iniciar()
+
 # Configurar chave secreta para sessão e CSRF
 app.config['SECRET_KEY'] = os.environ.get('SECRET_KEY', 'seu_segredo_super_secreto_aqui')
 
@@ -42,6 +69,7 @@ init_csrf(app)
 app.register_blueprint(supervisor_bp)
 app.register_blueprint(funcionarios_bp)
 app.register_blueprint(veiculos_bp)
+app.register_blueprint(eventos_bp)
 
 # Rotas diretas de fallback para evitar problemas de blueprint em alguns ambientes
 app.add_url_rule(
@@ -78,124 +106,35 @@ def supervisor_sistema():
 @app.route('/vagas-completas', methods=['GET'])
 def listar_vagas_completas():
     """Lista todas as vagas com informações completas"""
-    db = None
-    try:
+    def gerar():
         db = SessionLocal()
-        vaga_repo = VagaRepository(db)
-        
-        # Buscar vagas
         try:
-            vagas = vaga_repo.get_vagas_completas()
-        except Exception as e:
-            print(f"Erro ao buscar vagas: {str(e)}")
-            return jsonify({'mensagem': 'Erro ao buscar vagas no banco de dados'}), 500
-        
-        # Converter para dicionário
-        vagas_completas = []
-        for vaga in vagas:
+            vaga_repo = VagaRepository(db)
+            
+            # Vagas e veículos em um único SELECT
             try:
-                # Informações básicas da vaga
-                # Converter valores das colunas SQLAlchemy
-                try:
-                    numero = vaga.numero.scalar() if hasattr(vaga.numero, 'scalar') else vaga.numero
-                    tipo = vaga.tipo.scalar() if hasattr(vaga.tipo, 'scalar') else vaga.tipo
-                    ocupada = vaga.ocupada.scalar() if hasattr(vaga.ocupada, 'scalar') else vaga.ocupada
-                    entrada = vaga.entrada.scalar() if hasattr(vaga.entrada, 'scalar') else vaga.entrada
-                except Exception as e:
-                    print(f"Erro ao converter valores da vaga: {str(e)}")
-                    numero = None
-                    tipo = 'indefinido'
-                    ocupada = False
-                    entrada = None
-
-                # Converter e validar valores
-                tipo_str = str(tipo) if tipo is not None else 'indefinido'
-                ocupada_bool = False
-                if isinstance(ocupada, bool):
-                    ocupada_bool = ocupada
-                elif hasattr(ocupada, 'scalar'):
-                    try:
-                        ocupada_bool = bool(ocupada.scalar())
-                    except:
-                        ocupada_bool = False
-
-                entrada_str = None
-                if entrada is not None:
-                    if hasattr(entrada, 'isoformat'):
-                        entrada_str = entrada.isoformat()
-                    elif hasattr(entrada, 'scalar'):
-                        try:
-                            entrada_val = entrada.scalar()
-                            if entrada_val and hasattr(entrada_val, 'isoformat'):
-                                entrada_str = entrada_val.isoformat()
-                        except:
-                            entrada_str = None
-
-                vaga_info = {
-                    'numero': numero,
-                    'tipo': tipo_str,
-                    'ocupada': ocupada_bool,
-                    'entrada': entrada_str,
-                    'veiculo': None
-                }
-                
-                # Adicionar informações do veículo se ocupada
-                if ocupada_bool and vaga.veiculo:
-                    # Converter valores das colunas do veículo
-                    def get_value(attr):
-                        """Extrai valor de um atributo SQLAlchemy ou valor normal"""
-                        if attr is None:
-                            return None
-                        try:
-                            if hasattr(attr, 'scalar'):
-                                return attr.scalar()
-                            return attr
-                        except:
-                            return None
-
-                    try:
-                        veiculo_info = {
-                            'placa': get_value(vaga.veiculo.placa),
-                            'proprietario': get_value(vaga.veiculo.nome),
-                            'cpf': get_value(vaga.veiculo.cpf),
-                            'modelo': get_value(vaga.veiculo.modelo),
-                            'bloco': get_value(vaga.veiculo.bloco),
-                            'apartamento': get_value(vaga.veiculo.apartamento)
-                        }
-                        
-                        # Converter valores para string se não forem None
-                        vaga_info['veiculo'] = {
-                            k: str(v) if v is not None else None
-                            for k, v in veiculo_info.items()
-                        }
-                    except Exception as e:
-                        print(f"Erro ao converter valores do veículo: {str(e)}")
-                        vaga_info['veiculo'] = {
-                            'placa': None,
-                            'proprietario': None,
-                            'cpf': None,
-                            'modelo': None,
-                            'bloco': None,
-                            'apartamento': None
-                        }
-                
-                vagas_completas.append(vaga_info)
-                
+                linhas = vaga_repo.get_vagas_com_veiculo()
             except Exception as e:
-                print(f"Erro ao processar vaga {vaga.numero if vaga else 'desconhecida'}: {str(e)}")
-                continue  # Pular vaga com erro e continuar
-        
-        # Verificar se alguma vaga foi processada
-        if not vagas_completas:
-            return jsonify({'mensagem': 'Nenhuma vaga encontrada ou erro ao processar todas as vagas'}), 404
+                print(f"Erro ao buscar vagas: {str(e)}")
+                return {'mensagem': 'Erro ao buscar vagas no banco de dados'}, 500
+            
+            vagas_completas = vaga_service.serializar_vagas_completas(linhas)
             
-        response = {
-            'status': 'success',
-            'total_vagas': len(vagas_completas),
-            'vagas': vagas_completas
-        }
-        system_logger.info("Listagem de vagas completa", extra={"extra_data": {"total_vagas": len(vagas_completas)}})
-        return jsonify(response)
+            # Verificar se alguma vaga foi processada
+            if not vagas_completas:
+                return {'mensagem': 'Nenhuma vaga encontrada ou erro ao processar todas as vagas'}, 404
+            
+            system_logger.info("Listagem de vagas completa", extra={"extra_data": {"total_vagas": len(vagas_completas)}})
+            return {
+                'status': 'success',
+                'total_vagas': len(vagas_completas),
+                'vagas': vagas_completas
+            }, 200
+        finally:
+            db.close()
+    
+    try:
+        return resposta_versionada('vagas-completas', gerar)
         
     except Exception as e:
         print(f"Erro ao carregar vagas completas: {str(e)}")
@@ -204,18 +143,22 @@ def listar_vagas_completas():
             'mensagem': 'Erro interno ao processar vagas',
             'erro': str(e)
         }), 500
-        
-    finally:
-        if db:
-            db.close()
 
 # ---------------------- MÉTRICAS ----------------------
 @app.route('/metrics', methods=['GET'])
 def metrics():
     return jsonify(metrics_collector.get_metrics_summary())
 
+@app.route('/metrics/prometheus', methods=['GET'])
+def metrics_prometheus():
+    """Mesmas métricas no formato de texto do Prometheus"""
+    return Response(metrics_collector.render_prometheus(), content_type=CONTENT_TYPE_PROMETHEUS)
+
 # Rotas de monitoramento
-from utils.monitoring import SystemMonitor
+from utils.monitoring import SystemMonitor, resource_sampler
+
+# Amostragem de recursos em segundo plano: o /status só lê o último retrato
+resource_sampler.iniciar()
 from utils.error_logger import ErrorLogger
 
 @app.route('/healthz', methods=['GET'])
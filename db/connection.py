@@ -1,6 +1,7 @@
 """
 Gerenciamento de conexões com o banco de dados
 """
+import time
 from contextlib import contextmanager
 from sqlalchemy import create_engine, event, text
 from sqlalchemy.orm import sessionmaker, scoped_session
@@ -34,6 +35,22 @@ class DatabaseManager:
                 """Log de conexão estabelecida"""
                 ErrorLogger.log_info('DATABASE', 'Conexão estabelecida com o banco')
             
+            # Instrumentação: quantidade e tempo das consultas por requisição
+            from db.consultas import contador_consultas
+            
+            @event.listens_for(self.engine, 'before_cursor_execute')
+            def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+                # No contexto da execução: um statement que falha não chega ao
+                # after_cursor_execute e não deixa resíduo na conexão do pool
+                if context is not None:
+                    context._inicio_consulta = time.perf_counter()
+            
+            @event.listens_for(self.engine, 'after_cursor_execute')
+            def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+                inicio = getattr(context, '_inicio_consulta', None)
+                if inicio is not None:
+                    contador_consultas.registrar(statement, time.perf_counter() - inicio)
+            
             # pool_pre_ping já garante validação da conexão. Removemos pings
             # específicos de driver (psycopg3 não expõe "ping").
     
@@ -0,0 +1,152 @@
+"""
+Contagem de consultas SQL por requisição e log de consultas lentas
+"""
+import threading
+from collections import Counter
+from contextlib import contextmanager
+from typing import Iterator, List, Optional, Tuple
+from config import active_config
+from utils.logger import setup_logger
+from utils.metrics import metrics_collector
+
+logger = setup_logger(__name__)
+
+# Limites dos histogramas por requisição (quantidade de consultas)
+BUCKETS_CONSULTAS = (1, 2, 3, 5, 8, 13, 21, 34, 55, 89, 144)
+
+class NMaisUmDetectado(AssertionError):
+    """A mesma consulta se repetiu numa requisição além do limite da guarda"""
+
+class _Requisicao:
+    """Totais da requisição em andamento na thread"""
+    __slots__ = ('quantidade', 'tempo', 'statements')
+
+    def __init__(self, guardar_statements: bool = False):
+        self.quantidade = 0
+        self.tempo = 0.0
+        self.statements: Optional[Counter] = Counter() if guardar_statements else None
+
+class ContadorConsultas:
+    """Acumula as consultas executadas pelo engine durante cada requisição.
+
+    ``DatabaseManager`` chama ``registrar`` a cada execução de cursor. Entre
+    ``iniciar`` e ``finalizar`` (hooks do Flask) os totais ficam numa
+    variável por thread; fora de requisições (threads de fundo) só o total
+    global e o log de consultas lentas são atualizados.
+
+    Com ``ativar_guarda`` (testes e scripts), uma requisição que executa o
+    mesmo statement mais de ``limite_repeticoes`` vezes — a assinatura de um
+    N+1, como acessar ``Vaga.veiculo`` dentro de um laço — levanta
+    ``NMaisUmDetectado``.
+    """
+    def __init__(self, limite_lenta_ms: float = 200):
+        self.limite_lenta = limite_lenta_ms / 1000
+        self.limite_repeticoes: Optional[int] = None
+        self._local = threading.local()
+
+    def ativar_guarda(self, limite_repeticoes: int = 5):
+        self.limite_repeticoes = limite_repeticoes
+
+    def desativar_guarda(self):
+        self.limite_repeticoes = None
+
+    def iniciar(self):
+        self._local.requisicao = _Requisicao(guardar_statements=self.limite_repeticoes is not None)
+
+    def finalizar(self) -> Optional[Tuple[int, float]]:
+        """Encerra a requisição atual e retorna (quantidade, segundos)"""
+        requisicao = getattr(self._local, 'requisicao', None)
+        self._local.requisicao = None
+        if requisicao is None:
+            return None
+        return requisicao.quantidade, requisicao.tempo
+
+    def atual(self) -> Tuple[int, float]:
+        """Totais da requisição em andamento, sem encerrá-la"""
+        requisicao = getattr(self._local, 'requisicao', None)
+        if requisicao is None:
+            return 0, 0.0
+        return requisicao.quantidade, requisicao.tempo
+
+    @contextmanager
+    def capturar(self) -> Iterator[List[str]]:
+        """Coleta os statements executados nesta thread dentro do bloco"""
+        capturas = getattr(self._local, 'capturas', None)
+        if capturas is None:
+            capturas = self._local.capturas = []
+        statements: List[str] = []
+        capturas.append(statements)
+        try:
+            yield statements
+        finally:
+            capturas.remove(statements)
+
+    def verificar_repeticoes(self, requisicao: '_Requisicao'):
+        """Levanta NMaisUmDetectado se algum statement passou do limite da guarda"""
+        if self.limite_repeticoes is None or not requisicao.statements:
+            return
+        statement, vezes = requisicao.statements.most_common(1)[0]
+        if vezes > self.limite_repeticoes:
+            raise NMaisUmDetectado(
+                f"{vezes} execuções do mesmo statement em {_rota_atual()} "
+                f"(limite {self.limite_repeticoes}): {' '.join(statement.split())[:300]}"
+            )
+
+    def registrar(self, statement: str, duracao: float):
+        requisicao = getattr(self._local, 'requisicao', None)
+        if requisicao is not None:
+            requisicao.quantidade += 1
+            requisicao.tempo += duracao
+            if requisicao.statements is not None:
+                requisicao.statements[statement] += 1
+        for statements in getattr(self._local, 'capturas', None) or ():
+            statements.append(statement)
+        metrics_collector.increment_counter('db_queries_total')
+
+        if duracao >= self.limite_lenta:
+            metrics_collector.increment_counter('db_slow_queries_total')
+            logger.warning(
+                f"Consulta lenta ({duracao * 1000:.0f} ms) em {_rota_atual()}: "
+                f"{' '.join(statement.split())[:500]}"
+            )
+
+    def init_app(self, app):
+        """Registra os hooks que delimitam cada requisição"""
+        from flask import request
+
+        @app.before_request
+        def _iniciar_contagem_consultas():
+            self.iniciar()
+
+        @app.after_request
+        def _registrar_consultas(response):
+            requisicao = getattr(self._local, 'requisicao', None)
+            totais = self.finalizar()
+            if totais is None:
+                return response
+            self.verificar_repeticoes(requisicao)
+            quantidade, tempo = totais
+            labels = {'endpoint': request.url_rule.rule if request.url_rule else '<sem_rota>'}
+            metrics_collector.record_histogram('db_queries_per_request', quantidade, labels)
+            metrics_collector.record_histogram('db_time_per_request_seconds', tempo, labels)
+            if app.debug or active_config.DEBUG:
+                response.headers['X-DB-Queries'] = str(quantidade)
+                response.headers['X-DB-Time'] = f"{tempo * 1000:.1f}ms"
+            return response
+
+        @app.teardown_request
+        def _descartar_contagem_consultas(exc=None):
+            # Requisições que terminaram em exceção não passam pelo after_request
+            self._local.requisicao = None
+
+def _rota_atual() -> str:
+    from flask import has_request_context, request
+    if not has_request_context():
+        return 'segundo plano'
+    rota = request.url_rule.rule if request.url_rule else request.path
+    return f"{request.method} {rota}"
+
+metrics_collector.set_buckets('db_queries_per_request', BUCKETS_CONSULTAS)
+
+# Instância global
+contador_consultas = ContadorConsultas(limite_lenta_ms=active_config.SQL_CONSULTA_LENTA_MS)
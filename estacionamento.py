@@ -2,17 +2,54 @@
 Lógica de negócio principal do Sistema de Estacionamento Rotativo
 """
 from datetime import datetime
+from typing import Optional
 import pytz
 from sqlalchemy.orm import Session
 from config import active_config
 from utils.logging_config import setup_logger, log_operation, log_error
 from models import Veiculo, Vaga, Funcionario
-from repositories import VeiculoRepository, VagaRepository, FuncionarioRepository, HistoricoRepository
+from repositories import VeiculoRepository, VagaRepository, FuncionarioRepository, HistoricoRepository, unit_of_work, ao_desfazer
 from services.veiculo_service import normalizar_placa
+from services.vaga_allocator import vaga_allocator
+from utils.ocupacao_versao import ocupacao_versao
+from utils.eventos import event_log
 
 # Configurar logger
 logger = setup_logger(__name__)
 
+def _reservar_vaga(db: Session, tipo: str, veiculo_id: int) -> Optional[Vaga]:
+    """Reserva uma vaga livre do tipo, usando o alocador em memória como sugestão"""
+    vaga_repo = VagaRepository(db)
+    if not vaga_allocator.carregado:
+        vaga_allocator.recarregar(db)
+    
+    numero = vaga_allocator.proxima_livre(tipo)
+    if numero is not None:
+        vaga = vaga_repo.reservar_vaga(tipo, veiculo_id, numero=numero)
+        if vaga:
+            # Se o estacionamento for desfeito, a vaga volta ao heap
+            ao_desfazer(db, lambda: vaga_allocator.marcar_livre(tipo, numero))
+            return vaga
+    
+    # Sugestão tomada por outro worker ou heap vazio: escolher direto no banco
+    vaga = vaga_repo.reservar_vaga(tipo, veiculo_id)
+    if vaga:
+        vaga_allocator.marcar_ocupada(tipo, vaga.numero)
+        numero_banco = vaga.numero
+        ao_desfazer(db, lambda: vaga_allocator.marcar_livre(tipo, numero_banco))
+        if vaga_allocator.total_livres(tipo) == 0:
+            # O heap deste worker ficou desatualizado
+            vaga_allocator.recarregar(db)
+    return vaga
+
+def _notificar_ocupacao(tipo: str, dados: dict):
+    """Avança a versão de ocupação e publica o evento para os clientes SSE"""
+    ocupacao_versao.incrementar()
+    try:
+        event_log.publicar(tipo, dados)
+    except Exception as e:
+        logger.warning(f"Erro ao publicar evento '{tipo}': {e}")
+
 def estacionar_veiculo(db: Session, placa: str) -> str:
     """Estaciona um veículo em uma vaga disponível"""
     try:
@@ -26,33 +63,34 @@ def estacionar_veiculo(db: Session, placa: str) -> str:
             return active_config.Mensagens.VEICULO_NAO_CADASTRADO
         
         # Verificar se já está estacionado
-        vagas_ocupadas = vaga_repo.get_vagas_ocupadas()
-        if any(bool(v.veiculo) and v.veiculo.placa == placa for v in vagas_ocupadas):
+        if vaga_repo.get_by_veiculo_id(veiculo.id):
             return active_config.Mensagens.VEICULO_JA_ESTACIONADO
         
         tipo_vaga = "comum" if str(veiculo.tipo) == "morador" else "visitante"
-        vagas_livres = vaga_repo.get_vagas_livres(tipo_vaga)
         
-        if not vagas_livres:
-            return active_config.Mensagens.VAGA_NAO_DISPONIVEL.format(tipo=tipo_vaga)
+        # Reserva da vaga e histórico confirmados em um único commit
+        with unit_of_work(db):
+            vaga = _reservar_vaga(db, tipo_vaga, veiculo.id)
+            if not vaga:
+                return active_config.Mensagens.VAGA_NAO_DISPONIVEL.format(tipo=tipo_vaga)
+            numero = vaga.numero
+            
+            # Registrar no histórico
+            historico_repo.registrar_entrada(
+                placa=placa,
+                nome=str(veiculo.nome),
+                tipo=str(veiculo.tipo),
+                vaga_numero=numero,
+                funcionario_nome="Sistema",  # TODO: Passar funcionário
+                matricula="0000"  # TODO: Passar matrícula
+            )
         
-        vaga = vagas_livres[0]  # Pega a primeira vaga livre
-        vaga_repo.ocupar_vaga(vaga, veiculo.id)
+        _notificar_ocupacao('entrada', {'placa': placa, 'vaga': numero, 'tipo': tipo_vaga})
         
-        # Registrar no histórico
-        historico_repo.registrar_entrada(
-            placa=placa,
-            nome=str(veiculo.nome),
-            tipo=str(veiculo.tipo),
-            vaga_numero=vaga.numero,
-            funcionario_nome="Sistema",  # TODO: Passar funcionário
-            matricula="0000"  # TODO: Passar matrícula
-        )
-        
-        log_operation(logger, f"Veículo {placa} estacionado na vaga {vaga.numero}")
+        log_operation(logger, f"Veículo {placa} estacionado na vaga {numero}")
         return active_config.Mensagens.VEICULO_ESTACIONADO.format(
             placa=placa,
-            numero=vaga.numero,
+            numero=numero,
             tipo=tipo_vaga
         )
         
@@ -71,8 +109,11 @@ def estacionar_veiculo_por_dados(db: Session, placa: str) -> str:
     
     return estacionar_veiculo(db, placa)
 
-def liberar_vaga(db: Session, placa: str, matricula: str) -> str:
-    """Libera uma vaga ocupada por um veículo"""
+def liberar_vaga(db: Session, placa: str, matricula: str, nome_funcionario: Optional[str] = None) -> str:
+    """Libera uma vaga ocupada por um veículo.
+
+    ``nome_funcionario`` vem da sessão de login e dispensa a busca do funcionário.
+    """
     try:
         placa = normalizar_placa(placa)
         veiculo_repo = VeiculoRepository(db)
@@ -81,16 +122,17 @@ def liberar_vaga(db: Session, placa: str, matricula: str) -> str:
         historico_repo = HistoricoRepository(db)
         
         veiculo = veiculo_repo.get_by_placa(placa)
-        funcionario = funcionario_repo.get_by_matricula(matricula)
-        
         if not veiculo:
             return active_config.Mensagens.VEICULO_NAO_CADASTRADO
-        if not funcionario:
-            return active_config.Mensagens.FUNCIONARIO_NAO_ENCONTRADO
+        
+        if not nome_funcionario:
+            funcionario = funcionario_repo.get_identidade(matricula)
+            if not funcionario:
+                return active_config.Mensagens.FUNCIONARIO_NAO_ENCONTRADO
+            nome_funcionario = funcionario.nome
         
         # Buscar vaga ocupada pelo veículo
-        vagas_ocupadas = vaga_repo.get_vagas_ocupadas()
-        vaga = next((v for v in vagas_ocupadas if v.veiculo and v.veiculo.placa == placa), None)
+        vaga = vaga_repo.get_by_veiculo_id(veiculo.id)
         
         if not vaga:
             return "❌ Veículo não encontrado em nenhuma vaga ocupada."
@@ -101,24 +143,28 @@ def liberar_vaga(db: Session, placa: str, matricula: str) -> str:
             logger.warning(f"Erro ao processar data de entrada para vaga {vaga.numero}: {e}")
             tempo = 0
         
-        # Registrar saída no histórico
-        historico_repo.registrar_saida(
-            placa=placa,
-            nome=str(veiculo.nome),
-            tipo=str(veiculo.tipo),
-            vaga_numero=vaga.numero,
-            tempo_min=tempo,
-            funcionario_nome=str(funcionario.nome),
-            matricula=matricula
-        )
+        numero, tipo_vaga = vaga.numero, vaga.tipo
+        
+        # Histórico e liberação confirmados em um único commit
+        with unit_of_work(db):
+            historico_repo.registrar_saida(
+                placa=placa,
+                nome=str(veiculo.nome),
+                tipo=str(veiculo.tipo),
+                vaga_numero=numero,
+                tempo_min=tempo,
+                funcionario_nome=nome_funcionario,
+                matricula=matricula
+            )
+            vaga_repo.liberar_vaga(vaga)
         
-        # Liberar a vaga
-        vaga_repo.liberar_vaga(vaga)
+        vaga_allocator.marcar_livre(tipo_vaga, numero)
+        _notificar_ocupacao('saida', {'placa': placa, 'vaga': numero, 'tipo': tipo_vaga, 'tempo_min': tempo})
         
-        log_operation(logger, f"Veículo {placa} liberado da vaga {vaga.numero} por {funcionario.nome}")
+        log_operation(logger, f"Veículo {placa} liberado da vaga {numero} por {nome_funcionario}")
         return active_config.Mensagens.VEICULO_LIBERADO.format(
             placa=placa,
-            numero=vaga.numero,
+            numero=numero,
             tempo=tempo
         )
         
@@ -126,7 +172,7 @@ def liberar_vaga(db: Session, placa: str, matricula: str) -> str:
         log_error(logger, e, f"liberação de vaga para veículo {placa}")
         return active_config.Mensagens.ERRO_INTERNO
 
-def remover_veiculo_por_cpf(db: Session, cpf: str, matricula: str) -> str:
+def remover_veiculo_por_cpf(db: Session, cpf: str, matricula: str, nome_funcionario: Optional[str] = None) -> str:
     """Remove um veículo do sistema baseado no CPF"""
     try:
         from services.veiculo_service import normalizar_cpf
@@ -138,38 +184,53 @@ def remover_veiculo_por_cpf(db: Session, cpf: str, matricula: str) -> str:
         historico_repo = HistoricoRepository(db)
         
         veiculos = veiculo_repo.get_by_cpf(cpf_normalizado)
-        funcionario = funcionario_repo.get_by_matricula(matricula)
-        
         if not veiculos:
             return "❌ Nenhum veículo encontrado com este CPF."
-        if not funcionario:
-            return active_config.Mensagens.FUNCIONARIO_NAO_ENCONTRADO
         
-        for veiculo in veiculos:
-            # Verificar se está estacionado
-            vagas_ocupadas = vaga_repo.get_vagas_ocupadas()
-            vaga = next((v for v in vagas_ocupadas if v.veiculo and v.veiculo.id == veiculo.id), None)
-            
-            # Liberar vaga se estiver ocupada
-            if vaga:
-                vaga_repo.liberar_vaga(vaga)
-            
-            # Registrar no histórico
-            historico_repo.create_from_dict({
-                'acao': "remocao_manual",
-                'placa': veiculo.placa,
-                'nome': str(veiculo.nome),
-                'tipo': str(veiculo.tipo),
-                'funcionario_nome': str(funcionario.nome),
-                'matricula': matricula
-            })
-            
-            # Remover veículo
-            veiculo_repo.delete(veiculo.id)
-            
-            log_operation(logger, f"Veículo {veiculo.placa} removido por CPF {cpf_normalizado} por {funcionario.nome}")
+        if not nome_funcionario:
+            funcionario = funcionario_repo.get_identidade(matricula)
+            if not funcionario:
+                return active_config.Mensagens.FUNCIONARIO_NAO_ENCONTRADO
+            nome_funcionario = funcionario.nome
+        vagas_liberadas = []
+        placas_removidas = []
+        
+        # Todos os veículos do CPF são removidos em uma única transação
+        with unit_of_work(db):
+            for veiculo in veiculos:
+                # Verificar se está estacionado
+                vaga = vaga_repo.get_by_veiculo_id(veiculo.id)
+                
+                # Liberar vaga se estiver ocupada
+                if vaga:
+                    vaga_repo.liberar_vaga(vaga)
+                    vagas_liberadas.append((vaga.tipo, vaga.numero))
+                
+                # Registrar no histórico
+                historico_repo.create_from_dict({
+                    'acao': "remocao_manual",
+                    'placa': veiculo.placa,
+                    'nome': str(veiculo.nome),
+                    'tipo': str(veiculo.tipo),
+                    'funcionario_nome': nome_funcionario,
+                    'matricula': matricula
+                })
+                
+                # Remover veículo
+                veiculo_repo.delete_obj(veiculo)
+                placas_removidas.append(veiculo.placa)
+        
+        for tipo_vaga, numero in vagas_liberadas:
+            vaga_allocator.marcar_livre(tipo_vaga, numero)
+        _notificar_ocupacao('remocao', {
+            'placas': placas_removidas,
+            'vagas': [numero for _, numero in vagas_liberadas]
+        })
+        
+        for placa in placas_removidas:
+            log_operation(logger, f"Veículo {placa} removido por CPF {cpf_normalizado} por {nome_funcionario}")
         
-        return f"🗑️ Veículo(s) removido(s) por {funcionario.nome}."
+        return f"🗑️ Veículo(s) removido(s) por {nome_funcionario}."
         
     except Exception as e:
         log_error(logger, e, f"remoção de veículo por CPF {cpf}")
@@ -181,18 +242,18 @@ def registrar_entrada(db: Session, matricula: str) -> str:
         funcionario_repo = FuncionarioRepository(db)
         historico_repo = HistoricoRepository(db)
         
-        funcionario = funcionario_repo.get_by_matricula(matricula)
+        funcionario = funcionario_repo.get_identidade(matricula)
         if not funcionario:
             return active_config.Mensagens.FUNCIONARIO_NAO_ENCONTRADO
         
         historico_repo.create_from_dict({
             'acao': "login",
             'placa': "N/A",
-            'nome': str(funcionario.nome),
+            'nome': funcionario.nome,
             'tipo': "funcionario",
-            'funcionario_nome': str(funcionario.nome),
+            'funcionario_nome': funcionario.nome,
             'matricula': matricula
-        })
+        }, sincrono=False)
         
         log_operation(logger, f"Login registrado para funcionário {funcionario.nome}")
         return active_config.Mensagens.LOGIN_REALIZADO.format(nome=funcionario.nome)
@@ -207,18 +268,18 @@ def registrar_saida(db: Session, matricula: str) -> str:
         funcionario_repo = FuncionarioRepository(db)
         historico_repo = HistoricoRepository(db)
         
-        funcionario = funcionario_repo.get_by_matricula(matricula)
+        funcionario = funcionario_repo.get_identidade(matricula)
         if not funcionario:
             return active_config.Mensagens.FUNCIONARIO_NAO_ENCONTRADO
         
         historico_repo.create_from_dict({
             'acao': "logout",
             'placa': "N/A",
-            'nome': str(funcionario.nome),
+            'nome': funcionario.nome,
             'tipo': "funcionario",
-            'funcionario_nome': str(funcionario.nome),
+            'funcionario_nome': funcionario.nome,
             'matricula': matricula
-        })
+        }, sincrono=False)
         
         log_operation(logger, f"Logout registrado para funcionário {funcionario.nome}")
         return active_config.Mensagens.LOGOUT_REALIZADO.format(nome=funcionario.nome)
@@ -30,8 +30,15 @@ tmp_upload_dir = None
 
 # Hooks de processo
 def on_starting(server):
-    """Executado quando o servidor está iniciando"""
-    pass
+    """Executado quando o servidor está iniciando: ativa as métricas multiprocesso
+    e descarta os retratos da execução anterior (counters recomeçam do zero)"""
+    import shutil
+    import tempfile
+    os.environ.setdefault("METRICAS_MULTIPROCESSO", "1")
+    diretorio = os.environ.setdefault(
+        "METRICAS_DIR", os.path.join(tempfile.gettempdir(), "estacionamento_metricas")
+    )
+    shutil.rmtree(diretorio, ignore_errors=True)
 
 def on_reload(server):
     """Executado em reload do código"""
@@ -41,6 +48,13 @@ def on_exit(server):
     """Executado quando o servidor está encerrando"""
     pass
 
+def worker_exit(server, worker):
+    """Executado no worker ao encerrar: grava o histórico ainda em buffer e as métricas"""
+    from repositories.historico_buffer import historico_buffer
+    from utils.metrics import metrics_collector
+    historico_buffer.encerrar()
+    metrics_collector.gravar_retrato()
+
 # Configurações de SSL (se necessário)
 # keyfile = "/path/to/keyfile"
 # certfile = "/path/to/certfile"
@@ -39,7 +39,7 @@ def check():
         click.echo(f'❌ Banco de dados: {db_status["message"]}')
     
     # Verifica recursos do sistema
-    resources = SystemMonitor.check_system_resources()
+    resources = SystemMonitor.check_system_resources(interval=1)
     if resources['status'] == 'ok':
         click.echo('\n📊 Recursos do Sistema:')
         click.echo(f'   CPU: {resources["resources"]["cpu_percent"]}%')
@@ -1,12 +1,17 @@
 """
 Modelo de Histórico
 """
-from sqlalchemy import Column, Integer, String, DateTime
+from sqlalchemy import Column, Integer, String, DateTime, Index
 from datetime import datetime
 from .base_model import BaseModel
 
 class Historico(BaseModel):
     __tablename__ = 'historico'
+    __table_args__ = (
+        # Paginação por cursor em (data_evento, id), geral e por matrícula
+        Index('ix_historico_data_evento_id', 'data_evento', 'id'),
+        Index('ix_historico_matricula_data_evento_id', 'matricula', 'data_evento', 'id'),
+    )
 
     id = Column(Integer, primary_key=True)
     acao = Column(String(50), nullable=False)  # entrada, saida, cadastro, etc
@@ -12,8 +12,8 @@ class Vaga(BaseModel):
     numero = Column(Integer, unique=True, nullable=False, index=True)
     tipo = Column(String(20), nullable=False)  # comum ou visitante
     ocupada = Column(Boolean, default=False, nullable=False)
-    veiculo_id = Column(Integer, ForeignKey('veiculos.id'), nullable=True)
-    entrada = Column(DateTime(timezone=True), nullable=True)
+    veiculo_id = Column(Integer, ForeignKey('veiculos.id'), nullable=True, index=True)
+    entrada = Column(DateTime(timezone=True), nullable=True, index=True)
 
     # Relacionamento com Veículo
     veiculo = relationship("Veiculo", backref="vaga_atual", uselist=False)
@@ -1,14 +1,18 @@
 """
 Repositórios do Sistema de Estacionamento Rotativo
 """
+from .base_repo import unit_of_work, ao_desfazer
 from .veiculo_repo import VeiculoRepository
 from .vaga_repo import VagaRepository
-from .funcionario_repo import FuncionarioRepository
+from .funcionario_repo import FuncionarioRepository, IdentidadeFuncionario
 from .historico_repo import HistoricoRepository
 
 __all__ = [
     'VeiculoRepository',
     'VagaRepository',
     'FuncionarioRepository',
-    'HistoricoRepository'
+    'IdentidadeFuncionario',
+    'HistoricoRepository',
+    'unit_of_work',
+    'ao_desfazer'
 ]
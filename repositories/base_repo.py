@@ -1,17 +1,154 @@
 """
 Repositório base com operações comuns
 """
-from typing import TypeVar, Generic, Type, List, Optional
-from sqlalchemy.orm import Session
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Callable, TypeVar, Generic, Type, List, Optional
+from sqlalchemy import DateTime
+from sqlalchemy.orm import Session, make_transient_to_detached
+from config import active_config
 from db import Base
+from utils.cache import cache_manager
 
 T = TypeVar('T', bound=Base)
 
+# Chave em Session.info que marca uma unidade de trabalho em andamento
+UNIT_OF_WORK_KEY = 'unit_of_work'
+
+# Chave em Session.info com as tags de cache a invalidar no commit
+CACHE_TAGS_KEY = 'cache_tags'
+
+# Chave em Session.info com as ações a executar se a unidade de trabalho for desfeita
+AO_DESFAZER_KEY = 'ao_desfazer'
+
+def invalidar_cache(session: Session, *tags: str):
+    """Invalida tags de cache após uma escrita.
+
+    Dentro de um unit_of_work a invalidação é adiada para depois do commit,
+    para que nenhuma leitura grave no cache o estado anterior à transação.
+    """
+    if session.info.get(UNIT_OF_WORK_KEY):
+        session.info.setdefault(CACHE_TAGS_KEY, set()).update(tags)
+    else:
+        cache_manager.invalidate_tags(*tags)
+
+def ao_desfazer(session: Session, acao: Callable[[], None]):
+    """Registra ``acao`` para desfazer estado em memória se a transação falhar.
+
+    Só tem efeito dentro de um unit_of_work; após o commit a ação é descartada.
+    """
+    if session.info.get(UNIT_OF_WORK_KEY):
+        session.info.setdefault(AO_DESFAZER_KEY, []).append(acao)
+
+@contextmanager
+def unit_of_work(session: Session):
+    """Agrupa as escritas dos repositórios em uma única transação.
+
+    Dentro do bloco os repositórios não fazem commit: as alterações são
+    enviadas de uma vez e confirmadas ao final, ou desfeitas em caso de erro.
+    Blocos aninhados participam da unidade de trabalho externa.
+    """
+    if session.info.get(UNIT_OF_WORK_KEY):
+        yield session
+        return
+
+    session.info[UNIT_OF_WORK_KEY] = True
+    try:
+        yield session
+        session.commit()
+    except Exception:
+        session.rollback()
+        session.info.pop(CACHE_TAGS_KEY, None)
+        for acao in reversed(session.info.pop(AO_DESFAZER_KEY, [])):
+            acao()
+        raise
+    finally:
+        session.info.pop(UNIT_OF_WORK_KEY, None)
+        session.info.pop(AO_DESFAZER_KEY, None)
+    
+    tags = session.info.pop(CACHE_TAGS_KEY, None)
+    if tags:
+        cache_manager.invalidate_tags(*tags)
+
 class BaseRepository(Generic[T]):
     def __init__(self, session: Session, model: Type[T]):
         self.session = session
         self.model = model
 
+    @property
+    def em_unidade_de_trabalho(self) -> bool:
+        """Indica se a sessão está dentro de um unit_of_work"""
+        return bool(self.session.info.get(UNIT_OF_WORK_KEY))
+
+    def _commit(self):
+        """Confirma a transação, exceto dentro de uma unidade de trabalho"""
+        if not self.em_unidade_de_trabalho:
+            self.session.commit()
+
+    def cache_tags(self, obj: T) -> List[str]:
+        """Tags de cache afetadas por uma escrita em ``obj``"""
+        return [self.model.__tablename__]
+
+    def _invalidar(self, obj: T):
+        """Invalida o cache das tags de ``obj`` (adiado dentro de um unit_of_work)"""
+        invalidar_cache(self.session, *self.cache_tags(obj))
+
+    def _get_cacheado(self, chave: str, tags: List[str], consulta: Callable[[], Optional[T]]) -> Optional[T]:
+        """Busca um registro pelo cache (L1 do worker / Redis) antes do banco.
+
+        O registro em cache é anexado à sessão sem consultar o banco, como se
+        tivesse sido carregado; alterações e remoções funcionam normalmente.
+        As escritas nos repositórios invalidam ``tags``.
+
+        Só usa o cache quando as invalidações chegam aos outros workers
+        (Redis ou broker): as operações confiam no registro para gravar, e
+        um cache só do worker devolveria registros já removidos por outro.
+        """
+        if not cache_manager.compartilhado:
+            return consulta()
+
+        pendentes = self.session.info.get(CACHE_TAGS_KEY)
+        if pendentes and pendentes.intersection(tags):
+            # Escrita ainda não confirmada nesta sessão: o cache pode estar velho
+            return consulta()
+
+        carregado: List[T] = []
+        def carregar():
+            obj = consulta()
+            if obj is None:
+                return None
+            carregado.append(obj)
+            return self._para_cache(obj)
+
+        dados = cache_manager.get_or_set(
+            chave, carregar, ttl=active_config.CACHE_TTL_CONSULTAS, stale_ttl=0, tags=tags
+        )
+        if dados is None:
+            return None
+        if carregado:
+            return carregado[0]
+        return self._do_cache(dados)
+
+    def _para_cache(self, obj: T) -> dict:
+        """Colunas do registro em formato serializável"""
+        dados = {}
+        for coluna in self.model.__table__.columns:
+            valor = getattr(obj, coluna.key)
+            dados[coluna.key] = valor.isoformat() if isinstance(valor, datetime) else valor
+        return dados
+
+    def _do_cache(self, dados: dict) -> T:
+        """Reconstrói o registro e o anexa à sessão sem consultar o banco"""
+        valores = {}
+        for coluna in self.model.__table__.columns:
+            valor = dados.get(coluna.key)
+            if isinstance(valor, str) and isinstance(coluna.type, DateTime):
+                valor = datetime.fromisoformat(valor)
+            valores[coluna.key] = valor
+        obj = self.model(**valores)
+        make_transient_to_detached(obj)
+        return self.session.merge(obj, load=False)
+
     def get_by_id(self, id: int) -> Optional[T]:
         """Busca um registro pelo ID"""
         return self.session.query(self.model).filter(self.model.id == id).first()
@@ -23,6 +160,10 @@ class BaseRepository(Generic[T]):
     def create(self, obj: T) -> T:
         """Cria um novo registro"""
         self.session.add(obj)
+        self._invalidar(obj)
+        if self.em_unidade_de_trabalho:
+            # Inserido no commit da unidade de trabalho
+            return obj
         self.session.commit()
         self.session.refresh(obj)
         return obj
@@ -30,14 +171,20 @@ class BaseRepository(Generic[T]):
     def update(self, obj: T) -> T:
         """Atualiza um registro existente"""
         self.session.merge(obj)
-        self.session.commit()
+        self._commit()
+        self._invalidar(obj)
         return obj
 
     def delete(self, id: int) -> bool:
         """Remove um registro pelo ID"""
         obj = self.get_by_id(id)
         if obj:
-            self.session.delete(obj)
-            self.session.commit()
+            self.delete_obj(obj)
             return True
         return False
+
+    def delete_obj(self, obj: T):
+        """Remove um registro já carregado"""
+        self.session.delete(obj)
+        self._commit()
+        self._invalidar(obj)
@@ -1,23 +1,71 @@
 """
 Repositório de Funcionários
 """
-from typing import Optional, List
+from typing import Optional, List, NamedTuple
 from sqlalchemy.orm import Session
+from config import active_config
 from models import Funcionario
-from .base_repo import BaseRepository
+from utils.cache import cache_manager
+from .base_repo import BaseRepository, CACHE_TAGS_KEY
+
+class IdentidadeFuncionario(NamedTuple):
+    """Dados do operador usados no caminho das requisições"""
+    id: int
+    nome: str
+    ativo: bool
 
 class FuncionarioRepository(BaseRepository[Funcionario]):
     def __init__(self, session: Session):
         super().__init__(session, Funcionario)
 
+    def cache_tags(self, funcionario: Funcionario) -> List[str]:
+        """Tags de cache afetadas por uma escrita no funcionário"""
+        return ['funcionarios', f'funcionario:{funcionario.matricula}']
+
     def get_by_matricula(self, matricula: str) -> Optional[Funcionario]:
-        """Busca um funcionário pela matrícula"""
-        return (
-            self.session.query(Funcionario)
-            .filter(Funcionario.matricula == matricula)
-            .first()
+        """Busca um funcionário pela matrícula (consulta frequente, servida pelo cache)"""
+        return self._get_cacheado(
+            f'funcionario:matricula:{matricula}',
+            [f'funcionario:{matricula}'],
+            lambda: (
+                self.session.query(Funcionario)
+                .filter(Funcionario.matricula == matricula)
+                .first()
+            )
         )
 
+    def get_identidade(self, matricula: str) -> Optional[IdentidadeFuncionario]:
+        """Identidade (id, nome, ativo) do funcionário, servida pelo cache.
+
+        Mais leve que ``get_by_matricula``: guarda só três colunas e não anexa
+        um objeto à sessão. Cadastro e remoção do funcionário invalidam a tag
+        ``funcionario:<matricula>``; com Redis (ou broker) também no L1 dos
+        outros workers. Sem cache compartilhado consulta sempre o banco, para
+        que um funcionário removido não continue operando em outro worker.
+        """
+        tags = [f'funcionario:{matricula}']
+        pendentes = self.session.info.get(CACHE_TAGS_KEY)
+
+        def consultar():
+            linha = (
+                self.session.query(Funcionario.id, Funcionario.nome, Funcionario.ativo)
+                .filter(Funcionario.matricula == matricula)
+                .first()
+            )
+            return list(linha) if linha else None
+
+        if not cache_manager.compartilhado:
+            dados = consultar()
+        elif pendentes and pendentes.intersection(tags):
+            # Escrita ainda não confirmada nesta sessão: o cache pode estar velho
+            dados = consultar()
+        else:
+            dados = cache_manager.get_or_set(
+                f'funcionario:identidade:{matricula}', consultar,
+                ttl=active_config.CACHE_TTL_CONSULTAS, stale_ttl=0, tags=tags
+            )
+        return IdentidadeFuncionario(*dados) if dados else None
+
     def get_ativos(self) -> List[Funcionario]:
         """Retorna todos os funcionários ativos"""
         return (
@@ -30,7 +78,6 @@ class FuncionarioRepository(BaseRepository[Funcionario]):
         """Remove completamente um funcionário do banco de dados"""
         funcionario = self.get_by_matricula(matricula)
         if funcionario:
-            self.session.delete(funcionario)
-            self.session.commit()
+            self.delete_obj(funcionario)
             return True
         return False
\ No newline at end of file
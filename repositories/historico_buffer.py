@@ -0,0 +1,143 @@
+"""
+Buffer de escrita em lote para o histórico
+"""
+import atexit
+import threading
+from datetime import datetime
+from typing import Dict, List, Optional
+from sqlalchemy import insert
+from config import active_config
+from db import SessionLocal
+from models import Historico
+from utils.cache import cache_manager
+from utils.error_logger import ErrorLogger
+
+# Colunas aceitas nos registros enfileirados
+COLUNAS_HISTORICO = (
+    'acao', 'placa', 'nome', 'tipo', 'vaga_numero', 'tempo_min',
+    'funcionario_nome', 'matricula', 'data_evento'
+)
+
+def historico_tags(matricula: Optional[str]) -> List[str]:
+    """Tags de cache afetadas por um registro de histórico da matrícula"""
+    tags = ['historico']
+    if matricula:
+        tags.append(f'historico:{matricula}')
+    return tags
+
+class HistoricoBuffer:
+    """Agrupa inserções de histórico e grava em INSERTs de múltiplas linhas.
+
+    O lote é gravado quando atinge ``tamanho_lote`` registros ou a cada
+    ``intervalo`` segundos, por uma thread própria iniciada no primeiro uso
+    (depois do fork do worker). Quem precisa do id do registro deve usar o
+    modo síncrono do HistoricoRepository.
+    """
+    def __init__(self, session_factory, tamanho_lote: int = 50, intervalo: float = 1.0,
+                 max_pendentes: int = 10000):
+        self._session_factory = session_factory
+        self._tamanho_lote = tamanho_lote
+        self._intervalo = intervalo
+        self._max_pendentes = max_pendentes
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._acordar = threading.Event()
+        self._pendentes: List[Dict] = []
+        self._thread: Optional[threading.Thread] = None
+        self._encerrado = False
+
+    def adicionar(self, dados: dict):
+        """Enfileira um registro de histórico para gravação em lote"""
+        registro = {coluna: dados.get(coluna) for coluna in COLUNAS_HISTORICO}
+        # O horário do evento é o do enfileiramento, não o da gravação
+        if registro['data_evento'] is None:
+            registro['data_evento'] = datetime.now()
+
+        with self._lock:
+            self._pendentes.append(registro)
+            cheio = len(self._pendentes) >= self._tamanho_lote
+
+        if self._encerrado:
+            self.flush()
+            return
+
+        self._iniciar_thread()
+        if cheio:
+            self._acordar.set()
+
+    def pendentes(self) -> int:
+        """Quantidade de registros aguardando gravação"""
+        with self._lock:
+            return len(self._pendentes)
+
+    def flush(self) -> int:
+        """Grava imediatamente os registros pendentes e retorna quantos foram gravados"""
+        with self._flush_lock:
+            with self._lock:
+                lote, self._pendentes = self._pendentes, []
+            if not lote:
+                return 0
+
+            session = self._session_factory()
+            try:
+                session.execute(insert(Historico), lote)
+                session.commit()
+                tags = {tag for registro in lote for tag in historico_tags(registro['matricula'])}
+                cache_manager.invalidate_tags(*tags)
+                return len(lote)
+            except Exception as e:
+                session.rollback()
+                with self._lock:
+                    # Devolver o lote para nova tentativa, respeitando o limite
+                    self._pendentes[:0] = lote
+                    descartados = len(self._pendentes) - self._max_pendentes
+                    if descartados > 0:
+                        del self._pendentes[:descartados]
+                ErrorLogger.log_error('DATABASE', 'Falha ao gravar lote do histórico', {
+                    'error': str(e),
+                    'registros': len(lote),
+                    'descartados': max(descartados, 0)
+                })
+                return 0
+            finally:
+                session.close()
+
+    def encerrar(self, timeout: float = 5.0):
+        """Para a thread de gravação e grava tudo o que estiver pendente"""
+        self._encerrado = True
+        self._acordar.set()
+        thread = self._thread
+        if thread and thread.is_alive() and thread is not threading.current_thread():
+            thread.join(timeout)
+        self.flush()
+
+    def _iniciar_thread(self):
+        """Inicia a thread de gravação periódica se ainda não estiver rodando"""
+        if self._thread and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread and self._thread.is_alive():
+                return
+            self._thread = threading.Thread(
+                target=self._executar,
+                name='historico-buffer',
+                daemon=True
+            )
+            self._thread.start()
+
+    def _executar(self):
+        """Laço da thread: grava por tempo ou quando o lote enche"""
+        while not self._encerrado:
+            self._acordar.wait(self._intervalo)
+            self._acordar.clear()
+            self.flush()
+
+# Instância global
+historico_buffer = HistoricoBuffer(
+    SessionLocal,
+    tamanho_lote=active_config.HISTORICO_BUFFER_TAMANHO,
+    intervalo=active_config.HISTORICO_BUFFER_INTERVALO
+)
+
+# Garantir que nada fique no buffer quando o processo terminar
+atexit.register(historico_buffer.encerrar)
@@ -1,16 +1,22 @@
 """
 Repositório de Histórico
 """
-from typing import List
+from typing import List, Optional, Tuple
 from datetime import datetime
+from sqlalchemy import and_, or_
 from sqlalchemy.orm import Session
 from models import Historico
 from .base_repo import BaseRepository
+from .historico_buffer import historico_buffer, historico_tags, COLUNAS_HISTORICO
 
 class HistoricoRepository(BaseRepository[Historico]):
     def __init__(self, session: Session):
         super().__init__(session, Historico)
 
+    def cache_tags(self, historico: Historico) -> List[str]:
+        """Tags de cache afetadas por um novo registro de histórico"""
+        return historico_tags(historico.matricula)
+
     def get_by_placa(self, placa: str) -> List[Historico]:
         """Busca histórico por placa do veículo"""
         return (
@@ -29,6 +35,51 @@ class HistoricoRepository(BaseRepository[Historico]):
             .all()
         )
 
+    def get_recentes(self, limite: int) -> List[Historico]:
+        """Retorna os eventos mais recentes, sem carregar a tabela inteira"""
+        return (
+            self.session.query(Historico)
+            .order_by(Historico.data_evento.desc(), Historico.id.desc())
+            .limit(limite)
+            .all()
+        )
+
+    def get_pagina(
+        self,
+        limite: int,
+        cursor: Optional[Tuple[datetime, int]] = None,
+        matricula: Optional[str] = None
+    ) -> List[Historico]:
+        """Retorna uma página do histórico (mais recentes primeiro).
+
+        ``cursor`` é o par (data_evento, id) do último item da página anterior;
+        a busca continua a partir dele usando o índice, sem OFFSET.
+        """
+        query = self.session.query(Historico)
+        if matricula is not None:
+            query = query.filter(Historico.matricula == matricula)
+        if cursor is not None:
+            data_evento, id_ = cursor
+            query = query.filter(or_(
+                Historico.data_evento < data_evento,
+                and_(Historico.data_evento == data_evento, Historico.id < id_)
+            ))
+        return (
+            query
+            .order_by(Historico.data_evento.desc(), Historico.id.desc())
+            .limit(limite)
+            .all()
+        )
+
+    def get_ultimo_por_placa(self, placa: str, acao: str) -> Optional[Historico]:
+        """Retorna o evento mais recente de uma ação para a placa"""
+        return (
+            self.session.query(Historico)
+            .filter(Historico.placa == placa, Historico.acao == acao)
+            .order_by(Historico.data_evento.desc(), Historico.id.desc())
+            .first()
+        )
+
     def get_by_periodo(self, inicio: datetime, fim: datetime) -> List[Historico]:
         """Busca histórico por período"""
         return (
@@ -38,8 +89,24 @@ class HistoricoRepository(BaseRepository[Historico]):
             .all()
         )
 
-    def create_from_dict(self, data: dict) -> Historico:
-        """Cria um registro de histórico a partir de um dicionário"""
+    def _gravar(self, historico: Historico, sincrono: bool) -> Optional[Historico]:
+        """Grava o registro agora ou o envia para o buffer de escrita em lote.
+
+        Dentro de uma unidade de trabalho o registro sempre entra na mesma
+        transação da operação, para que ambos sejam confirmados juntos.
+        """
+        if sincrono or self.em_unidade_de_trabalho:
+            return self.create(historico)
+        historico_buffer.adicionar({
+            coluna: getattr(historico, coluna) for coluna in COLUNAS_HISTORICO
+        })
+        return None
+
+    def create_from_dict(self, data: dict, sincrono: bool = True) -> Optional[Historico]:
+        """Cria um registro de histórico a partir de um dicionário.
+
+        Com ``sincrono=False`` o registro vai para o buffer e nada é retornado.
+        """
         historico = Historico(
             acao=data.get('acao'),
             placa=data.get('placa'),
@@ -50,7 +117,7 @@ class HistoricoRepository(BaseRepository[Historico]):
             funcionario_nome=data.get('funcionario_nome'),
             matricula=data.get('matricula')
         )
-        return self.create(historico)
+        return self._gravar(historico, sincrono)
 
     def registrar_entrada(
         self,
@@ -59,8 +126,9 @@ class HistoricoRepository(BaseRepository[Historico]):
         tipo: str,
         vaga_numero: int,
         funcionario_nome: str,
-        matricula: str
-    ) -> Historico:
+        matricula: str,
+        sincrono: bool = True
+    ) -> Optional[Historico]:
         """Registra entrada de veículo"""
         historico = Historico(
             acao="entrada",
@@ -71,7 +139,7 @@ class HistoricoRepository(BaseRepository[Historico]):
             funcionario_nome=funcionario_nome,
             matricula=matricula
         )
-        return self.create(historico)
+        return self._gravar(historico, sincrono)
 
     def registrar_saida(
         self,
@@ -81,8 +149,9 @@ class HistoricoRepository(BaseRepository[Historico]):
         vaga_numero: int,
         tempo_min: int,
         funcionario_nome: str,
-        matricula: str
-    ) -> Historico:
+        matricula: str,
+        sincrono: bool = True
+    ) -> Optional[Historico]:
         """Registra saída de veículo"""
         historico = Historico(
             acao="saida",
@@ -94,4 +163,4 @@ class HistoricoRepository(BaseRepository[Historico]):
             funcionario_nome=funcionario_nome,
             matricula=matricula
         )
-        return self.create(historico)
+        return self._gravar(historico, sincrono)
@@ -1,10 +1,11 @@
 """
 Repositório de Vagas
 """
-from typing import Optional, List
+from typing import Optional, List, Tuple
 from datetime import datetime
+from sqlalchemy import select, update
 from sqlalchemy.orm import Session
-from models import Vaga
+from models import Vaga, Veiculo
 from .base_repo import BaseRepository
 
 class VagaRepository(BaseRepository[Vaga]):
@@ -24,6 +25,25 @@ class VagaRepository(BaseRepository[Vaga]):
             .all()
         )
 
+    def get_by_veiculo_id(self, veiculo_id: int) -> Optional[Vaga]:
+        """Busca a vaga ocupada por um veículo (usa o índice em veiculo_id)"""
+        return (
+            self.session.query(Vaga)
+            .filter(Vaga.veiculo_id == veiculo_id, Vaga.ocupada == True)
+            .first()
+        )
+
+    def get_numeros_livres(self) -> List[Tuple[int, str]]:
+        """Retorna (numero, tipo) de todas as vagas livres, sem carregar objetos"""
+        return [
+            (numero, tipo)
+            for numero, tipo in (
+                self.session.query(Vaga.numero, Vaga.tipo)
+                .filter(Vaga.ocupada == False)
+                .all()
+            )
+        ]
+
     def get_vagas_ocupadas(self) -> List[Vaga]:
         """Busca todas as vagas ocupadas"""
         return (
@@ -33,12 +53,83 @@ class VagaRepository(BaseRepository[Vaga]):
             .all()
         )
 
+    def get_excedidos(self, limite: datetime, desde: Optional[datetime] = None) -> List[Tuple]:
+        """Retorna as vagas ocupadas com entrada anterior a ``limite``.
+
+        Usa o índice em ``entrada``: o custo é proporcional ao número de vagas
+        excedidas, não ao de vagas ocupadas. Com ``desde``, retorna apenas as
+        entradas posteriores a ele (prazos vencidos em uma janela). Cada linha
+        é uma tupla (numero, tipo, entrada, placa, nome, bloco, apartamento).
+        """
+        query = (
+            self.session.query(
+                Vaga.numero, Vaga.tipo, Vaga.entrada,
+                Veiculo.placa, Veiculo.nome, Veiculo.bloco, Veiculo.apartamento
+            )
+            .outerjoin(Veiculo, Vaga.veiculo_id == Veiculo.id)
+            .filter(Vaga.entrada < limite, Vaga.ocupada == True)
+        )
+        if desde is not None:
+            query = query.filter(Vaga.entrada >= desde)
+        return query.order_by(Vaga.entrada).all()
+
     def ocupar_vaga(self, vaga: Vaga, veiculo_id: int) -> Vaga:
         """Ocupa uma vaga com um veículo"""
         vaga.ocupada = True
         vaga.veiculo_id = veiculo_id
         vaga.entrada = datetime.now()
-        self.session.commit()
+        self._commit()
+        self._invalidar(vaga)
+        return vaga
+
+    def reservar_vaga(self, tipo: str, veiculo_id: int, numero: Optional[int] = None) -> Optional[Vaga]:
+        """Escolhe e ocupa uma vaga livre do tipo em um único comando.
+
+        Com ``numero`` tenta apenas aquela vaga; sem ele pega a livre de menor
+        número. Retorna None se nenhuma vaga pôde ser reservada.
+        """
+        if numero is not None:
+            alvo = Vaga.numero == numero
+        else:
+            # FOR UPDATE SKIP LOCKED faz workers concorrentes pularem a linha
+            # já disputada em vez de esperar por ela (ignorado no SQLite, que
+            # serializa as escritas)
+            candidata = (
+                select(Vaga.id)
+                .where(Vaga.tipo == tipo, Vaga.ocupada == False)
+                .order_by(Vaga.numero)
+                .limit(1)
+                .with_for_update(skip_locked=True)
+            )
+            alvo = Vaga.id == candidata.scalar_subquery()
+        
+        # Repetir a condição "livre" garante que a vaga não seja entregue duas vezes
+        stmt = (
+            update(Vaga)
+            .where(alvo, Vaga.tipo == tipo, Vaga.ocupada == False)
+            .values(ocupada=True, veiculo_id=veiculo_id, entrada=datetime.now())
+        )
+        
+        if self.session.get_bind().dialect.update_returning:
+            vaga = self.session.scalars(
+                stmt.returning(Vaga),
+                execution_options={'populate_existing': True}
+            ).first()
+        else:
+            # Fallback para bancos sem UPDATE ... RETURNING
+            result = self.session.execute(stmt, execution_options={'synchronize_session': False})
+            vaga = None
+            if result.rowcount:
+                vaga = (
+                    self.session.query(Vaga)
+                    .populate_existing()
+                    .filter(Vaga.veiculo_id == veiculo_id, Vaga.ocupada == True)
+                    .first()
+                )
+        
+        self._commit()
+        if vaga is not None:
+            self._invalidar(vaga)
         return vaga
 
     def liberar_vaga(self, vaga: Vaga) -> Vaga:
@@ -46,7 +137,8 @@ class VagaRepository(BaseRepository[Vaga]):
         vaga.ocupada = False
         vaga.veiculo_id = None
         vaga.entrada = None
-        self.session.commit()
+        self._commit()
+        self._invalidar(vaga)
         return vaga
 
     def get_vagas_completas(self) -> List[Vaga]:
@@ -56,3 +148,21 @@ class VagaRepository(BaseRepository[Vaga]):
             .order_by(Vaga.numero)
             .all()
         )
+
+    def get_vagas_com_veiculo(self) -> List[Tuple]:
+        """Retorna todas as vagas com os dados do veículo em um único SELECT.
+
+        Cada linha é uma tupla (id, numero, tipo, ocupada, entrada, placa, nome,
+        cpf, modelo, bloco, apartamento); os campos do veículo são None nas
+        vagas livres.
+        """
+        return (
+            self.session.query(
+                Vaga.id, Vaga.numero, Vaga.tipo, Vaga.ocupada, Vaga.entrada,
+                Veiculo.placa, Veiculo.nome, Veiculo.cpf, Veiculo.modelo,
+                Veiculo.bloco, Veiculo.apartamento
+            )
+            .outerjoin(Veiculo, Vaga.veiculo_id == Veiculo.id)
+            .order_by(Vaga.numero)
+            .all()
+        )
@@ -10,9 +10,17 @@ class VeiculoRepository(BaseRepository[Veiculo]):
     def __init__(self, session: Session):
         super().__init__(session, Veiculo)
 
+    def cache_tags(self, veiculo: Veiculo) -> List[str]:
+        """Tags de cache afetadas por uma escrita no veículo"""
+        return ['veiculos', f'veiculo:{veiculo.placa}']
+
     def get_by_placa(self, placa: str) -> Optional[Veiculo]:
-        """Busca um veículo pela placa"""
-        return self.session.query(Veiculo).filter(Veiculo.placa == placa).first()
+        """Busca um veículo pela placa (consulta frequente, servida pelo cache)"""
+        return self._get_cacheado(
+            f'veiculo:placa:{placa}',
+            [f'veiculo:{placa}'],
+            lambda: self.session.query(Veiculo).filter(Veiculo.placa == placa).first()
+        )
 
     def get_by_cpf(self, cpf: str) -> List[Veiculo]:
         """Busca veículos pelo CPF do proprietário"""
@@ -0,0 +1,87 @@
+from flask import Blueprint, Response, request, jsonify
+import time
+
+from config import active_config
+from utils.logging_config import setup_logger
+from utils.eventos import event_log, formatar_sse
+
+# Configurar logger
+logger = setup_logger(__name__)
+
+eventos_bp = Blueprint('eventos', __name__)
+
+# Intervalo entre comentários de keepalive no stream SSE (segundos)
+INTERVALO_KEEPALIVE = 15
+
+def _ultimo_id_cliente() -> int:
+    """Último id já recebido pelo cliente (Last-Event-ID ou ?desde=)"""
+    valor = request.headers.get('Last-Event-ID') or request.args.get('desde')
+    try:
+        return int(valor) if valor else event_log.ultimo_id()
+    except ValueError:
+        return event_log.ultimo_id()
+
+def _worker_sincrono() -> bool:
+    """Indica se a requisição ocupa um worker síncrono inteiro (gunicorn sync)"""
+    return not request.environ.get('wsgi.multithread', False)
+
+# Stream de eventos de ocupação (Server-Sent Events)
+@eventos_bp.route('/eventos', methods=['GET'])
+def eventos_stream():
+    ultimo_id = _ultimo_id_cliente()
+    headers = {'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+
+    if _worker_sincrono():
+        # Worker síncrono (gunicorn sync): segurar a conexão ocuparia o worker
+        # inteiro. Entrega o que já existe e encerra; o navegador reconecta
+        # após o ``retry``, como um polling
+        eventos = event_log.desde(ultimo_id)
+        corpo = f"retry: {active_config.EVENTOS_RETRY_SINCRONO_MS}\n\n"
+        if eventos:
+            corpo += ''.join(formatar_sse(evento) for evento in eventos)
+        else:
+            # Só o id: o navegador o reenvia em Last-Event-ID e nada se perde entre reconexões
+            corpo += f"id: {ultimo_id}\n\n"
+        return Response(corpo, mimetype='text/event-stream', headers=headers)
+
+    def gerar(ultimo_id):
+        yield "retry: 3000\n\n"
+        fim = time.monotonic() + active_config.EVENTOS_SSE_DURACAO
+        while True:
+            restante = fim - time.monotonic()
+            if restante <= 0:
+                return
+            eventos = event_log.aguardar(ultimo_id, min(restante, INTERVALO_KEEPALIVE))
+            if not eventos:
+                yield ": keepalive\n\n"
+                continue
+            for evento in eventos:
+                ultimo_id = evento['id']
+                yield formatar_sse(evento)
+
+    return Response(gerar(ultimo_id), mimetype='text/event-stream', headers=headers)
+
+# Long-poll em JSON para clientes sem EventSource
+@eventos_bp.route('/eventos/poll', methods=['GET'])
+def eventos_poll():
+    try:
+        if not request.args.get('desde'):
+            # Primeira chamada: apenas informa a posição atual
+            return jsonify({'eventos': [], 'ultimo_id': event_log.ultimo_id()})
+
+        ultimo_id = _ultimo_id_cliente()
+        if _worker_sincrono():
+            # Sem espera em workers síncronos: vira um polling simples
+            espera = 0.0
+        else:
+            espera = request.args.get('espera', active_config.EVENTOS_LONG_POLL_ESPERA, type=float)
+            espera = max(0.0, min(espera, active_config.EVENTOS_LONG_POLL_ESPERA))
+
+        eventos = event_log.aguardar(ultimo_id, espera)
+        return jsonify({
+            'eventos': eventos,
+            'ultimo_id': eventos[-1]['id'] if eventos else ultimo_id
+        })
+    except Exception as e:
+        logger.error(f"Erro no long-poll de eventos: {e}")
+        return jsonify({'mensagem': 'Erro interno do servidor!'}), 500
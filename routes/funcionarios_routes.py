@@ -8,7 +8,7 @@ from config import active_config
 from utils.logging_config import setup_logger, log_operation, log_error
 from utils.security import verify_supervisor_password
 from utils.rate_limiter import login_limit, api_limit
-from utils.state import funcionarios_logados
+from utils.session_manager import session_manager
 from db import SessionLocal
 from repositories import FuncionarioRepository, HistoricoRepository
 from services import funcionario_service
@@ -97,16 +97,15 @@ def login_funcionario():
             funcionario_repo = FuncionarioRepository(db)
             historico_repo = HistoricoRepository(db)
             
-            funcionario = funcionario_repo.get_by_matricula(matricula)
+            funcionario = funcionario_repo.get_identidade(matricula)
             
             if not funcionario:
                 return jsonify({'mensagem': 'Matrícula não encontrada!'}), 404
                 
-            if matricula in funcionarios_logados:
+            # Registrar login (a sessão é compartilhada por todos os workers)
+            if not session_manager.login(matricula, funcionario.nome):
                 return jsonify({'mensagem': f'Funcionário {funcionario.nome} já está logado!'}), 200
                 
-            # Registrar login
-            funcionarios_logados.add(matricula)
             historico_repo.create_from_dict({
                 'acao': "login",
                 'placa': "N/A",
@@ -114,7 +113,7 @@ def login_funcionario():
                 'tipo': "funcionario",
                 'funcionario_nome': funcionario.nome,
                 'matricula': matricula
-            })
+            }, sincrono=False)
             
             logger.info(f"Funcionário {funcionario.nome} (matrícula {matricula}) fez login")
             return jsonify({'mensagem': f'Funcionário {funcionario.nome} logado com sucesso!'}), 200
@@ -139,7 +138,8 @@ def logout_funcionario():
         if not matricula:
             return jsonify({'mensagem': 'Matrícula é obrigatória!'}), 400
             
-        if matricula not in funcionarios_logados:
+        # Registrar logout
+        if not session_manager.logout(matricula):
             return jsonify({'mensagem': 'Funcionário não estava logado.'}), 400
             
         db = SessionLocal()
@@ -147,10 +147,8 @@ def logout_funcionario():
             funcionario_repo = FuncionarioRepository(db)
             historico_repo = HistoricoRepository(db)
             
-            funcionario = funcionario_repo.get_by_matricula(matricula)
+            funcionario = funcionario_repo.get_identidade(matricula)
             
-            # Registrar logout
-            funcionarios_logados.discard(matricula)
             if funcionario:
                 historico_repo.create_from_dict({
                     'acao': "logout",
@@ -159,7 +157,7 @@ def logout_funcionario():
                     'tipo': "funcionario",
                     'funcionario_nome': funcionario.nome,
                     'matricula': matricula
-                })
+                }, sincrono=False)
                 
                 logger.info(f"Funcionário {funcionario.nome} (matrícula {matricula}) fez logout")
                 return jsonify({'mensagem': f'Funcionário {funcionario.nome} deslogado com sucesso!'}), 200
@@ -206,7 +204,7 @@ def remover_funcionario_route():
 def verificar_login(matricula):
     try:
         matricula = str(matricula).strip()
-        logado = matricula in funcionarios_logados
+        logado = session_manager.is_logged_in(matricula)
         return jsonify({'logado': logado, 'matricula': matricula})
         
     except Exception as e:
@@ -217,23 +215,12 @@ def verificar_login(matricula):
 @funcionarios_bp.route('/funcionarios-logados')
 def listar_funcionarios_logados():
     try:
-        db = SessionLocal()
-        try:
-            funcionario_repo = FuncionarioRepository(db)
-            funcionarios = []
-            
-            for matricula in funcionarios_logados:
-                funcionario = funcionario_repo.get_by_matricula(matricula)
-                if funcionario:
-                    funcionarios.append({
-                        'matricula': matricula,
-                        'nome': funcionario.nome
-                    })
-            
-            return jsonify(funcionarios)
-            
-        finally:
-            db.close()
+        # O nome fica guardado na sessão: nenhuma consulta ao banco
+        funcionarios = [
+            {'matricula': matricula, 'nome': nome}
+            for matricula, nome in sorted(session_manager.get_sessoes().items())
+        ]
+        return jsonify(funcionarios)
             
     except Exception as e:
         logger.error(f"Erro ao listar funcionários logados: {e}")
@@ -280,7 +267,7 @@ def bootstrap_dados():
             repo = FuncionarioRepository(db)
 
             def ensure(nome: str, matricula: str):
-                if not repo.get_by_matricula(matricula):
+                if not repo.get_identidade(matricula):
                     funcionario_service.cadastrar_funcionario(db, nome, matricula)
                     criados.append(matricula)
 
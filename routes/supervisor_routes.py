@@ -1,10 +1,14 @@
-from flask import Blueprint, request, jsonify, url_for
+import os
+import math
+import threading
+from flask import Blueprint, Response, request, jsonify, url_for
 from services import historico_service
 from config import active_config
 from db import SessionLocal
 from utils.security import verify_supervisor_password, create_jwt_token
 from utils.decorators import require_supervisor
 from utils.rate_limiter import login_limit, api_limit
+from utils.profiler import sampling_profiler, formatar_collapsed, formatar_speedscope
 
 supervisor_bp = Blueprint('supervisor', __name__)
 
@@ -49,4 +53,87 @@ def historico():
         historico = historico_service.ver_historico(db)
         return jsonify({'historico': historico})
     finally:
-        db.close()
\ No newline at end of file
+        db.close()
+
+# Histórico paginado (JSON) por cursor
+@supervisor_bp.route('/historico-paginado', methods=['GET'])
+def historico_paginado():
+    limite = request.args.get('limite', 50, type=int)
+    cursor = request.args.get('cursor') or None
+    db = SessionLocal()
+    try:
+        return jsonify(historico_service.listar_historico_paginado(db, limite=limite, cursor=cursor))
+    except ValueError:
+        return jsonify({'mensagem': 'Cursor inválido!'}), 400
+    finally:
+        db.close()
+
+# ---------------------- PROFILER ----------------------
+def _numero_positivo(valor):
+    """Converte para um float finito maior que zero; None se inválido"""
+    try:
+        numero = float(valor)
+    except (TypeError, ValueError):
+        return None
+    return numero if math.isfinite(numero) and numero > 0 else None
+
+def _resposta_perfil(amostras, formato: str):
+    if not amostras:
+        return jsonify({'mensagem': 'Nenhuma amostra coletada.'}), 404
+    if formato == 'speedscope':
+        return jsonify(formatar_speedscope(amostras))
+    return Response(formatar_collapsed(amostras), mimetype='text/plain')
+
+# Iniciar amostragem em segundo plano neste worker
+@supervisor_bp.route('/profiler/iniciar', methods=['POST'])
+@require_supervisor
+def iniciar_profiler():
+    data = request.get_json(silent=True) or {}
+    segundos = _numero_positivo(data.get('segundos', 10))
+    intervalo_ms = _numero_positivo(data.get('intervalo_ms', active_config.PERFIL_INTERVALO_MS))
+    if segundos is None or intervalo_ms is None:
+        return jsonify({'mensagem': 'segundos e intervalo_ms devem ser números positivos!'}), 400
+    if data.get('limpar', True):
+        sampling_profiler.limpar()
+    if not sampling_profiler.iniciar(segundos, intervalo=intervalo_ms / 1000,
+                                     incluir_ociosas=bool(data.get('incluir_ociosas', False))):
+        return jsonify({'mensagem': 'Já existe uma amostragem em andamento neste worker.'}), 409
+    return jsonify({
+        'mensagem': 'Amostragem iniciada.',
+        'pid': os.getpid(),
+        'segundos': min(segundos, sampling_profiler.max_segundos)
+    }), 202
+
+# Interromper a amostragem deste worker
+@supervisor_bp.route('/profiler/parar', methods=['POST'])
+@require_supervisor
+def parar_profiler():
+    sampling_profiler.parar()
+    return jsonify({'mensagem': 'Amostragem encerrada.', 'pid': os.getpid()})
+
+# Resultado (collapsed ou speedscope); com ?segundos=N amostra N segundos e responde em seguida
+@supervisor_bp.route('/profiler', methods=['GET'])
+@require_supervisor
+def resultado_profiler():
+    formato = request.args.get('formato', 'collapsed')
+    if 'segundos' in request.args:
+        if not request.environ.get('wsgi.multithread', False):
+            # Worker síncrono: esta é a única thread de requisições, e esperar
+            # aqui bloquearia o worker amostrando apenas threads ociosas
+            return jsonify({
+                'mensagem': 'Amostragem síncrona indisponível neste worker; '
+                            'use POST /profiler/iniciar e depois GET /profiler.'
+            }), 400
+        segundos = _numero_positivo(request.args.get('segundos'))
+        intervalo_ms = _numero_positivo(request.args.get('intervalo_ms', active_config.PERFIL_INTERVALO_MS))
+        if segundos is None or intervalo_ms is None:
+            return jsonify({'mensagem': 'segundos e intervalo_ms devem ser números positivos!'}), 400
+        intervalo = intervalo_ms / 1000
+        # A thread desta requisição só estaria esperando: fica fora da amostragem
+        incluir_ociosas = request.args.get('incluir_ociosas') == '1'
+        if not sampling_profiler.iniciar(segundos, intervalo=intervalo, ignorar=(threading.get_ident(),),
+                                         incluir_ociosas=incluir_ociosas):
+            return jsonify({'mensagem': 'Já existe uma amostragem em andamento neste worker.'}), 409
+        sampling_profiler.aguardar()
+        return _resposta_perfil(sampling_profiler.resultado(todos_workers=False), formato)
+    return _resposta_perfil(sampling_profiler.resultado(), formato)
@@ -6,9 +6,11 @@ from config import active_config
 from utils.logging_config import setup_logger, log_operation, log_error
 from db import SessionLocal
 from repositories import VeiculoRepository, VagaRepository, FuncionarioRepository, HistoricoRepository
-from services import veiculo_service, vaga_service
+from services import veiculo_service, vaga_service, historico_service
 from services.veiculo_service import normalizar_placa
-from routes.funcionarios_routes import funcionarios_logados
+from utils.session_manager import session_manager
+from utils.ocupacao_versao import resposta_versionada
+from utils.cache import cached
 
 # Configurar logger
 logger = setup_logger(__name__)
@@ -37,17 +39,17 @@ def cadastrar_veiculo_route():
             
         db = SessionLocal()
         try:
-            funcionario_repo = FuncionarioRepository(db)
             historico_repo = HistoricoRepository(db)
             
-            # Verificar se funcionário existe
-            funcionario = funcionario_repo.get_by_matricula(matricula_func)
-            if not funcionario:
-                return jsonify({'mensagem': 'Funcionário não encontrado!'}), 403
-                
-            # Verificar se funcionário está logado
-            if matricula_func not in funcionarios_logados:
-                return jsonify({'mensagem': 'Funcionário precisa estar logado para cadastrar veículo!'}), 403
+            # Funcionário logado: o nome vem da sessão, sem consultar o cadastro
+            nome_funcionario = session_manager.get_nome(matricula_func)
+            if not nome_funcionario:
+                funcionario = FuncionarioRepository(db).get_identidade(matricula_func)
+                if not funcionario:
+                    return jsonify({'mensagem': 'Funcionário não encontrado!'}), 403
+                if nome_funcionario is None:
+                    return jsonify({'mensagem': 'Funcionário precisa estar logado para cadastrar veículo!'}), 403
+                nome_funcionario = funcionario.nome
                 
             # Cadastrar veículo
             resposta = veiculo_service.cadastrar_veiculo(
@@ -67,11 +69,11 @@ def cadastrar_veiculo_route():
                     placa=normalizar_placa(placa),
                     nome=nome,
                     tipo="morador" if modelo else "visitante",
-                    funcionario_nome=funcionario.nome,
+                    funcionario_nome=nome_funcionario,
                     matricula=matricula_func
                 )
                 
-                logger.info(f"Veículo {normalizar_placa(placa)} cadastrado por {funcionario.nome}")
+                logger.info(f"Veículo {normalizar_placa(placa)} cadastrado por {nome_funcionario}")
                 
             return jsonify({'mensagem': resposta})
             
@@ -83,29 +85,51 @@ def cadastrar_veiculo_route():
         return jsonify({'mensagem': 'Erro interno do servidor!'}), 500
 
 # Listar veículos
+@cached(ttl=active_config.CACHE_TTL_CONSULTAS, key_prefix='veiculos', tags=['veiculos'])
+def _listar_veiculos_dict() -> list:
+    """Lista de veículos serializada (invalidada a cada escrita em veículos)"""
+    db = SessionLocal()
+    try:
+        veiculos = veiculo_service.listar_veiculos_cadastrados(db)
+        return [{
+            'id': v.id,
+            'placa': v.placa,
+            'cpf': v.cpf,
+            'nome': v.nome,
+            'modelo': v.modelo,
+            'tipo': v.tipo,
+            'bloco': v.bloco,
+            'apartamento': v.apartamento,
+            'criado_em': v.criado_em.isoformat() if v.criado_em else None
+        } for v in veiculos]
+    finally:
+        db.close()
+
 @veiculos_bp.route('/veiculos', methods=['GET'])
 def listar_veiculos():
     try:
-        db = SessionLocal()
-        try:
-            veiculos = veiculo_service.listar_veiculos_cadastrados(db)
-            return jsonify([{
-                'id': v.id,
-                'placa': v.placa,
-                'cpf': v.cpf,
-                'nome': v.nome,
-                'modelo': v.modelo,
-                'tipo': v.tipo,
-                'bloco': v.bloco,
-                'apartamento': v.apartamento,
-                'criado_em': v.criado_em.isoformat() if v.criado_em else None
-            } for v in veiculos])
-        finally:
-            db.close()
+        return jsonify(_listar_veiculos_dict())
     except Exception as e:
         logger.error(f"Erro ao listar veículos: {e}")
         return jsonify({'mensagem': 'Erro interno do servidor!'}), 500
 
+def _funcionario_logado(db, matricula: str):
+    """Nome do funcionário logado, lido da sessão compartilhada.
+
+    Só consulta o banco quando não há sessão, para distinguir matrícula
+    inexistente de funcionário deslogado; nesse caso retorna a resposta de erro.
+    """
+    nome = session_manager.get_nome(matricula)
+    if nome:
+        return nome
+    funcionario = FuncionarioRepository(db).get_identidade(matricula)
+    if not funcionario:
+        return jsonify({'mensagem': '❌ Funcionário não cadastrado.'}), 403
+    if nome is None:
+        return jsonify({'mensagem': '❌ Funcionário precisa estar logado.'}), 403
+    # Sessão criada sem nome: usar o do cadastro
+    return funcionario.nome
+
 # Estacionar veículo
 @veiculos_bp.route('/estacionar', methods=['POST'])
 def estacionar():
@@ -123,31 +147,26 @@ def estacionar():
         db = SessionLocal()
         try:
             veiculo_repo = VeiculoRepository(db)
-            funcionario_repo = FuncionarioRepository(db)
             
             # Verificar veículo e funcionário
             veiculo = veiculo_repo.get_by_placa(placa)
-            funcionario = funcionario_repo.get_by_matricula(matricula)
             
             if not veiculo:
                 return jsonify({'mensagem': '❌ Veículo não cadastrado. Faça o cadastro primeiro.'}), 404
-            if not funcionario:
-                return jsonify({'mensagem': '❌ Funcionário não cadastrado.'}), 403
-            if matricula not in funcionarios_logados:
-                return jsonify({'mensagem': '❌ Funcionário precisa estar logado.'}), 403
+            
+            nome_funcionario = _funcionario_logado(db, matricula)
+            if isinstance(nome_funcionario, tuple):
+                return nome_funcionario
                 
             from estacionamento import estacionar_veiculo
             resposta = estacionar_veiculo(db, placa)
             
             if "✅" in resposta:
-                logger.info(f"Veículo {normalizar_placa(placa)} estacionado por {funcionario.nome}")
+                logger.info(f"Veículo {normalizar_placa(placa)} estacionado por {nome_funcionario}")
                 
                 # Buscar informações da vaga
                 vaga_repo = VagaRepository(db)
-                vaga = next(
-                    (v for v in vaga_repo.get_vagas_ocupadas() if v.veiculo and v.veiculo.placa == placa),
-                    None
-                )
+                vaga = vaga_repo.get_by_veiculo_id(veiculo.id)
                 
                 proprietario = {
                     'cpf': veiculo.cpf,
@@ -189,33 +208,27 @@ def liberar_veiculo():
         db = SessionLocal()
         try:
             veiculo_repo = VeiculoRepository(db)
-            funcionario_repo = FuncionarioRepository(db)
             
             # Verificar veículo e funcionário
             veiculo = veiculo_repo.get_by_placa(placa)
-            funcionario = funcionario_repo.get_by_matricula(matricula)
             
             if not veiculo:
                 return jsonify({'mensagem': '❌ Veículo não cadastrado.'}), 404
-            if not funcionario:
-                return jsonify({'mensagem': '❌ Funcionário não cadastrado.'}), 403
-            if matricula not in funcionarios_logados:
-                return jsonify({'mensagem': '❌ Funcionário precisa estar logado.'}), 403
+            
+            nome_funcionario = _funcionario_logado(db, matricula)
+            if isinstance(nome_funcionario, tuple):
+                return nome_funcionario
                 
             from estacionamento import liberar_vaga
-            resposta = liberar_vaga(db, placa, matricula)
+            resposta = liberar_vaga(db, placa, matricula, nome_funcionario=nome_funcionario)
             
             if "✅" in resposta:
-                logger.info(f"Veículo {normalizar_placa(placa)} liberado por {funcionario.nome}")
+                logger.info(f"Veículo {normalizar_placa(placa)} liberado por {nome_funcionario}")
                 
                 # Buscar hora de saída no histórico
                 historico_repo = HistoricoRepository(db)
-                historico = historico_repo.get_by_placa(placa)
-                saida = None
-                for h in reversed(historico):
-                    if h.acao == 'saida' and h.placa == placa:
-                        saida = h.data_evento
-                        break
+                ultima_saida = historico_repo.get_ultimo_por_placa(normalizar_placa(placa), 'saida')
+                saida = ultima_saida.data_evento if ultima_saida else None
                         
                 proprietario = {
                     'cpf': veiculo.cpf,
@@ -252,19 +265,16 @@ def remover_veiculo_cpf():
             
         db = SessionLocal()
         try:
-            funcionario_repo = FuncionarioRepository(db)
-            
             # Verificar se funcionário está logado
-            if matricula not in funcionarios_logados:
+            nome_funcionario = session_manager.get_nome(matricula)
+            if nome_funcionario is None:
                 return jsonify({'mensagem': 'Funcionário precisa estar logado!'}), 403
                 
             from estacionamento import remover_veiculo_por_cpf
-            resposta = remover_veiculo_por_cpf(db, cpf, matricula)
+            resposta = remover_veiculo_por_cpf(db, cpf, matricula, nome_funcionario=nome_funcionario or None)
             
             if "🗑️" in resposta:  # Remoção bem-sucedida
-                funcionario = funcionario_repo.get_by_matricula(matricula)
-                if funcionario:
-                    logger.info(f"Veículo removido por CPF {cpf} por {funcionario.nome}")
+                logger.info(f"Veículo removido por CPF {cpf} por {nome_funcionario}")
                     
             return jsonify({'mensagem': resposta})
             
@@ -276,6 +286,20 @@ def remover_veiculo_cpf():
         return jsonify({'mensagem': 'Erro interno do servidor!'}), 500
 
 # Histórico por matrícula
+@cached(
+    ttl=active_config.CACHE_TTL_CONSULTAS,
+    key_prefix='historico-matricula',
+    tags=lambda matricula: [f'historico:{matricula}']
+)
+def _historico_matricula_dict(matricula: str) -> list:
+    """Histórico da matrícula serializado (invalidado a cada novo registro dela)"""
+    db = SessionLocal()
+    try:
+        historico = HistoricoRepository(db).get_by_matricula(matricula)
+        return [historico_service.historico_para_dict(h) for h in historico]
+    finally:
+        db.close()
+
 @veiculos_bp.route('/historico-matricula')
 def historico_matricula():
     try:
@@ -283,99 +307,103 @@ def historico_matricula():
         if not matricula:
             return jsonify({'mensagem': 'Matrícula é obrigatória!'}), 400
             
+        return jsonify(_historico_matricula_dict(matricula))
+            
+    except Exception as e:
+        logger.error(f"Erro ao buscar histórico: {e}")
+        return jsonify({'mensagem': 'Erro interno do servidor!'}), 500
+
+# Histórico por matrícula paginado por cursor
+@veiculos_bp.route('/historico-matricula-paginado')
+def historico_matricula_paginado():
+    try:
+        matricula = request.args.get('matricula', '').strip()
+        if not matricula:
+            return jsonify({'mensagem': 'Matrícula é obrigatória!'}), 400
+        
+        limite = request.args.get('limite', 50, type=int)
+        cursor = request.args.get('cursor') or None
+        
         db = SessionLocal()
         try:
-            historico_repo = HistoricoRepository(db)
-            historico = historico_repo.get_by_matricula(matricula)
-            
-            return jsonify([{
-                'id': h.id,
-                'acao': h.acao,
-                'placa': h.placa,
-                'nome': h.nome,
-                'tipo': h.tipo,
-                'vaga_numero': h.vaga_numero,
-                'tempo_min': h.tempo_min,
-                'funcionario_nome': h.funcionario_nome,
-                'matricula': h.matricula,
-                'data_evento': h.data_evento.isoformat() if h.data_evento else None
-            } for h in historico])
-            
+            pagina = historico_service.listar_historico_paginado(
+                db, limite=limite, cursor=cursor, matricula=matricula
+            )
+            return jsonify(pagina)
+        except ValueError:
+            return jsonify({'mensagem': 'Cursor inválido!'}), 400
         finally:
             db.close()
             
     except Exception as e:
-        logger.error(f"Erro ao buscar histórico: {e}")
+        logger.error(f"Erro ao buscar histórico paginado: {e}")
         return jsonify({'mensagem': 'Erro interno do servidor!'}), 500
 
 # Listar status das vagas
 @veiculos_bp.route('/vagas', methods=['GET'])
 def listar_vagas():
-    try:
+    def gerar():
         db = SessionLocal()
         try:
-            vaga_repo = VagaRepository(db)
-            vagas = vaga_repo.get_vagas_completas()
-            
-            return jsonify([{
-                'id': v.id,
-                'numero': v.numero,
-                'tipo': v.tipo,
-                'ocupada': v.ocupada,
-                'veiculo': v.veiculo.placa if v.veiculo else None,
-                'entrada': v.entrada.isoformat() if v.entrada else None
-            } for v in vagas])
+            vagas = VagaRepository(db).get_vagas_com_veiculo()
+            return vaga_service.serializar_vagas(vagas), 200
         finally:
             db.close()
+    
+    try:
+        return resposta_versionada('vagas', gerar)
     except Exception as e:
         logger.error(f"Erro ao listar vagas: {e}")
         return jsonify({'mensagem': 'Erro interno do servidor!'}), 500
 
+def _gerar_tempo_excedido():
+    """Monta a resposta de /tempo-excedido a partir do banco"""
+    db = SessionLocal()
+    try:
+        excedidos = vaga_service.verificar_tempo_excedido(db)
+        
+        if not excedidos:
+            return {
+                'mensagem': '✅ Nenhuma vaga excedeu o tempo.',
+                'excedidos': [],
+                'veiculos_excedidos': []
+            }, 200
+        
+        mensagens = []
+        veiculos_excedidos = []
+        
+        for excedido in excedidos:
+            mensagens.append(
+                f"⚠️ Vaga {excedido['numero']} com veículo {excedido['veiculo']} "
+                f"está há {excedido['horas']} horas!"
+            )
+            
+            # Dados do veículo já vêm da mesma consulta
+            if excedido['nome'] is not None:
+                veiculos_excedidos.append({
+                    'placa': excedido['veiculo'],
+                    'nome': excedido['nome'],
+                    'vaga': excedido['numero'],
+                    'tempo_excedido': excedido['horas'] * 60,  # Converter para minutos
+                    'bloco': excedido['bloco'],
+                    'apartamento': excedido['apartamento']
+                })
+        
+        return {
+            'mensagem': '\n'.join(mensagens),
+            'excedidos': excedidos,
+            'veiculos_excedidos': veiculos_excedidos
+        }, 200
+    finally:
+        db.close()
+
 # Verificar tempo excedido
 @veiculos_bp.route('/tempo-excedido', methods=['GET'])
 def tempo_excedido():
     try:
-        db = SessionLocal()
-        try:
-            excedidos = vaga_service.verificar_tempo_excedido(db)
-            
-            if not excedidos:
-                return jsonify({
-                    'mensagem': '✅ Nenhuma vaga excedeu o tempo.',
-                    'excedidos': [],
-                    'veiculos_excedidos': []
-                })
-            else:
-                mensagens = []
-                veiculos_excedidos = []
-                
-                for excedido in excedidos:
-                    mensagens.append(
-                        f"⚠️ Vaga {excedido['numero']} com veículo {excedido['veiculo']} "
-                        f"está há {excedido['horas']} horas!"
-                    )
-                    
-                    # Buscar informações completas do veículo
-                    veiculo_repo = VeiculoRepository(db)
-                    veiculo = veiculo_repo.get_by_placa(excedido['veiculo'])
-                    if veiculo:
-                        veiculos_excedidos.append({
-                            'placa': excedido['veiculo'],
-                            'nome': veiculo.nome,
-                            'vaga': excedido['numero'],
-                            'tempo_excedido': excedido['horas'] * 60,  # Converter para minutos
-                            'bloco': veiculo.bloco,
-                            'apartamento': veiculo.apartamento
-                        })
-                
-                return jsonify({
-                    'mensagem': '\n'.join(mensagens),
-                    'excedidos': excedidos,
-                    'veiculos_excedidos': veiculos_excedidos
-                })
-                
-        finally:
-            db.close()
+        # O resultado também muda com o relógio: ETag renovada a cada minuto
+        minuto = int(datetime.now().timestamp() // 60)
+        return resposta_versionada('tempo-excedido', _gerar_tempo_excedido, sufixo=f"-{minuto}")
             
     except Exception as e:
         logger.error(f"Erro ao verificar tempo excedido: {e}")
@@ -383,4 +411,4 @@ def tempo_excedido():
             'mensagem': f'Erro ao verificar tempo excedido: {str(e)}',
             'excedidos': [],
             'veiculos_excedidos': []
-        }), 500
\ No newline at end of file
+        }), 500
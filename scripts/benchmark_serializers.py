@@ -0,0 +1,94 @@
+"""
+Compara o custo de serialização do cache e das respostas JSON
+
+Uso: python scripts/benchmark_serializers.py [quantidade_de_registros] [repeticoes]
+"""
+import sys
+import json
+import timeit
+from datetime import datetime, timedelta
+from decimal import Decimal
+from pathlib import Path
+sys.path.append(str(Path(__file__).parent.parent))
+
+from flask import Flask
+from flask.json.provider import DefaultJSONProvider
+from utils.serializers import (
+    FastJSONProvider, JsonSerializer, OrjsonSerializer, MsgpackSerializer,
+    ORJSON_AVAILABLE, MSGPACK_AVAILABLE
+)
+
+def gerar_historico(quantidade: int) -> list:
+    """Registros no formato do histórico, com datas e valores decimais"""
+    inicio = datetime(2025, 1, 1, 8, 0, 0)
+    return [
+        {
+            'id': i,
+            'acao': 'entrada' if i % 2 else 'saida',
+            'placa': f"ABC{i % 10000:04d}",
+            'nome': f"Morador {i}",
+            'tipo': 'morador' if i % 3 else 'visitante',
+            'vaga_numero': i % 30 + 1,
+            'tempo_min': i % 600,
+            'valor': Decimal(f"{i % 100}.50"),
+            'funcionario_nome': 'Sistema',
+            'matricula': f"{i % 50:04d}",
+            'data_evento': inicio + timedelta(minutes=i)
+        }
+        for i in range(quantidade)
+    ]
+
+def medir(nome: str, funcao, repeticoes: int, base: float = None) -> float:
+    tempo = min(timeit.repeat(funcao, number=repeticoes, repeat=3)) / repeticoes
+    comparacao = f"  ({base / tempo:.1f}x)" if base else ""
+    print(f"  {nome:<32} {tempo * 1000:9.3f} ms{comparacao}")
+    return tempo
+
+def benchmark_cache(dados: list, repeticoes: int):
+    print("Cache (dumps + loads):")
+    # Caminho anterior: datetime e Decimal viram texto e não voltam ao tipo original
+    atual = medir(
+        "json.dumps(default=str) [atual]",
+        lambda: json.loads(json.dumps(dados, default=str)),
+        repeticoes
+    )
+
+    serializadores = [JsonSerializer()]
+    if ORJSON_AVAILABLE:
+        serializadores.append(OrjsonSerializer())
+    if MSGPACK_AVAILABLE:
+        serializadores.append(MsgpackSerializer())
+
+    for serializer in serializadores:
+        assert serializer.loads(serializer.dumps(dados)) == dados, f"{serializer.nome} não preserva os tipos"
+        medir(serializer.nome, lambda s=serializer: s.loads(s.dumps(dados)), repeticoes, atual)
+        print(f"  {'':<32} {len(serializer.dumps(dados)) / 1024:9.1f} KB")
+
+    if not ORJSON_AVAILABLE:
+        print("  (orjson não instalado)")
+    if not MSGPACK_AVAILABLE:
+        print("  (msgpack não instalado)")
+
+def benchmark_respostas(dados: list, repeticoes: int):
+    print("Respostas JSON (app.json.response):")
+    saidas = []
+    atual = None
+    for nome, provider in (("DefaultJSONProvider [atual]", DefaultJSONProvider),
+                           ("FastJSONProvider", FastJSONProvider)):
+        app = Flask(__name__)
+        app.json = provider(app)
+        with app.app_context():
+            saidas.append(json.loads(app.json.response(dados).get_data()))
+            tempo = medir(nome, lambda a=app: a.json.response(dados).get_data(), repeticoes, atual)
+        atual = atual or tempo
+
+    print(f"  Saídas equivalentes: {'sim' if saidas[0] == saidas[1] else 'NÃO'}")
+
+if __name__ == '__main__':
+    quantidade = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    repeticoes = int(sys.argv[2]) if len(sys.argv) > 2 else 20
+    dados = gerar_historico(quantidade)
+    print(f"📊 {quantidade} registros, {repeticoes} repetições\n")
+    benchmark_cache(dados, repeticoes)
+    print()
+    benchmark_respostas(dados, repeticoes)
@@ -0,0 +1,173 @@
+"""
+Detecta consultas N+1 nas rotas da aplicação
+
+Popula um banco SQLite temporário com N e depois 10N vagas/veículos, chama as
+rotas de leitura dos blueprints (veiculos_bp, funcionarios_bp, supervisor_bp)
+e do app.py e compara a quantidade de statements: uma rota cujo número de
+consultas cresce com o volume de dados tem um N+1. A guarda do contador de
+consultas também falha qualquer requisição que repita o mesmo statement.
+
+Uso: python scripts/detectar_n_mais_um.py [N] [tolerancia]
+Sai com código 1 se alguma rota escalar com os dados. O mesmo teste roda no
+pytest em tests/test_n_mais_um.py.
+"""
+import os
+import sys
+import tempfile
+from datetime import datetime, timedelta
+from pathlib import Path
+sys.path.append(str(Path(__file__).parent.parent))
+
+# Banco e sessões isolados; precisa vir antes de importar a aplicação
+_diretorio = tempfile.mkdtemp(prefix='n_mais_um_')
+os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(_diretorio, 'n_mais_um.db')}"
+os.environ['SESSAO_BACKEND'] = 'memoria'
+os.environ.pop('REDIS_URL', None)
+
+from app import app
+from db import SessionLocal, Base, engine
+from db.consultas import contador_consultas, NMaisUmDetectado
+from models import Vaga, Veiculo, Funcionario, Historico
+from services.vaga_allocator import vaga_allocator
+from utils.cache import cache_manager
+from utils.ocupacao_versao import ocupacao_versao
+from utils.session_manager import session_manager
+from config import active_config
+
+MATRICULA = '0001'
+
+# Blueprints verificados ('' = rotas do próprio app.py)
+BLUEPRINTS = ('', 'veiculos', 'funcionarios', 'supervisor')
+
+# Rotas que não leem dados proporcionais ao volume ou que bloqueiam (SSE, /status)
+IGNORADAS = {'/metrics', '/metrics/prometheus', '/healthz', '/status', '/ping'}
+
+# Parâmetros de query por rota
+PARAMETROS = {
+    '/funcionarios': {'senha_supervisor': active_config.SENHA_SUPERVISOR},
+    '/bootstrap-dados': {'senha_supervisor': active_config.SENHA_SUPERVISOR},
+    '/historico-matricula': {'matricula': MATRICULA},
+    '/historico-matricula-paginado': {'matricula': MATRICULA},
+}
+
+def popular(quantidade: int):
+    """Recria o banco com ``quantidade`` vagas e veículos, metade estacionados"""
+    if _diretorio not in str(engine.url):
+        # A aplicação foi importada antes deste módulo e usa o banco configurado
+        raise RuntimeError(f"Banco temporário não está em uso ({engine.url}); nada foi apagado")
+    Base.metadata.drop_all(bind=engine)
+    Base.metadata.create_all(bind=engine)
+    db = SessionLocal()
+    try:
+        agora = datetime.now()
+        db.add(Funcionario(nome='Operador Teste', matricula=MATRICULA, ativo=True))
+        for i in range(1, quantidade + 1):
+            veiculo = Veiculo(
+                placa=f"TST{i:04d}", cpf=f"{i:011d}", nome=f"Morador {i}", modelo='Gol',
+                tipo='morador', bloco='A', apartamento=str(i)
+            )
+            db.add(veiculo)
+            db.flush()
+            estacionado = i % 2 == 0
+            db.add(Vaga(
+                numero=i, tipo='comum' if i % 3 else 'visitante', ocupada=estacionado,
+                veiculo_id=veiculo.id if estacionado else None,
+                # Alguns acima do limite para /tempo-excedido ter resultado
+                entrada=agora - timedelta(hours=100 if i % 4 == 0 else 1) if estacionado else None
+            ))
+            db.add(Historico(
+                acao='entrada', placa=veiculo.placa, nome=veiculo.nome, tipo='morador',
+                vaga_numero=i, funcionario_nome='Operador Teste', matricula=MATRICULA
+            ))
+        db.commit()
+        vaga_allocator.recarregar(db)
+    finally:
+        db.close()
+
+def limpar_estado():
+    """Descarta caches e snapshots para cada requisição ir ao banco"""
+    cache_manager.clear()
+    ocupacao_versao.incrementar()
+
+def rotas_de_leitura() -> list:
+    rotas = []
+    for regra in app.url_map.iter_rules():
+        blueprint = regra.endpoint.rpartition('.')[0]
+        if 'GET' not in regra.methods or blueprint not in BLUEPRINTS or regra.endpoint == 'static':
+            continue
+        if regra.rule in IGNORADAS:
+            continue
+        url = regra.rule.replace('<matricula>', MATRICULA)
+        if '<' not in url:
+            rotas.append(url)
+    return sorted(set(rotas))
+
+def medir(cliente, metodo: str, url: str, **kwargs) -> int:
+    limpar_estado()
+    with contador_consultas.capturar() as statements:
+        resposta = getattr(cliente, metodo)(url, **kwargs)
+        resposta.get_data()
+    if resposta.status_code >= 500:
+        raise RuntimeError(f"{metodo.upper()} {url} respondeu {resposta.status_code}")
+    return len(statements)
+
+def medir_cenario(quantidade: int) -> dict:
+    popular(quantidade)
+    session_manager.clear_all()
+    cliente = app.test_client()
+    cliente.post('/login-funcionario', json={'matricula': MATRICULA}).get_data()
+
+    medidas = {}
+    for url in rotas_de_leitura():
+        medidas[f"GET {url}"] = medir(cliente, 'get', url, query_string=PARAMETROS.get(url, {}))
+    # Operações: o custo não deveria depender de quantas vagas existem
+    medidas['POST /estacionar'] = medir(
+        cliente, 'post', '/estacionar', json={'placa': 'TST0001', 'matricula': MATRICULA}
+    )
+    medidas['POST /liberar'] = medir(
+        cliente, 'post', '/liberar', json={'placa': 'TST0001', 'matricula': MATRICULA}
+    )
+    return medidas
+
+def comparar(n: int = 10) -> dict:
+    """Consultas por rota com N e 10N registros: {rota: (antes, depois)}.
+
+    Levanta NMaisUmDetectado se alguma requisição repetir um statement mais
+    de N/2 vezes.
+    """
+    app.testing = True
+    app.config['WTF_CSRF_ENABLED'] = False
+    # Qualquer statement repetido mais de N/2 vezes numa requisição já é suspeito
+    contador_consultas.ativar_guarda(limite_repeticoes=max(n // 2, 2))
+    try:
+        pequeno = medir_cenario(n)
+        grande = medir_cenario(n * 10)
+    finally:
+        contador_consultas.desativar_guarda()
+    return {rota: (pequeno[rota], grande.get(rota, 0)) for rota in sorted(pequeno)}
+
+def rotas_que_escalam(medidas: dict, tolerancia: int = 2) -> list:
+    return [rota for rota, (antes, depois) in medidas.items() if depois > antes + tolerancia]
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 10
+    tolerancia = int(sys.argv[2]) if len(sys.argv) > 2 else 2
+
+    try:
+        medidas = comparar(n)
+    except NMaisUmDetectado as e:
+        print(f"❌ N+1 detectado: {e}")
+        sys.exit(1)
+
+    print(f"📊 Consultas por requisição com {n} e {n * 10} vagas/veículos\n")
+    falhas = rotas_que_escalam(medidas, tolerancia)
+    for rota, (antes, depois) in medidas.items():
+        print(f"  {'❌' if rota in falhas else '✅'} {rota:<40} {antes:5d} {depois:5d}")
+
+    if falhas:
+        print(f"\n❌ {len(falhas)} rota(s) com consultas proporcionais aos dados")
+        sys.exit(1)
+    print("\n✅ Nenhuma rota escala com o volume de dados")
+
+if __name__ == '__main__':
+    main()
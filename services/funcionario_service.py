@@ -4,14 +4,14 @@ Serviço para gerenciamento de funcionários
 from sqlalchemy.orm import Session
 from models import Funcionario
 from repositories import FuncionarioRepository, HistoricoRepository
-from utils.state import funcionarios_logados
+from utils.session_manager import session_manager
 
 def cadastrar_funcionario(db: Session, nome: str, matricula: str) -> str:
     """Cadastra um novo funcionário"""
     funcionario_repo = FuncionarioRepository(db)
     
     # Verificar se matrícula já existe
-    if funcionario_repo.get_by_matricula(matricula):
+    if funcionario_repo.get_identidade(matricula):
         return "❌ Matrícula já cadastrada!"
         
     # Criar funcionário
@@ -35,13 +35,12 @@ def remover_funcionario(db: Session, matricula: str) -> str:
     historico_repo = HistoricoRepository(db)
     
     # Verificar se funcionário existe
-    funcionario = funcionario_repo.get_by_matricula(matricula)
+    funcionario = funcionario_repo.get_identidade(matricula)
     if not funcionario:
         return "❌ Funcionário não encontrado!"
         
     # Se funcionário estiver logado, fazer logout
-    if matricula in funcionarios_logados:
-        funcionarios_logados.discard(matricula)
+    session_manager.logout(matricula)
         
     # Registrar no histórico antes de remover
     historico_repo.create_from_dict({
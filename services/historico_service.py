@@ -1,21 +1,24 @@
 """
 Serviços para gerenciamento do histórico
 """
+import base64
+from datetime import datetime
+from typing import Optional, Tuple
 from sqlalchemy.orm import Session
 from models import Historico
 from repositories import HistoricoRepository
 
+# Tamanho máximo de página aceito na listagem paginada
+LIMITE_MAXIMO_PAGINA = 500
+
 def ver_historico(db: Session, limit: int = 100) -> str:
     """Retorna o histórico completo de eventos, ordenado por data (mais recentes primeiro)"""
     repo = HistoricoRepository(db)
-    historico = repo.get_all()
+    historico = repo.get_recentes(limit)
     
     if not historico:
         return "📭 Nenhum registro no histórico."
     
-    # Ordenar por data (mais recentes primeiro) e limitar quantidade
-    historico = sorted(historico, key=lambda h: h.data_evento, reverse=True)[:limit]
-    
     # Emojis para cada tipo de ação
     emojis = {
         "entrada": "🅿️",
@@ -35,6 +38,56 @@ def ver_historico(db: Session, limit: int = 100) -> str:
         for h in historico
     ])
 
+def historico_para_dict(h: Historico) -> dict:
+    """Converte um registro de histórico para dicionário serializável"""
+    return {
+        'id': h.id,
+        'acao': h.acao,
+        'placa': h.placa,
+        'nome': h.nome,
+        'tipo': h.tipo,
+        'vaga_numero': h.vaga_numero,
+        'tempo_min': h.tempo_min,
+        'funcionario_nome': h.funcionario_nome,
+        'matricula': h.matricula,
+        'data_evento': h.data_evento.isoformat() if h.data_evento else None
+    }
+
+def codificar_cursor(h: Historico) -> str:
+    """Gera o cursor opaco que aponta para depois do registro informado"""
+    valor = f"{h.data_evento.isoformat()}|{h.id}"
+    return base64.urlsafe_b64encode(valor.encode()).decode()
+
+def decodificar_cursor(cursor: str) -> Tuple[datetime, int]:
+    """Lê um cursor gerado por codificar_cursor (ValueError se inválido)"""
+    try:
+        valor = base64.urlsafe_b64decode(cursor.encode()).decode()
+        data_evento, id_ = valor.rsplit('|', 1)
+        return datetime.fromisoformat(data_evento), int(id_)
+    except (ValueError, UnicodeError) as e:
+        raise ValueError("Cursor inválido") from e
+
+def listar_historico_paginado(
+    db: Session,
+    limite: int = 50,
+    cursor: Optional[str] = None,
+    matricula: Optional[str] = None
+) -> dict:
+    """Retorna uma página do histórico e o cursor da próxima página"""
+    limite = max(1, min(limite, LIMITE_MAXIMO_PAGINA))
+    posicao = decodificar_cursor(cursor) if cursor else None
+    
+    repo = HistoricoRepository(db)
+    # Buscar um item a mais para saber se existe próxima página
+    registros = repo.get_pagina(limite + 1, cursor=posicao, matricula=matricula)
+    tem_mais = len(registros) > limite
+    registros = registros[:limite]
+    
+    return {
+        'historico': [historico_para_dict(h) for h in registros],
+        'proximo_cursor': codificar_cursor(registros[-1]) if tem_mais else None
+    }
+
 def filtrar_historico_por_matricula(db: Session, matricula: str) -> list:
     """Filtra o histórico por matrícula do funcionário"""
     repo = HistoricoRepository(db)
@@ -0,0 +1,81 @@
+"""
+Alocador de vagas livres em memória
+"""
+import heapq
+from threading import Lock
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+from sqlalchemy.orm import Session
+from repositories import VagaRepository
+
+class VagaAllocator:
+    """Mantém, por tipo, um min-heap com os números das vagas livres.
+
+    O heap é apenas uma indicação: cada worker do gunicorn tem o seu, então
+    quem aloca deve confirmar no banco que a vaga continua livre.
+    """
+    def __init__(self):
+        self._lock = Lock()
+        self._heaps: Dict[str, List[int]] = {}
+        self._livres: Dict[str, Set[int]] = {}
+        self._carregado = False
+
+    @property
+    def carregado(self) -> bool:
+        """Indica se o alocador já foi montado a partir do banco"""
+        return self._carregado
+
+    def carregar(self, vagas_livres: Iterable[Tuple[int, str]]):
+        """Reconstrói os heaps a partir de pares (numero, tipo) de vagas livres"""
+        heaps: Dict[str, List[int]] = {}
+        livres: Dict[str, Set[int]] = {}
+        for numero, tipo in vagas_livres:
+            livres.setdefault(tipo, set()).add(numero)
+        for tipo, numeros in livres.items():
+            heap = list(numeros)
+            heapq.heapify(heap)
+            heaps[tipo] = heap
+        with self._lock:
+            self._heaps = heaps
+            self._livres = livres
+            self._carregado = True
+
+    def recarregar(self, db: Session):
+        """Reconstrói os heaps consultando as vagas livres no banco"""
+        self.carregar(VagaRepository(db).get_numeros_livres())
+
+    def proxima_livre(self, tipo: str) -> Optional[int]:
+        """Retira e retorna o menor número de vaga livre do tipo, se houver"""
+        with self._lock:
+            heap = self._heaps.get(tipo)
+            livres = self._livres.get(tipo)
+            while heap:
+                numero = heapq.heappop(heap)
+                # Entradas removidas por marcar_ocupada são descartadas aqui
+                if numero in livres:
+                    livres.discard(numero)
+                    return numero
+            return None
+
+    def marcar_livre(self, tipo: str, numero: int):
+        """Devolve uma vaga ao heap do seu tipo"""
+        with self._lock:
+            livres = self._livres.setdefault(tipo, set())
+            if numero in livres:
+                return
+            livres.add(numero)
+            heapq.heappush(self._heaps.setdefault(tipo, []), numero)
+
+    def marcar_ocupada(self, tipo: str, numero: int):
+        """Remove uma vaga do conjunto de livres (remoção preguiçosa do heap)"""
+        with self._lock:
+            livres = self._livres.get(tipo)
+            if livres is not None:
+                livres.discard(numero)
+
+    def total_livres(self, tipo: str) -> int:
+        """Quantidade de vagas livres conhecidas para o tipo"""
+        with self._lock:
+            return len(self._livres.get(tipo, ()))
+
+# Instância global
+vaga_allocator = VagaAllocator()
@@ -1,7 +1,7 @@
 """
 Serviço de gerenciamento de vagas
 """
-from datetime import datetime
+from datetime import datetime, timedelta
 import pytz
 from sqlalchemy.orm import Session
 from config import active_config
@@ -16,59 +16,104 @@ logger = setup_logger(__name__)
 def ver_status_vagas(db: Session) -> str:
     """Retorna o status atual de todas as vagas"""
     repo = VagaRepository(db)
-    vagas = repo.get_vagas_completas()
+    vagas = repo.get_vagas_com_veiculo()
     
     if not vagas:
         return active_config.Mensagens.NENHUMA_VAGA_CADASTRADA
-        
-    # Ordenar vagas por número
-    vagas = sorted(vagas, key=lambda v: v.numero)
     
     status = ["📋 STATUS DAS VAGAS:"]
-    for v in vagas:
-        if v.ocupada and v.veiculo:
-            s = f"🔴 Ocupada por {v.veiculo.placa}"
+    for _, numero, tipo, ocupada, _, placa, *_ in vagas:
+        if ocupada and placa:
+            s = f"🔴 Ocupada por {placa}"
         else:
             s = "🟢 Livre"
-        status.append(f"Vaga {v.numero} ({v.tipo}): {s}")
+        status.append(f"Vaga {numero} ({tipo}): {s}")
     
     return "\n".join(status)
 
+# === Serialização das vagas ===
+def serializar_vagas(linhas: list) -> list:
+    """Serializa as linhas de get_vagas_com_veiculo para a rota /vagas"""
+    return [
+        {
+            'id': id_,
+            'numero': numero,
+            'tipo': tipo,
+            'ocupada': bool(ocupada),
+            'veiculo': placa,
+            'entrada': entrada.isoformat() if entrada else None
+        }
+        for id_, numero, tipo, ocupada, entrada, placa, *_ in linhas
+    ]
+
+def serializar_vagas_completas(linhas: list) -> list:
+    """Serializa as linhas de get_vagas_com_veiculo para a rota /vagas-completas"""
+    vagas = []
+    for (_, numero, tipo, ocupada, entrada,
+         placa, nome, cpf, modelo, bloco, apartamento) in linhas:
+        ocupada = bool(ocupada)
+        veiculo = None
+        if ocupada and placa is not None:
+            veiculo = {
+                'placa': placa,
+                'proprietario': nome,
+                'cpf': cpf,
+                'modelo': modelo,
+                'bloco': bloco,
+                'apartamento': apartamento
+            }
+        vagas.append({
+            'numero': numero,
+            'tipo': tipo if tipo is not None else 'indefinido',
+            'ocupada': ocupada,
+            'entrada': entrada.isoformat() if entrada else None,
+            'veiculo': veiculo
+        })
+    return vagas
+
 # === Verificar tempo excedido ===
+def horas_desde(entrada: datetime) -> float:
+    """Horas decorridas desde ``entrada`` (aceita datas com ou sem fuso)"""
+    if entrada.tzinfo is not None:
+        agora = datetime.now(pytz.timezone(active_config.TIMEZONE))
+    else:
+        # Gravada sem fuso pelo horário local do servidor
+        agora = datetime.now()
+    return (agora - entrada).total_seconds() / 3600
+
+def limite_entrada(limite_horas: int = None) -> datetime:
+    """Horário de entrada a partir do qual uma vaga ainda está no prazo"""
+    if limite_horas is None:
+        limite_horas = active_config.LIMITE_HORAS_ESTACIONAMENTO
+    return datetime.now() - timedelta(hours=limite_horas)
+
+def serializar_excedidos(linhas: list) -> list:
+    """Serializa as linhas de VagaRepository.get_excedidos"""
+    excedidos = []
+    for numero, tipo, entrada, placa, nome, bloco, apartamento in linhas:
+        try:
+            horas = horas_desde(entrada)
+        except (ValueError, TypeError) as e:
+            logger.warning(f"Erro ao processar data de entrada da vaga {numero}: {e}")
+            continue
+        excedidos.append({
+            'numero': numero,
+            'tipo': tipo,
+            'veiculo': placa or "Desconhecido",
+            'horas': round(horas, 1),
+            'nome': nome,
+            'bloco': bloco,
+            'apartamento': apartamento
+        })
+    return excedidos
+
 def verificar_tempo_excedido(db: Session, limite_horas: int = None) -> list:
     """Verifica quais veículos excederam o tempo limite de estacionamento"""
     try:
-        if limite_horas is None:
-            limite_horas = active_config.LIMITE_HORAS_ESTACIONAMENTO
-            
-        agora = datetime.now(pytz.timezone(active_config.TIMEZONE))
-        excedidos = []
-        
         repo = VagaRepository(db)
-        vagas_ocupadas = repo.get_vagas_ocupadas()
-        
-        for v in vagas_ocupadas:
-            if v.entrada:
-                try:
-                    horas = (agora - v.entrada).total_seconds() / 3600
-                    
-                    if horas > limite_horas:
-                        excedidos.append({
-                            'numero': v.numero,
-                            'tipo': v.tipo,
-                            'veiculo': v.veiculo.placa if v.veiculo and hasattr(v.veiculo, 'placa') else "Desconhecido",
-                            'horas': round(horas, 1)
-                        })
-                        
-                except (ValueError, TypeError) as e:
-                    logger.warning(f"Erro ao processar data de entrada da vaga {v.numero}: {e}")
-                    continue
-                except Exception as e:
-                    log_error(logger, e, f"processamento da vaga {v.numero}")
-                    continue
-        
-        return excedidos
+        # O banco filtra pelo índice em entrada: só as vagas excedidas são lidas
+        return serializar_excedidos(repo.get_excedidos(limite_entrada(limite_horas)))
         
     except Exception as e:
         log_error(logger, e, "verificação de tempo excedido")
-        return []
\ No newline at end of file
+        return []
@@ -0,0 +1,163 @@
+"""
+Varredura periódica dos prazos de estacionamento vencidos
+"""
+import os
+import time
+import uuid
+import threading
+from datetime import datetime, timedelta
+from typing import Optional, Tuple
+from config import active_config
+from db import SessionLocal
+from repositories import VagaRepository
+from services import vaga_service
+from utils.cache import cache_manager
+from utils.eventos import event_log
+from utils.logging_config import setup_logger, log_error
+
+try:
+    import fcntl
+    FCNTL_AVAILABLE = True
+except ImportError:
+    FCNTL_AVAILABLE = False
+
+# Configurar logger
+logger = setup_logger(__name__)
+
+# Chaves usadas quando o estado da varredura fica no Redis
+CHAVE_REDIS_LOCK = 'tempo_excedido:lock'
+CHAVE_REDIS_ULTIMA = 'tempo_excedido:ultima_varredura'
+
+class VarredorTempoExcedido:
+    """Publica um evento 'tempo_excedido' quando o prazo de uma vaga vence.
+
+    O prazo de cada vaga é ``entrada + LIMITE_HORAS_ESTACIONAMENTO``. A cada
+    ``intervalo`` segundos, o worker que obtiver o lock consulta no banco
+    apenas os prazos vencidos na janela (última varredura, agora] e grava o
+    fim da janela; os demais workers pulam a rodada. Assim cada vaga gera um
+    único evento, mesmo com vários workers.
+    """
+    def __init__(self, session_factory, caminho: str, intervalo: float = 60.0):
+        self._session_factory = session_factory
+        self._caminho = caminho
+        self._intervalo = intervalo
+        self._lock = threading.Lock()
+        self._parar = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def iniciar(self):
+        """Inicia a thread de varredura se ainda não estiver rodando"""
+        with self._lock:
+            if self._thread and self._thread.is_alive():
+                return
+            self._parar.clear()
+            self._thread = threading.Thread(
+                target=self._executar,
+                name='varredor-tempo-excedido',
+                daemon=True
+            )
+            self._thread.start()
+
+    def parar(self, timeout: float = 5.0):
+        """Encerra a thread de varredura"""
+        self._parar.set()
+        thread = self._thread
+        if thread and thread.is_alive() and thread is not threading.current_thread():
+            thread.join(timeout)
+
+    def varrer(self) -> int:
+        """Executa uma rodada, se este worker obtiver o lock, e retorna quantos eventos publicou"""
+        redis_client = cache_manager.redis_client
+        if redis_client:
+            try:
+                return self._varrer_redis(redis_client)
+            except Exception:
+                pass
+
+        if FCNTL_AVAILABLE:
+            try:
+                return self._varrer_arquivo()
+            except OSError:
+                pass
+
+        # Sem Redis nem flock: cada processo varre por conta própria
+        with self._lock:
+            return self._varrer_janela(None)[0]
+
+    def _executar(self):
+        """Laço da thread: uma rodada a cada intervalo"""
+        while not self._parar.wait(self._intervalo):
+            try:
+                self.varrer()
+            except Exception as e:
+                log_error(logger, e, "varredura de tempo excedido")
+
+    def _varrer_janela(self, ultima: Optional[float]) -> Tuple[int, float]:
+        """Publica os prazos vencidos em (ultima, agora] e retorna (eventos, agora)"""
+        agora = time.time()
+        if ultima is None or ultima > agora:
+            # Primeira rodada: considerar apenas o último intervalo
+            ultima = agora - self._intervalo
+
+        limite_horas = active_config.LIMITE_HORAS_ESTACIONAMENTO
+        prazo = timedelta(hours=limite_horas)
+        # Prazo vencido em (ultima, agora]  <=>  entrada em (ultima - L, agora - L]
+        fim = datetime.fromtimestamp(agora) - prazo
+        inicio = datetime.fromtimestamp(ultima) - prazo
+
+        db = self._session_factory()
+        try:
+            linhas = VagaRepository(db).get_excedidos(fim, desde=inicio)
+        finally:
+            db.close()
+
+        publicados = 0
+        for excedido in vaga_service.serializar_excedidos(linhas):
+            event_log.publicar('tempo_excedido', {
+                'placa': excedido['veiculo'],
+                'vaga': excedido['numero'],
+                'tipo': excedido['tipo'],
+                'horas': excedido['horas']
+            })
+            publicados += 1
+
+        if publicados:
+            logger.info(f"{publicados} vaga(s) excederam o tempo limite de {limite_horas} horas")
+        return publicados, agora
+
+    def _varrer_redis(self, redis_client) -> int:
+        token = uuid.uuid4().hex
+        # Expira sozinho se o worker morrer no meio da rodada
+        if not redis_client.set(CHAVE_REDIS_LOCK, token, nx=True, px=int(self._intervalo * 1000)):
+            return 0
+        try:
+            valor = redis_client.get(CHAVE_REDIS_ULTIMA)
+            publicados, agora = self._varrer_janela(float(valor) if valor is not None else None)
+            redis_client.set(CHAVE_REDIS_ULTIMA, agora)
+            return publicados
+        finally:
+            if redis_client.get(CHAVE_REDIS_LOCK) in (token, token.encode()):
+                redis_client.delete(CHAVE_REDIS_LOCK)
+
+    def _varrer_arquivo(self) -> int:
+        fd = os.open(self._caminho, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            try:
+                fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                # Outro worker está varrendo esta janela
+                return 0
+            conteudo = os.pread(fd, 32, 0).strip()
+            publicados, agora = self._varrer_janela(float(conteudo) if conteudo else None)
+            # Largura fixa: a gravação nunca deixa o arquivo truncado
+            os.pwrite(fd, f"{agora:.6f}".rjust(32).encode(), 0)
+            return publicados
+        finally:
+            os.close(fd)
+
+# Instância global
+varredor_tempo_excedido = VarredorTempoExcedido(
+    SessionLocal,
+    active_config.TEMPO_EXCEDIDO_ARQUIVO,
+    intervalo=active_config.TEMPO_EXCEDIDO_INTERVALO
+)
@@ -686,7 +686,13 @@ window.addEventListener('beforeunload', function() {
 // Configuração do notificador
 const notificadorConfig = {
   intervaloVerificacao: 15000, // 15 segundos
+  intervaloComEventos: 120000, // 2 minutos quando o stream de eventos está ativo
   intervaloPrincipal: null,
+  intervaloAgendado: null,
+  fonteEventos: null,
+  atrasoEventos: 500, // agrupa os eventos recebidos em rajada numa só atualização
+  eventosPendentes: [],
+  timerEventos: null,
   ultimaVerificacao: null,
   veiculosExcedidos: []
 };
@@ -794,25 +800,117 @@ function reproduzirSomAlerta() {
   }
 }
 
-// Função para iniciar o monitoramento
-function iniciarNotificadorVeiculosExcedidos() {
-  // Verificação inicial
-  verificarVeiculosExcedidos();
-  
-  // Configurar verificação periódica
+// Intervalo de verificação periódica conforme o stream de eventos
+function intervaloVerificacaoAtual() {
+  const fonte = notificadorConfig.fonteEventos;
+  if (fonte && fonte.readyState === EventSource.OPEN) {
+    return notificadorConfig.intervaloComEventos;
+  }
+  return notificadorConfig.intervaloVerificacao;
+}
+
+// Reagenda a verificação periódica (fallback quando não há eventos)
+function reagendarVerificacao(intervalo) {
   if (notificadorConfig.intervaloPrincipal) {
     clearInterval(notificadorConfig.intervaloPrincipal);
   }
-  
+  notificadorConfig.intervaloAgendado = intervalo || intervaloVerificacaoAtual();
   notificadorConfig.intervaloPrincipal = setInterval(() => {
     verificarVeiculosExcedidos();
-  }, notificadorConfig.intervaloVerificacao);
+  }, notificadorConfig.intervaloAgendado);
+}
+
+// Conecta ao stream de eventos de ocupação (Server-Sent Events)
+function conectarEventosOcupacao() {
+  if (!window.EventSource || notificadorConfig.fonteEventos) {
+    return;
+  }
+  
+  const fonte = new EventSource('/eventos');
+  notificadorConfig.fonteEventos = fonte;
+  
+  // Em workers síncronos o backlog chega de uma vez: uma atualização por lote
+  const processarEventos = () => {
+    const eventos = notificadorConfig.eventosPendentes;
+    notificadorConfig.eventosPendentes = [];
+    notificadorConfig.timerEventos = null;
+    if (!eventos.length) {
+      return;
+    }
+    const ultimo = eventos[eventos.length - 1];
+    verificarVeiculosExcedidos();
+    window.dispatchEvent(new CustomEvent('estacionamento:evento', {
+      detail: { tipo: ultimo.tipo, dados: ultimo.dados, eventos: eventos }
+    }));
+  };
+  
+  const aoReceberEvento = (evento) => {
+    let dados = {};
+    try {
+      dados = JSON.parse(evento.data);
+    } catch (error) {
+      // Evento sem dados JSON
+    }
+    notificadorConfig.eventosPendentes.push({ tipo: evento.type, dados: dados });
+    if (!notificadorConfig.timerEventos) {
+      notificadorConfig.timerEventos = setTimeout(processarEventos, notificadorConfig.atrasoEventos);
+    }
+  };
+  
+  ['entrada', 'saida', 'remocao', 'tempo_excedido'].forEach(tipo => {
+    fonte.addEventListener(tipo, aoReceberEvento);
+  });
+  
+  // Com o stream ativo o polling vira apenas uma verificação de segurança
+  fonte.onopen = () => {
+    if (notificadorConfig.intervaloAgendado !== intervaloVerificacaoAtual()) {
+      reagendarVerificacao();
+    }
+  };
+  // Em workers síncronos o servidor encerra cada resposta e o navegador
+  // reconecta sozinho; só volta ao polling frequente se o stream desistir
+  fonte.onerror = () => {
+    if (fonte.readyState === EventSource.CLOSED) {
+      notificadorConfig.fonteEventos = null;
+      reagendarVerificacao();
+    }
+  };
+}
+
+// Indica se o stream de eventos está ativo (aberto ou reconectando)
+function eventosOcupacaoConectados() {
+  return Boolean(notificadorConfig.fonteEventos);
+}
+
+// Fecha o stream de eventos de ocupação
+function desconectarEventosOcupacao() {
+  if (notificadorConfig.timerEventos) {
+    clearTimeout(notificadorConfig.timerEventos);
+    notificadorConfig.timerEventos = null;
+    notificadorConfig.eventosPendentes = [];
+  }
+  if (notificadorConfig.fonteEventos) {
+    notificadorConfig.fonteEventos.close();
+    notificadorConfig.fonteEventos = null;
+  }
+}
+
+// Função para iniciar o monitoramento
+function iniciarNotificadorVeiculosExcedidos() {
+  // Verificação inicial
+  verificarVeiculosExcedidos();
+  
+  // Atualizações em tempo real; a verificação periódica fica como fallback
+  conectarEventosOcupacao();
+  reagendarVerificacao();
   
   console.log('✅ Sistema de notificação de veículos excedidos iniciado');
 }
 
 // Função para parar o monitoramento
 function pararNotificadorVeiculosExcedidos() {
+  desconectarEventosOcupacao();
+  
   if (notificadorConfig.intervaloPrincipal) {
     clearInterval(notificadorConfig.intervaloPrincipal);
     notificadorConfig.intervaloPrincipal = null;
@@ -830,6 +928,7 @@ function pararNotificadorVeiculosExcedidos() {
 function obterStatusNotificador() {
   return {
     ativo: !!notificadorConfig.intervaloPrincipal,
+    eventosConectados: !!notificadorConfig.fonteEventos,
     ultimaVerificacao: notificadorConfig.ultimaVerificacao,
     veiculosExcedidos: notificadorConfig.veiculosExcedidos.length,
     proximaVerificacao: notificadorConfig.ultimaVerificacao ? 
@@ -855,18 +954,12 @@ document.addEventListener('visibilitychange', function() {
   if (document.hidden) {
     // Página não está visível - manter funcionando mas reduzir frequência
     if (notificadorConfig.intervaloPrincipal) {
-      clearInterval(notificadorConfig.intervaloPrincipal);
-      notificadorConfig.intervaloPrincipal = setInterval(() => {
-        verificarVeiculosExcedidos();
-      }, 60000); // 1 minuto quando não visível
+      reagendarVerificacao(Math.max(60000, intervaloVerificacaoAtual())); // 1 minuto ou mais quando não visível
     }
   } else {
     // Página está visível - retomar frequência normal
     if (notificadorConfig.intervaloPrincipal) {
-      clearInterval(notificadorConfig.intervaloPrincipal);
-      notificadorConfig.intervaloPrincipal = setInterval(() => {
-        verificarVeiculosExcedidos();
-      }, notificadorConfig.intervaloVerificacao);
+      reagendarVerificacao();
     }
   }
 });
@@ -0,0 +1,16 @@
+"""
+Falha quando uma rota executa consultas proporcionais ao volume de dados (N+1)
+"""
+import sys
+from pathlib import Path
+sys.path.append(str(Path(__file__).parent.parent))
+
+# Deve ser importado antes da aplicação: aponta o banco para um SQLite temporário
+from scripts.detectar_n_mais_um import comparar, rotas_que_escalam
+
+def test_nenhuma_rota_escala_com_os_dados():
+    # A guarda do contador de consultas levanta NMaisUmDetectado por conta própria
+    medidas = comparar(n=10)
+    assert medidas, "nenhuma rota medida"
+    falhas = {rota: medidas[rota] for rota in rotas_que_escalam(medidas)}
+    assert not falhas, f"consultas (N, 10N) crescem com os dados: {falhas}"
@@ -1,11 +1,22 @@
 """
 Sistema de cache para o Sistema de Estacionamento
 """
+import os
 import json
+import math
+import time
+import uuid
+import heapq
+import random
+import struct
+import zlib
 import hashlib
-from typing import Any, Optional, Union
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple, Union
 from functools import wraps
-from datetime import datetime, timedelta
+from config import active_config
+from utils.serializers import Serializer, get_serializer
 
 try:
     import redis
@@ -13,12 +24,389 @@ try:
 except ImportError:
     REDIS_AVAILABLE = False
 
+try:
+    import fcntl
+    FCNTL_AVAILABLE = True
+except ImportError:
+    FCNTL_AVAILABLE = False
+
+class MemoryCache:
+    """Cache LRU em memória com TTL por entrada e limite de tamanho.
+
+    Guarda no máximo ``max_itens`` entradas e, se ``max_bytes`` > 0, no máximo
+    esse total de bytes (estimado pelo JSON do valor); ao passar do limite
+    descarta as entradas menos usadas. As expiradas saem por um heap de
+    vencimentos varrido a cada operação, sem esperar uma leitura da chave.
+    Entradas podem receber tags para invalidação em grupo.
+    """
+    def __init__(self, max_itens: int = 1000, max_bytes: int = 0):
+        self.max_itens = max_itens
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        # chave -> (valor, expira_em, tamanho, tags), da menos para a mais usada
+        self._dados: "OrderedDict[str, Tuple[Any, float, int, tuple]]" = OrderedDict()
+        self._vencimentos: List[Tuple[float, str]] = []
+        # tag -> chaves marcadas com ela
+        self._tags: Dict[str, set] = {}
+        self._bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def get(self, key: str) -> Optional[Any]:
+        with self._lock:
+            agora = time.monotonic()
+            self._varrer_expirados(agora)
+            item = self._dados.get(key)
+            if item is None or item[1] <= agora:
+                self.misses += 1
+                return None
+            self._dados.move_to_end(key)
+            self.hits += 1
+            return item[0]
+
+    def set(self, key: str, value: Any, ttl: int = 300, tags: Iterable[str] = ()) -> bool:
+        tamanho = self._estimar_tamanho(value) if self.max_bytes > 0 else 0
+        if self.max_bytes > 0 and tamanho > self.max_bytes:
+            # Maior que o cache inteiro: não vale expulsar todo o resto
+            self.delete(key)
+            return False
+
+        with self._lock:
+            agora = time.monotonic()
+            expira_em = agora + ttl
+            self._remover(key)
+            tags = tuple(tags)
+            self._dados[key] = (value, expira_em, tamanho, tags)
+            self._bytes += tamanho
+            for tag in tags:
+                self._tags.setdefault(tag, set()).add(key)
+            heapq.heappush(self._vencimentos, (expira_em, key))
+            self._varrer_expirados(agora)
+            self._aplicar_limites()
+            return True
+
+    def delete(self, key: str) -> bool:
+        with self._lock:
+            return self._remover(key)
+
+    def chaves_com_tags(self, *tags: str) -> List[str]:
+        """Chaves marcadas com alguma das tags"""
+        with self._lock:
+            return list({key for tag in tags for key in self._tags.get(tag, ())})
+
+    def invalidate_tags(self, *tags: str) -> int:
+        """Remove todas as entradas marcadas com alguma das tags"""
+        with self._lock:
+            removidas = 0
+            for tag in tags:
+                for key in list(self._tags.get(tag, ())):
+                    removidas += self._remover(key)
+            return removidas
+
+    def clear(self):
+        with self._lock:
+            self._dados.clear()
+            self._vencimentos.clear()
+            self._tags.clear()
+            self._bytes = 0
+
+    def __contains__(self, key: str) -> bool:
+        with self._lock:
+            item = self._dados.get(key)
+            return item is not None and item[1] > time.monotonic()
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._dados)
+
+    def stats(self) -> Dict[str, Any]:
+        """Contadores de uso do cache em memória"""
+        with self._lock:
+            self._varrer_expirados(time.monotonic())
+            total = self.hits + self.misses
+            return {
+                'itens': len(self._dados),
+                'bytes': self._bytes,
+                'max_itens': self.max_itens,
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / total, 4) if total else 0.0,
+                'evictions': self.evictions,
+                'expirations': self.expirations
+            }
+
+    @staticmethod
+    def _estimar_tamanho(value: Any) -> int:
+        try:
+            return len(json.dumps(value, default=str))
+        except (TypeError, ValueError):
+            return len(repr(value))
+
+    def _remover(self, key: str) -> bool:
+        # A entrada correspondente no heap é descartada na varredura
+        item = self._dados.pop(key, None)
+        if item is None:
+            return False
+        self._descartar(key, item)
+        return True
+
+    def _descartar(self, key: str, item: tuple):
+        """Atualiza os totais e o índice de tags de uma entrada removida"""
+        self._bytes -= item[2]
+        for tag in item[3]:
+            chaves = self._tags.get(tag)
+            if chaves is not None:
+                chaves.discard(key)
+                if not chaves:
+                    del self._tags[tag]
+
+    def _varrer_expirados(self, agora: float):
+        vencimentos = self._vencimentos
+        while vencimentos and vencimentos[0][0] <= agora:
+            expira_em, key = heapq.heappop(vencimentos)
+            item = self._dados.get(key)
+            # Ignorar entradas antigas de chaves regravadas ou removidas
+            if item is not None and item[1] == expira_em:
+                self._remover(key)
+                self.expirations += 1
+
+        # Compactar o heap quando acumula muitas entradas obsoletas
+        if len(vencimentos) > 2 * len(self._dados) + 64:
+            self._vencimentos = [(item[1], key) for key, item in self._dados.items()]
+            heapq.heapify(self._vencimentos)
+
+    def _aplicar_limites(self):
+        while self._dados and (
+            len(self._dados) > self.max_itens
+            or (self.max_bytes > 0 and self._bytes > self.max_bytes)
+        ):
+            key, item = self._dados.popitem(last=False)
+            self._descartar(key, item)
+            self.evictions += 1
+
+class _Chamada:
+    """Execução em andamento de uma chave no SingleFlight"""
+    def __init__(self):
+        self.evento = threading.Event()
+        self.resultado = None
+        self.erro: Optional[BaseException] = None
+
+class SingleFlight:
+    """Garante uma única execução simultânea por chave neste processo.
+
+    Quem chega enquanto a chave está sendo calculada espera e recebe o
+    mesmo resultado, em vez de repetir a consulta.
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._chamadas: Dict[str, _Chamada] = {}
+
+    def em_andamento(self, key: str) -> bool:
+        with self._lock:
+            return key in self._chamadas
+
+    def executar(self, key: str, func):
+        with self._lock:
+            chamada = self._chamadas.get(key)
+            lider = chamada is None
+            if lider:
+                chamada = self._chamadas[key] = _Chamada()
+
+        if not lider:
+            chamada.evento.wait()
+            if chamada.erro is not None:
+                raise chamada.erro
+            return chamada.resultado
+
+        try:
+            chamada.resultado = func()
+            return chamada.resultado
+        except BaseException as e:
+            chamada.erro = e
+            raise
+        finally:
+            with self._lock:
+                self._chamadas.pop(key, None)
+            chamada.evento.set()
+
+# Marca dos valores gravados por get_or_set (valor + metadados de expiração)
+MARCA_ENVELOPE = '__cache__'
+
+# Tempo máximo de um cálculo com o lock entre workers (segundos)
+LOCK_CALCULO_TIMEOUT = 10
+
+# Expiração dos conjuntos de chaves de cada tag no Redis (segundos)
+TAG_TTL = 86400
+
+# Sinaliza que outro worker está recalculando a chave
+_EM_OUTRO_WORKER = object()
+
+# Canal de pub/sub com as invalidações do cache L1
+CANAL_INVALIDACAO = 'cache:invalidacao'
+
+# Namespace das chaves do cache no Redis; o mesmo banco guarda sessões,
+# eventos e a versão de ocupação, que clear() não pode apagar
+PREFIXO_REDIS = 'cache:'
+
+class BrokerLocal:
+    """Substituto em processo do pub/sub do Redis, para testes e desenvolvimento.
+
+    Vários CacheManager ligados ao mesmo BrokerLocal se comportam como
+    workers distintos recebendo as invalidações uns dos outros.
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._assinantes: List[Callable[[dict], None]] = []
+
+    def publicar(self, mensagem: dict):
+        with self._lock:
+            assinantes = list(self._assinantes)
+        for callback in assinantes:
+            callback(mensagem)
+
+    def assinar(self, callback: Callable[[dict], None], ao_perder_mensagens: Callable[[], None]):
+        with self._lock:
+            self._assinantes.append(callback)
+
+class BrokerRedis:
+    """Pub/sub do Redis: uma thread por processo recebe as invalidações"""
+    def __init__(self, redis_client, canal: str = CANAL_INVALIDACAO):
+        self.redis_client = redis_client
+        self.canal = canal
+
+    def publicar(self, mensagem: dict):
+        try:
+            self.redis_client.publish(self.canal, json.dumps(mensagem, default=str))
+        except Exception:
+            pass
+
+    def assinar(self, callback: Callable[[dict], None], ao_perder_mensagens: Callable[[], None]):
+        threading.Thread(
+            target=self._escutar,
+            args=(callback, ao_perder_mensagens),
+            name='cache-invalidacao',
+            daemon=True
+        ).start()
+
+    def _escutar(self, callback, ao_perder_mensagens):
+        while True:
+            try:
+                pubsub = self.redis_client.pubsub(ignore_subscribe_messages=True)
+                pubsub.subscribe(self.canal)
+                # Mensagens publicadas antes da (re)inscrição foram perdidas
+                ao_perder_mensagens()
+                for mensagem in pubsub.listen():
+                    try:
+                        callback(json.loads(mensagem['data']))
+                    except (TypeError, ValueError, KeyError):
+                        continue
+            except Exception:
+                ao_perder_mensagens()
+                time.sleep(1)
+
+class VersaoHost:
+    """Versões das tags de cache compartilhadas pelos workers do host via flock.
+
+    Sem Redis cada worker tem o próprio cache em memória e uma invalidação
+    só limpa o worker que escreveu. Cada tag ocupa um slot de 8 bytes no
+    arquivo (crc32 da tag módulo ``slots``), incrementado a cada
+    invalidação; os valores de ``get_or_set`` guardam as versões das
+    próprias tags e deixam de valer quando alguma delas muda em qualquer
+    worker. Tags que caem no mesmo slot só causam um recálculo a mais.
+    Sem fcntl (um único processo) as versões ficam fixas.
+    """
+    TAMANHO_SLOT = 8
+
+    def __init__(self, caminho: str, slots: int = 4096):
+        self._caminho = caminho
+        self.slots = slots
+        self._fd: Optional[int] = None
+        self._fd_pid: Optional[int] = None
+
+    def versoes(self, tags: Iterable[str]) -> Tuple[int, ...]:
+        """Versão atual de cada tag"""
+        posicoes = [self._posicao(tag) for tag in tags]
+        if not posicoes:
+            return ()
+        return tuple(self._acessar(posicoes, incrementar=False))
+
+    def incrementar(self, tags: Iterable[str]):
+        """Invalida as tags em todos os workers do host"""
+        posicoes = sorted({self._posicao(tag) for tag in tags})
+        if posicoes:
+            self._acessar(posicoes, incrementar=True)
+
+    def incrementar_todas(self):
+        """Invalida todas as tags (cache limpo)"""
+        self._acessar(range(0, self.slots * self.TAMANHO_SLOT, self.TAMANHO_SLOT), incrementar=True)
+
+    def _posicao(self, tag: str) -> int:
+        return (zlib.crc32(tag.encode()) % self.slots) * self.TAMANHO_SLOT
+
+    def _descritor(self) -> Optional[int]:
+        # Um descritor por processo: flock num descritor herdado do fork
+        # seria compartilhado com o processo pai e não excluiria nada
+        pid = os.getpid()
+        if self._fd_pid != pid:
+            try:
+                self._fd = os.open(self._caminho, os.O_RDWR | os.O_CREAT, 0o644)
+            except OSError:
+                self._fd = None
+            self._fd_pid = pid
+        return self._fd
+
+    def _acessar(self, posicoes: Iterable[int], incrementar: bool) -> List[int]:
+        posicoes = list(posicoes)
+        fd = self._descritor() if FCNTL_AVAILABLE else None
+        if fd is None:
+            return [0] * len(posicoes)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX if incrementar else fcntl.LOCK_SH)
+            try:
+                versoes = []
+                for posicao in posicoes:
+                    dados = os.pread(fd, self.TAMANHO_SLOT, posicao)
+                    versao = struct.unpack('>Q', dados)[0] if len(dados) == self.TAMANHO_SLOT else 0
+                    if incrementar:
+                        versao += 1
+                        os.pwrite(fd, struct.pack('>Q', versao), posicao)
+                    versoes.append(versao)
+                return versoes
+            finally:
+                fcntl.flock(fd, fcntl.LOCK_UN)
+        except OSError:
+            return [0] * len(posicoes)
+
 class CacheManager:
-    """Gerenciador de cache com fallback para memória"""
+    """Gerenciador de cache com fallback para memória.
+
+    Com Redis (ou um ``broker`` explícito) funciona em duas camadas: um L1
+    pequeno em memória de cada worker na frente do cache compartilhado (L2).
+    Toda escrita ou invalidação é publicada no broker, e os outros workers
+    descartam suas cópias L1; o TTL curto do L1 limita a defasagem se uma
+    mensagem se perder.
+
+    Sem nenhum dos dois o cache é só do worker; com ``versao_arquivo`` os
+    valores de ``get_or_set`` são descartados quando uma das suas tags é
+    invalidada em qualquer worker do host (ver ``VersaoHost``).
+    """
     
-    def __init__(self, redis_url: Optional[str] = None):
+    def __init__(self, redis_url: Optional[str] = None, max_itens: int = 1000, max_bytes: int = 0,
+                 l1_ttl: float = 0, l1_max_itens: int = 500, broker=None,
+                 memory_cache: Optional[MemoryCache] = None, serializer: Optional[Serializer] = None,
+                 versao_arquivo: Optional[str] = None):
         self.redis_client = None
-        self.memory_cache = {}
+        # Formato dos valores gravados no Redis (datetime e Decimal preservados)
+        self.serializer = serializer or get_serializer()
+        if memory_cache is None:
+            memory_cache = MemoryCache(max_itens=max_itens, max_bytes=max_bytes)
+        self.memory_cache = memory_cache
+        self._single_flight = SingleFlight()
+        self._geracoes: Dict[str, int] = {}
+        self._geracoes_lock = threading.Lock()
         
         if redis_url and REDIS_AVAILABLE:
             try:
@@ -29,6 +417,23 @@ class CacheManager:
         
         if not self.redis_client:
             print("⚠️ Redis não disponível, usando cache em memória")
+        
+        # Camada L1: ativa com Redis ou com um broker informado explicitamente
+        if broker is None and self.redis_client and l1_ttl > 0:
+            broker = BrokerRedis(self.redis_client)
+        self._broker = broker
+        self.l1: Optional[MemoryCache] = MemoryCache(max_itens=l1_max_itens) if broker else None
+        self.l1_ttl = l1_ttl if l1_ttl > 0 else 30
+        self._l1_geracao = 0
+        self._l1_lock = threading.Lock()
+        self._assinatura_pid: Optional[int] = None
+        self._origem = ''
+        self._versao_host = VersaoHost(versao_arquivo) if versao_arquivo and not self.compartilhado else None
+
+    @property
+    def compartilhado(self) -> bool:
+        """Indica se escritas e invalidações chegam aos outros workers (Redis ou broker)"""
+        return self.redis_client is not None or self._broker is not None
     
     def _generate_key(self, prefix: str, *args, **kwargs) -> str:
         """Gera chave única para o cache"""
@@ -37,72 +442,342 @@ class CacheManager:
     
     def get(self, key: str) -> Optional[Any]:
         """Recupera valor do cache"""
+        if self.l1 is None:
+            return self._get_l2(key)[0]
+        
+        self._garantir_assinatura()
+        value = self.l1.get(key)
+        if value is not None:
+            return value
+        
+        geracao = self._l1_geracao
+        value, ttl_restante = self._get_l2(key)
+        # Não guardar no L1 um valor lido antes de uma invalidação recebida
+        if value is not None and geracao == self._l1_geracao:
+            self.l1.set(key, value, min(self.l1_ttl, ttl_restante))
+        return value
+    
+    def _get_l2(self, key: str) -> Tuple[Optional[Any], float]:
+        """Lê do Redis (ou da memória) e retorna (valor, TTL restante em segundos)"""
         if self.redis_client:
             try:
-                value = self.redis_client.get(key)
-                return json.loads(value) if value else None
+                pipe = self.redis_client.pipeline()
+                pipe.get(_chave_redis(key))
+                pipe.pttl(_chave_redis(key))
+                value, pttl = pipe.execute()
+                if not value:
+                    return None, 0
+                return self.serializer.loads(value), (pttl / 1000 if pttl and pttl > 0 else self.l1_ttl)
             except Exception:
                 pass
         
         # Fallback para memória
-        if key in self.memory_cache:
-            data = self.memory_cache[key]
-            if data['expires_at'] > datetime.now():
-                return data['value']
-            else:
-                del self.memory_cache[key]
-        
-        return None
+        return self.memory_cache.get(key), self.l1_ttl
     
-    def set(self, key: str, value: Any, ttl: int = 300) -> bool:
-        """Define valor no cache com TTL"""
-        expires_at = datetime.now() + timedelta(seconds=ttl)
-        
+    def set(self, key: str, value: Any, ttl: int = 300, tags: Iterable[str] = ()) -> bool:
+        """Define valor no cache com TTL e, opcionalmente, tags de invalidação"""
+        tags = tuple(tags)
+        gravado = self._set_l2(key, value, ttl, tags)
+        if self.l1 is not None:
+            # Publicar só depois de gravar no L2, para que os outros workers
+            # não releiam o valor antigo
+            self._garantir_assinatura()
+            self.l1.set(key, value, min(self.l1_ttl, ttl), tags)
+            self._publicar(chaves=[key])
+        return gravado
+    
+    def _set_l2(self, key: str, value: Any, ttl: int, tags: tuple) -> bool:
         if self.redis_client:
             try:
-                return self.redis_client.setex(
-                    key, 
-                    ttl, 
-                    json.dumps(value, default=str)
-                )
+                pipe = self.redis_client.pipeline()
+                pipe.setex(_chave_redis(key), ttl, self.serializer.dumps(value))
+                for tag in tags:
+                    pipe.sadd(_chave_redis(f"tag:{tag}"), key)
+                    pipe.expire(_chave_redis(f"tag:{tag}"), TAG_TTL)
+                return bool(pipe.execute()[0])
             except Exception:
                 pass
         
         # Fallback para memória
-        self.memory_cache[key] = {
-            'value': value,
-            'expires_at': expires_at
-        }
-        return True
+        return self.memory_cache.set(key, value, ttl, tags)
     
     def delete(self, key: str) -> bool:
         """Remove valor do cache"""
+        removido = self._delete_l2(key)
+        if self.l1 is not None:
+            self.l1.delete(key)
+            self._publicar(chaves=[key])
+        return removido
+    
+    def _delete_l2(self, key: str) -> bool:
         if self.redis_client:
             try:
-                return bool(self.redis_client.delete(key))
+                return bool(self.redis_client.delete(_chave_redis(key)))
             except Exception:
                 pass
         
         # Fallback para memória
-        if key in self.memory_cache:
-            del self.memory_cache[key]
-            return True
-        
-        return False
+        return self.memory_cache.delete(key)
     
+    def invalidate_tags(self, *tags: str) -> int:
+        """Remove as chaves marcadas com as tags, no Redis e na memória"""
+        if not tags:
+            return 0
+        with self._geracoes_lock:
+            for tag in tags:
+                self._geracoes[tag] = self._geracoes.get(tag, 0) + 1
+        if self._versao_host is not None:
+            self._versao_host.incrementar(tags)
+
+        chaves_removidas = self.memory_cache.chaves_com_tags(*tags)
+        removidas = self.memory_cache.invalidate_tags(*tags)
+        chaves_redis = []
+        if self.redis_client:
+            try:
+                for tag in tags:
+                    chaves = [
+                        chave.decode() if isinstance(chave, bytes) else chave
+                        for chave in self.redis_client.smembers(_chave_redis(f"tag:{tag}"))
+                    ]
+                    pipe = self.redis_client.pipeline()
+                    pipe.incr(_chave_redis(f"tagver:{tag}"))
+                    if chaves:
+                        pipe.delete(*(_chave_redis(chave) for chave in chaves))
+                    pipe.delete(_chave_redis(f"tag:{tag}"))
+                    pipe.execute()
+                    chaves_redis.extend(chaves)
+                removidas += len(chaves_redis)
+            except Exception:
+                pass
+        
+        if self.l1 is not None:
+            # O L1 dos outros workers não conhece as tags das chaves lidas do L2
+            chaves_removidas.extend(chaves_redis)
+            self.l1.invalidate_tags(*tags)
+            for chave in chaves_removidas:
+                self.l1.delete(chave)
+            self._publicar(chaves=chaves_removidas, tags=list(tags))
+        return removidas
+
+    def _geracao(self, tags: tuple) -> tuple:
+        """Versão atual das tags, para descartar cálculos feitos antes de uma invalidação"""
+        if not tags:
+            return ()
+        if self.redis_client:
+            try:
+                return tuple(self.redis_client.mget([_chave_redis(f"tagver:{tag}") for tag in tags]))
+            except Exception:
+                pass
+        with self._geracoes_lock:
+            geracao = tuple(self._geracoes.get(tag, 0) for tag in tags)
+        if self._versao_host is not None:
+            geracao += self._versao_host.versoes(tags)
+        return geracao
+
     def clear(self) -> bool:
         """Limpa todo o cache"""
+        limpo = self._clear_l2()
+        if self._versao_host is not None:
+            self._versao_host.incrementar_todas()
+        if self.l1 is not None:
+            self.l1.clear()
+            self._publicar(limpar=True)
+        return limpo
+    
+    def _clear_l2(self) -> bool:
         if self.redis_client:
             try:
-                return bool(self.redis_client.flushdb())
+                # Só o namespace do cache (valores, tags, versões e locks)
+                lote = []
+                for chave in self.redis_client.scan_iter(match=f"{PREFIXO_REDIS}*", count=500):
+                    lote.append(chave)
+                    if len(lote) >= 500:
+                        self.redis_client.unlink(*lote)
+                        lote = []
+                if lote:
+                    self.redis_client.unlink(*lote)
+                return True
             except Exception:
                 pass
         
         # Fallback para memória
         self.memory_cache.clear()
         return True
+    
+    def _garantir_assinatura(self):
+        """Assina o canal de invalidação uma vez por processo (após o fork do worker)"""
+        pid = os.getpid()
+        if self._assinatura_pid == pid:
+            return
+        with self._l1_lock:
+            if self._assinatura_pid == pid:
+                return
+            # Cópias herdadas do processo pai podem estar desatualizadas
+            self.l1.clear()
+            self._origem = uuid.uuid4().hex
+            self._broker.assinar(self._receber_invalidacao, self._descartar_l1)
+            self._assinatura_pid = pid
+    
+    def _publicar(self, chaves: Iterable[str] = (), tags: Iterable[str] = (), limpar: bool = False):
+        self._broker.publicar({
+            'origem': self._origem,
+            'chaves': list(chaves),
+            'tags': list(tags),
+            'limpar': limpar
+        })
+    
+    def _receber_invalidacao(self, mensagem: dict):
+        """Aplica no L1 uma invalidação publicada por outro worker"""
+        if mensagem.get('origem') == self._origem:
+            return
+        with self._l1_lock:
+            self._l1_geracao += 1
+        if mensagem.get('limpar'):
+            self.l1.clear()
+            return
+        for chave in mensagem.get('chaves', ()):
+            self.l1.delete(chave)
+        self.l1.invalidate_tags(*mensagem.get('tags', ()))
+    
+    def _descartar_l1(self):
+        """Esvazia o L1 quando invalidações podem ter sido perdidas"""
+        with self._l1_lock:
+            self._l1_geracao += 1
+        self.l1.clear()
+    
+    def get_or_set(self, key: str, func, ttl: int = 300, stale_ttl: int = 60, beta: float = 1.0,
+                   tags: Iterable[str] = ()) -> Any:
+        """Retorna o valor da chave, calculando com ``func`` quando necessário.
+
+        Protege contra o efeito manada na expiração:
+        - cada chave é calculada uma vez por processo (e, com Redis, uma vez
+          entre os workers, por um lock com expiração);
+        - perto do fim do TTL uma requisição sorteada recalcula antes do
+          prazo, com probabilidade maior quanto mais caro o cálculo (XFetch);
+        - por até ``stale_ttl`` segundos após o TTL o valor antigo continua
+          sendo servido enquanto uma única requisição o recalcula.
+        Resultados None não são guardados. ``tags`` permitem invalidar a
+        chave com ``invalidate_tags``.
+        """
+        tags = tuple(tags)
+        envelope = self.get(key)
+        if (self._versao_host is not None and tags and isinstance(envelope, dict)
+                and envelope.get(MARCA_ENVELOPE)
+                and envelope.get('versao') != list(self._versao_host.versoes(tags))):
+            # Outro worker invalidou uma das tags depois do cálculo
+            envelope = None
+        if not (isinstance(envelope, dict) and envelope.get(MARCA_ENVELOPE)):
+            if envelope is not None:
+                # Valor gravado diretamente com set()
+                return envelope
+            return self._single_flight.executar(
+                key, lambda: self._recalcular(key, func, ttl, stale_ttl, tags, esperar=True)
+            )
+
+        agora = time.time()
+        valor, expira_em, delta = envelope['v'], envelope['expira_em'], envelope['delta']
+        # XFetch: antecipar a renovação em -delta * beta * ln(U), U em (0, 1]
+        if agora - delta * beta * math.log(1.0 - random.random()) < expira_em:
+            return valor
+
+        # Renovação antecipada ou valor vencido: só uma requisição recalcula
+        if self._single_flight.em_andamento(key):
+            return valor
+        try:
+            novo = self._single_flight.executar(
+                key, lambda: self._recalcular(key, func, ttl, stale_ttl, tags, esperar=False)
+            )
+        except Exception:
+            if agora < expira_em + stale_ttl:
+                return valor
+            raise
+        return valor if novo is _EM_OUTRO_WORKER else novo
+
+    def _recalcular(self, key: str, func, ttl: int, stale_ttl: int, tags: tuple, esperar: bool) -> Any:
+        """Calcula e grava o valor, coordenando com os outros workers via Redis"""
+        token = self._adquirir_lock(key, ttl)
+        if token is False:
+            # Outro worker já está calculando esta chave
+            if not esperar:
+                return _EM_OUTRO_WORKER
+            envelope = self._aguardar_envelope(key)
+            if envelope is not None:
+                return envelope['v']
+
+        try:
+            geracao = self._geracao(tags)
+            # Sem Redis, _geracao termina com as versões das tags no host
+            versao = list(geracao[len(tags):]) if self._versao_host is not None else None
+            inicio = time.monotonic()
+            valor = func()
+            delta = time.monotonic() - inicio
+            # Uma invalidação durante o cálculo torna o valor suspeito: não gravar
+            if valor is not None and self._geracao(tags) == geracao:
+                self.set(key, {
+                    MARCA_ENVELOPE: 1,
+                    'v': valor,
+                    'expira_em': time.time() + ttl,
+                    'delta': delta,
+                    'versao': versao
+                }, ttl + stale_ttl, tags)
+            return valor
+        finally:
+            if token:
+                self._liberar_lock(key, token)
 
-def cache_result(ttl: int = 300, key_prefix: str = "func"):
+    def _adquirir_lock(self, key: str, ttl: int) -> Union[str, bool, None]:
+        """Lock entre workers: token se obtido, False se ocupado, None sem Redis"""
+        if not self.redis_client:
+            return None
+        token = uuid.uuid4().hex
+        try:
+            timeout_ms = int(min(ttl, LOCK_CALCULO_TIMEOUT) * 1000)
+            if self.redis_client.set(_chave_redis(f"lock:{key}"), token, nx=True, px=max(timeout_ms, 1)):
+                return token
+            return False
+        except Exception:
+            return None
+
+    def _liberar_lock(self, key: str, token: str):
+        try:
+            if self.redis_client.get(_chave_redis(f"lock:{key}")) in (token, token.encode()):
+                self.redis_client.delete(_chave_redis(f"lock:{key}"))
+        except Exception:
+            pass
+
+    def _aguardar_envelope(self, key: str) -> Optional[dict]:
+        """Espera o worker que detém o lock gravar o valor"""
+        limite = time.monotonic() + LOCK_CALCULO_TIMEOUT
+        while time.monotonic() < limite:
+            time.sleep(0.05)
+            envelope = self.get(key)
+            if isinstance(envelope, dict) and envelope.get(MARCA_ENVELOPE):
+                return envelope
+        return None
+    
+    def stats(self) -> dict:
+        """Retorna o backend em uso e os contadores do cache em memória"""
+        stats = {
+            'backend': 'redis' if self.redis_client else 'memoria',
+            'memoria': self.memory_cache.stats()
+        }
+        if self.l1 is not None:
+            stats['l1'] = self.l1.stats()
+        return stats
+
+def _chave_redis(chave: str) -> str:
+    """Chave do cache no Redis, dentro do namespace PREFIXO_REDIS"""
+    return f"{PREFIXO_REDIS}{chave}"
+
+def _resolver_tags(tags, args, kwargs) -> tuple:
+    """Tags fixas (lista) ou calculadas a partir dos argumentos (função)"""
+    if tags is None:
+        return ()
+    if callable(tags):
+        return tuple(tags(*args, **kwargs))
+    return tuple(tags)
+
+def cache_result(ttl: int = 300, key_prefix: str = "func", stale_ttl: int = 60, tags=None):
     """Decorator para cachear resultados de funções"""
     def decorator(func):
         @wraps(func)
@@ -115,37 +790,40 @@ def cache_result(ttl: int = 300, key_prefix: str = "func"):
             # Gerar chave única
             cache_key = cache._generate_key(key_prefix, func.__name__, *args, **kwargs)
             
-            # Tentar recuperar do cache
-            result = cache.get(cache_key)
-            if result is not None:
-                return result
-            
-            # Executar função e cachear resultado
-            result = func(*args, **kwargs)
-            cache.set(cache_key, result, ttl)
-            
-            return result
+            # Cálculo único por chave, renovação antecipada e valor antigo durante a renovação
+            return cache.get_or_set(
+                cache_key, lambda: func(*args, **kwargs), ttl, stale_ttl,
+                tags=_resolver_tags(tags, args, kwargs)
+            )
         return wrapper
     return decorator
 
 # Instância global do cache
-cache_manager = CacheManager()
+cache_manager = CacheManager(
+    active_config.REDIS_URL,
+    max_itens=active_config.CACHE_MEMORIA_MAX_ITENS,
+    max_bytes=active_config.CACHE_MEMORIA_MAX_BYTES,
+    l1_ttl=active_config.CACHE_L1_TTL,
+    l1_max_itens=active_config.CACHE_L1_MAX_ITENS,
+    serializer=get_serializer(active_config.CACHE_SERIALIZER),
+    versao_arquivo=active_config.CACHE_VERSAO_ARQUIVO
+)
 
 # Decorator para usar com a instância global
-def cached(ttl: int = 300, key_prefix: str = "func"):
-    """Decorator para cachear resultados usando cache global"""
+def cached(ttl: int = 300, key_prefix: str = "func", stale_ttl: int = 60, tags=None):
+    """Decorator para cachear resultados usando cache global.
+
+    ``tags`` é uma lista de tags ou uma função que recebe os mesmos
+    argumentos da função decorada e retorna as tags da chave.
+    """
     def decorator(func):
         @wraps(func)
         def wrapper(*args, **kwargs):
             cache_key = cache_manager._generate_key(key_prefix, func.__name__, *args, **kwargs)
             
-            result = cache_manager.get(cache_key)
-            if result is not None:
-                return result
-            
-            result = func(*args, **kwargs)
-            cache_manager.set(cache_key, result, ttl)
-            
-            return result
+            return cache_manager.get_or_set(
+                cache_key, lambda: func(*args, **kwargs), ttl, stale_ttl,
+                tags=_resolver_tags(tags, args, kwargs)
+            )
         return wrapper
     return decorator
@@ -0,0 +1,167 @@
+"""
+Registro de eventos de ocupação compartilhado entre workers (SSE e long-poll)
+"""
+import json
+import os
+import time
+import threading
+from collections import deque
+from typing import Dict, List, Optional, Tuple
+from config import active_config
+from utils.cache import cache_manager
+
+try:
+    import fcntl
+    FCNTL_AVAILABLE = True
+except ImportError:
+    FCNTL_AVAILABLE = False
+
+# Chaves usadas quando os eventos ficam no Redis
+CHAVE_REDIS_SEQUENCIA = 'eventos:seq'
+CHAVE_REDIS_LOG = 'eventos:log'
+
+class EventLog:
+    """Guarda os últimos eventos publicados, em ordem crescente de id.
+
+    Com Redis os eventos ficam em uma lista; sem ele, em um arquivo JSON
+    reescrito sob flock, que qualquer worker do host consegue ler. Os ids
+    começam no horário atual em milissegundos, então um registro recriado
+    não reaproveita ids já entregues.
+    """
+    def __init__(self, caminho: str, capacidade: int = 200, intervalo_consulta: float = 0.5):
+        self._caminho = caminho
+        self._capacidade = capacidade
+        self._intervalo_consulta = intervalo_consulta
+        self._lock = threading.Lock()
+        self._local = deque(maxlen=capacidade)
+        # Cache do arquivo: (inode, mtime_ns, tamanho) -> eventos já decodificados
+        self._assinatura: Optional[Tuple[int, int, int]] = None
+        self._eventos_arquivo: List[Dict] = []
+
+    def publicar(self, tipo: str, dados: Optional[dict] = None) -> int:
+        """Publica um evento e retorna o id atribuído"""
+        evento = {'tipo': tipo, 'dados': dados or {}, 'timestamp': time.time()}
+
+        redis_client = cache_manager.redis_client
+        if redis_client:
+            try:
+                return self._publicar_redis(redis_client, evento)
+            except Exception:
+                pass
+
+        if FCNTL_AVAILABLE:
+            try:
+                return self._publicar_arquivo(evento)
+            except OSError:
+                pass
+
+        with self._lock:
+            ultimo = self._local[-1]['id'] if self._local else self._id_inicial()
+            evento['id'] = ultimo + 1
+            self._local.append(evento)
+            return evento['id']
+
+    def desde(self, ultimo_id: int) -> List[Dict]:
+        """Retorna os eventos com id maior que ``ultimo_id``"""
+        return [evento for evento in self._todos() if evento['id'] > ultimo_id]
+
+    def ultimo_id(self) -> int:
+        """Id do evento mais recente (0 se não houver eventos)"""
+        eventos = self._todos()
+        return eventos[-1]['id'] if eventos else 0
+
+    def aguardar(self, ultimo_id: int, timeout: float) -> List[Dict]:
+        """Espera até ``timeout`` segundos por eventos posteriores a ``ultimo_id``"""
+        limite = time.monotonic() + timeout
+        while True:
+            eventos = self.desde(ultimo_id)
+            restante = limite - time.monotonic()
+            if eventos or restante <= 0:
+                return eventos
+            time.sleep(min(self._intervalo_consulta, restante))
+
+    def _publicar_redis(self, redis_client, evento: dict) -> int:
+        """Atribui o id e anexa o evento numa única transação (WATCH/MULTI).
+
+        Com o id e o RPUSH em comandos separados, dois publicadores podiam
+        gravar o evento 8 antes do 7, e um cliente que já viu o 8 nunca
+        receberia o 7. Se outro worker avançar a sequência no meio, a
+        transação é refeita.
+        """
+        def transacao(pipe):
+            atual = pipe.get(CHAVE_REDIS_SEQUENCIA)
+            evento['id'] = int(atual) + 1 if atual is not None else self._id_inicial()
+            pipe.multi()
+            pipe.set(CHAVE_REDIS_SEQUENCIA, evento['id'])
+            pipe.rpush(CHAVE_REDIS_LOG, json.dumps(evento, default=str))
+            pipe.ltrim(CHAVE_REDIS_LOG, -self._capacidade, -1)
+
+        redis_client.transaction(transacao, CHAVE_REDIS_SEQUENCIA)
+        return evento['id']
+
+    @staticmethod
+    def _id_inicial() -> int:
+        return int(time.time() * 1000)
+
+    def _todos(self) -> List[Dict]:
+        redis_client = cache_manager.redis_client
+        if redis_client:
+            try:
+                return [json.loads(item) for item in redis_client.lrange(CHAVE_REDIS_LOG, 0, -1)]
+            except Exception:
+                pass
+
+        if FCNTL_AVAILABLE:
+            try:
+                return self._ler_arquivo()
+            except OSError:
+                pass
+
+        with self._lock:
+            return list(self._local)
+
+    def _ler_arquivo(self) -> List[Dict]:
+        """Lê o arquivo de eventos, reaproveitando a última leitura se não mudou"""
+        try:
+            info = os.stat(self._caminho)
+        except FileNotFoundError:
+            return []
+        # Cada publicação troca o arquivo por rename, gerando um novo inode
+        assinatura = (info.st_ino, info.st_mtime_ns, info.st_size)
+        with self._lock:
+            if assinatura == self._assinatura:
+                return self._eventos_arquivo
+        # O arquivo é substituído por rename, então a leitura nunca é parcial
+        with open(self._caminho, 'r', encoding='utf-8') as f:
+            try:
+                eventos = json.load(f)
+            except ValueError:
+                eventos = []
+        with self._lock:
+            self._assinatura = assinatura
+            self._eventos_arquivo = eventos
+        return eventos
+
+    def _publicar_arquivo(self, evento: dict) -> int:
+        fd = os.open(self._caminho + '.lock', os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX)
+            eventos = self._ler_arquivo()
+            evento['id'] = eventos[-1]['id'] + 1 if eventos else self._id_inicial()
+            eventos = (eventos + [evento])[-self._capacidade:]
+
+            temporario = f"{self._caminho}.{os.getpid()}.tmp"
+            with open(temporario, 'w', encoding='utf-8') as f:
+                json.dump(eventos, f, default=str)
+            os.replace(temporario, self._caminho)
+            return evento['id']
+        finally:
+            os.close(fd)
+
+def formatar_sse(evento: dict) -> str:
+    """Formata um evento no protocolo Server-Sent Events"""
+    dados = json.dumps({**evento['dados'], 'timestamp': evento['timestamp']}, default=str)
+    return f"id: {evento['id']}\nevent: {evento['tipo']}\ndata: {dados}\n\n"
+
+# Instância global
+event_log = EventLog(active_config.EVENTOS_ARQUIVO)
@@ -1,13 +1,47 @@
 """
 Sistema de métricas para monitoramento do Sistema de Estacionamento
 """
+import os
+import re
+import json
+import glob
+import math
 import time
 import threading
+from bisect import bisect_left
 from collections import defaultdict, deque
 from datetime import datetime, timedelta
-from typing import Dict, List, Any, Optional
+from typing import Dict, List, Any, Optional, Sequence, Tuple
 from dataclasses import dataclass, field
 
+from config import active_config
+from utils.logger import setup_logger
+
+logger = setup_logger(__name__)
+
+try:
+    import fcntl
+    FCNTL_AVAILABLE = True
+except ImportError:
+    FCNTL_AVAILABLE = False
+
+# Limites (em segundos) dos buckets padrão dos histogramas; o último é +Inf
+BUCKETS_PADRAO = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+CONTENT_TYPE_PROMETHEUS = 'text/plain; version=0.0.4; charset=utf-8'
+
+# Série de uma métrica: (nome, ((label, valor), ...)) com labels ordenados
+ChaveSerie = Tuple[str, Tuple[Tuple[str, str], ...]]
+
+# Valor dos labels das séries que passam do limite de cardinalidade
+SERIE_EXCEDENTE = '__outros__'
+
+# Chave no environ WSGI com a regra de URL atendida (preenchida no before_request)
+ENVIRON_ROTA = 'estacionamento.metricas.rota'
+
+# Arquivo com os totais dos workers que já terminaram (modo multiprocesso)
+ARQUIVO_ENCERRADOS = 'metricas_encerrados.json'
+
 @dataclass
 class MetricPoint:
     """Ponto de métrica com timestamp"""
@@ -15,15 +49,96 @@ class MetricPoint:
     value: float
     labels: Dict[str, str] = field(default_factory=dict)
 
+class Histograma:
+    """Histograma de buckets fixos: registrar e ler custam O(buckets).
+
+    Cada instância tem um único escritor (a thread dona do shard); quem lê
+    copia ``contagens`` e aceita um retrato levemente defasado.
+    """
+    __slots__ = ('limites', 'contagens', 'soma', 'minimo', 'maximo')
+
+    def __init__(self, limites: Sequence[float] = BUCKETS_PADRAO):
+        self.limites = tuple(limites)
+        self.contagens = [0] * (len(self.limites) + 1)
+        self.soma = 0.0
+        self.minimo = math.inf
+        self.maximo = -math.inf
+
+    def observar(self, valor: float):
+        self.contagens[bisect_left(self.limites, valor)] += 1
+        self.soma += valor
+        if valor < self.minimo:
+            self.minimo = valor
+        if valor > self.maximo:
+            self.maximo = valor
+
+    def somar(self, outro: 'Histograma'):
+        """Acumula outro histograma com os mesmos limites"""
+        for i, contagem in enumerate(list(outro.contagens)):
+            self.contagens[i] += contagem
+        self.soma += outro.soma
+        self.minimo = min(self.minimo, outro.minimo)
+        self.maximo = max(self.maximo, outro.maximo)
+
+    @property
+    def total(self) -> int:
+        return sum(self.contagens)
+
+    def percentil(self, percentil: float) -> float:
+        """Estimativa por interpolação linear dentro do bucket"""
+        total = self.total
+        if not total:
+            return 0.0
+        alvo = total * percentil / 100
+        acumulado = 0
+        for i, contagem in enumerate(self.contagens):
+            if contagem and acumulado + contagem >= alvo:
+                inferior = self.limites[i - 1] if i > 0 else 0.0
+                superior = self.limites[i] if i < len(self.limites) else self.maximo
+                estimado = inferior + (superior - inferior) * (alvo - acumulado) / contagem
+                return min(max(estimado, self.minimo), self.maximo)
+            acumulado += contagem
+        return self.maximo
+
+class _Shard:
+    """Contadores e histogramas de uma única thread (escritas sem lock)"""
+    __slots__ = ('thread', 'geracao', 'counters', 'histograms')
+
+    def __init__(self, geracao: int):
+        self.thread = threading.current_thread()
+        self.geracao = geracao
+        self.counters: Dict[ChaveSerie, float] = {}
+        self.histograms: Dict[ChaveSerie, Histograma] = {}
+
 class MetricsCollector:
-    """Coletor de métricas do sistema"""
+    """Coletor de métricas do sistema.
+
+    Cada thread registra no seu próprio shard, sem lock; a leitura soma os
+    shards. O lock só protege o registro de novos shards e a leitura, que
+    nunca bloqueia as threads que estão registrando.
+    
+    ``max_series`` limita as combinações de labels por métrica; as que
+    passam do limite são somadas numa série com todos os labels iguais a
+    ``SERIE_EXCEDENTE`` (0 desativa o limite).
+    """
     
-    def __init__(self):
+    def __init__(self, max_series: int = 0):
         self.metrics = defaultdict(list)
-        self.counters = defaultdict(int)
-        self.gauges = defaultdict(float)
-        self.histograms = defaultdict(list)
+        self.gauges: Dict[ChaveSerie, float] = {}
         self.lock = threading.Lock()
+        self._local = threading.local()
+        self._shards: List[_Shard] = []
+        self._geracao = 0
+        # Totais de threads que já terminaram
+        self._encerrados = _Shard(0)
+        self._buckets: Dict[str, Tuple[float, ...]] = {}
+        self.max_series = max_series
+        self._series: Dict[str, set] = {}
+        # Modo multiprocesso: diretório com um retrato por worker
+        self._diretorio: Optional[str] = None
+        self._intervalo = 5.0
+        self._arquivo: Optional[str] = None
+        self._pid_gravador: Optional[int] = None
         
         # Métricas específicas do sistema
         self.system_metrics = {
@@ -36,30 +151,69 @@ class MetricsCollector:
     
     def increment_counter(self, name: str, value: int = 1, labels: Optional[Dict[str, str]] = None):
         """Incrementa um contador"""
-        with self.lock:
-            key = self._format_key(name, labels)
-            self.counters[key] += value
+        counters = self._shard().counters
+        key = self._serie(name, labels)
+        counters[key] = counters.get(key, 0) + value
     
     def set_gauge(self, name: str, value: float, labels: Optional[Dict[str, str]] = None):
         """Define valor de um gauge"""
-        with self.lock:
-            key = self._format_key(name, labels)
-            self.gauges[key] = value
+        self.gauges[self._serie(name, labels)] = value
+    
+    def set_buckets(self, name: str, buckets: Sequence[float]):
+        """Define os limites dos buckets de um histograma (antes do primeiro registro)"""
+        self._buckets[name] = tuple(sorted(buckets))
     
     def record_histogram(self, name: str, value: float, labels: Optional[Dict[str, str]] = None):
         """Registra valor em um histograma"""
-        with self.lock:
-            key = self._format_key(name, labels)
-            self.histograms[key].append(value)
-            
-            # Manter apenas os últimos 1000 valores
-            if len(self.histograms[key]) > 1000:
-                self.histograms[key] = self.histograms[key][-1000:]
+        histograms = self._shard().histograms
+        key = self._serie(name, labels)
+        histograma = histograms.get(key)
+        if histograma is None:
+            histograma = histograms[key] = Histograma(self._buckets.get(name, BUCKETS_PADRAO))
+        histograma.observar(value)
     
     def record_timing(self, name: str, duration: float, labels: Optional[Dict[str, str]] = None):
         """Registra tempo de execução"""
         self.record_histogram(f"{name}_duration", duration, labels)
     
+    def _shard(self) -> _Shard:
+        shard = getattr(self._local, 'shard', None)
+        if shard is None or shard.geracao != self._geracao:
+            shard = _Shard(self._geracao)
+            with self.lock:
+                # Threads curtas (uma por requisição) deixariam shards até a
+                # próxima leitura: os encerrados são incorporados a cada registro
+                self._podar_encerrados()
+                self._shards.append(shard)
+            self._local.shard = shard
+        return shard
+    
+    def _serie(self, name: str, labels: Optional[Dict[str, str]]) -> ChaveSerie:
+        if not labels:
+            return (name, ())
+        chave_labels = tuple(sorted((k, str(v)) for k, v in labels.items()))
+        if self.max_series:
+            conhecidas = self._series.get(name)
+            if conhecidas is None or chave_labels not in conhecidas:
+                chave_labels = self._admitir_serie(name, chave_labels)
+        return (name, chave_labels)
+    
+    def _admitir_serie(self, name: str, labels: tuple) -> tuple:
+        """Registra uma nova combinação de labels ou a desvia para a série excedente"""
+        excedente = tuple((k, SERIE_EXCEDENTE) for k, _ in labels)
+        conhecidas = self._series.get(name)
+        # Métrica já cheia: o conjunto só cresce, então não precisa do lock
+        if conhecidas is not None and len(conhecidas) >= self.max_series:
+            return excedente
+        with self.lock:
+            conhecidas = self._series.setdefault(name, set())
+            if labels in conhecidas:
+                return labels
+            if len(conhecidas) >= self.max_series:
+                return excedente
+            conhecidas.add(labels)
+            return labels
+    
     def _format_key(self, name: str, labels: Optional[Dict[str, str]]) -> str:
         """Formata chave da métrica com labels"""
         if not labels:
@@ -68,83 +222,409 @@ class MetricsCollector:
         label_str = ",".join(f"{k}={v}" for k, v in sorted(labels.items()))
         return f"{name}[{label_str}]"
     
+    def _coletar_local(self) -> Tuple[Dict[ChaveSerie, float], Dict[ChaveSerie, Histograma]]:
+        """Soma os shards de todas as threads (O(séries x buckets))"""
+        counters: Dict[ChaveSerie, float] = {}
+        histograms: Dict[ChaveSerie, Histograma] = {}
+        
+        def acumular(shard: _Shard):
+            # dict.copy() é atômico no CPython: o escritor pode seguir registrando
+            for key, value in shard.counters.copy().items():
+                counters[key] = counters.get(key, 0) + value
+            for key, histograma in shard.histograms.copy().items():
+                total = histograms.get(key)
+                if total is None:
+                    total = histograms[key] = Histograma(histograma.limites)
+                total.somar(histograma)
+        
+        with self.lock:
+            self._podar_encerrados()
+            shards = [self._encerrados] + self._shards
+        
+        for shard in shards:
+            acumular(shard)
+        return counters, histograms
+    
+    def _podar_encerrados(self):
+        """Incorpora aos totais e libera os shards de threads encerradas (com o lock)"""
+        vivos = []
+        for shard in self._shards:
+            if shard.thread.is_alive():
+                vivos.append(shard)
+            else:
+                self._incorporar(shard)
+        self._shards = vivos
+    
+    def _incorporar(self, shard: _Shard):
+        encerrados = self._encerrados
+        for key, value in shard.counters.items():
+            encerrados.counters[key] = encerrados.counters.get(key, 0) + value
+        for key, histograma in shard.histograms.items():
+            total = encerrados.histograms.get(key)
+            if total is None:
+                total = encerrados.histograms[key] = Histograma(histograma.limites)
+            total.somar(histograma)
+    
+    def _coletar(self) -> Tuple[Dict[ChaveSerie, float], Dict[ChaveSerie, float], Dict[ChaveSerie, Histograma]]:
+        """Counters, gauges e histogramas deste processo ou, no modo
+        multiprocesso, de todos os workers do host"""
+        counters, histograms = self._coletar_local()
+        gauges = self.gauges.copy()
+        if self._diretorio is None:
+            return counters, gauges, histograms
+        try:
+            self._gravar_retrato(counters, gauges, histograms)
+            return self._mesclar_retratos()
+        except (OSError, ValueError) as e:
+            logger.warning(f"Falha ao agregar métricas dos workers: {e}")
+            return counters, gauges, histograms
+    
+    # ---------------- Modo multiprocesso ----------------
+    
+    def ativar_multiprocesso(self, diretorio: str, intervalo: float = 5.0):
+        """Agrega as métricas de todos os workers do host.
+
+        Cada worker grava periodicamente um retrato JSON das suas métricas em
+        ``diretorio`` (um arquivo por processo, trocado atomicamente) e a
+        leitura soma os retratos. Retratos de workers encerrados são
+        incorporados a um arquivo de totais, para os counters não voltarem.
+        Gauges vêm do retrato mais recente e não sobrevivem ao worker.
+        """
+        os.makedirs(diretorio, exist_ok=True)
+        self._diretorio = diretorio
+        self._intervalo = intervalo
+        self._garantir_gravador()
+    
+    def gravar_retrato(self):
+        """Grava o retrato deste worker agora (ex.: ao encerrar o worker)"""
+        if self._diretorio is None:
+            return
+        counters, histograms = self._coletar_local()
+        try:
+            self._gravar_retrato(counters, self.gauges.copy(), histograms)
+        except OSError as e:
+            logger.warning(f"Falha ao gravar métricas do worker: {e}")
+    
+    def _garantir_gravador(self):
+        """Inicia a thread de gravação neste processo (uma por pid)"""
+        pid = os.getpid()
+        if self._pid_gravador == pid:
+            return
+        self._pid_gravador = pid
+        # Início do processo no nome: um pid reaproveitado não sobrescreve o retrato antigo
+        self._arquivo = os.path.join(self._diretorio, f"metricas_{pid}_{int(time.time() * 1000)}.json")
+        threading.Thread(target=self._gravar_periodicamente, name='metricas-gravador', daemon=True).start()
+    
+    def _gravar_periodicamente(self):
+        while True:
+            time.sleep(self._intervalo)
+            self.gravar_retrato()
+    
+    def _gravar_retrato(self, counters: Dict[ChaveSerie, float], gauges: Dict[ChaveSerie, float],
+                        histograms: Dict[ChaveSerie, Histograma]):
+        self._garantir_gravador()
+        retrato = {
+            'pid': os.getpid(),
+            'timestamp': time.time(),
+            'counters': [[n, l, v] for (n, l), v in counters.items()],
+            'gauges': [[n, l, v] for (n, l), v in gauges.items()],
+            'histograms': [
+                [n, l, list(h.limites), h.contagens, h.soma, h.minimo, h.maximo]
+                for (n, l), h in histograms.items()
+            ]
+        }
+        _gravar_json(self._arquivo, retrato)
+    
+    def _mesclar_retratos(self) -> Tuple[Dict[ChaveSerie, float], Dict[ChaveSerie, float], Dict[ChaveSerie, Histograma]]:
+        counters: Dict[ChaveSerie, float] = {}
+        gauges: Dict[ChaveSerie, Tuple[float, float]] = {}
+        histograms: Dict[ChaveSerie, Histograma] = {}
+        
+        retratos = []
+        for caminho in glob.glob(os.path.join(self._diretorio, 'metricas_*_*.json')):
+            retrato = _ler_json(caminho)
+            if retrato is None:
+                continue
+            if retrato['pid'] != os.getpid() and not _processo_vivo(retrato['pid']):
+                self._incorporar_encerrado(caminho)
+                continue
+            retratos.append(retrato)
+        encerrados = _ler_json(os.path.join(self._diretorio, ARQUIVO_ENCERRADOS))
+        if encerrados:
+            retratos.append(encerrados)
+        
+        for retrato in retratos:
+            _somar_retrato(retrato, counters, histograms)
+            for name, labels, value in retrato.get('gauges', []):
+                key = (name, tuple(map(tuple, labels)))
+                if key not in gauges or gauges[key][0] < retrato['timestamp']:
+                    gauges[key] = (retrato['timestamp'], value)
+        
+        return counters, {key: value for key, (_, value) in gauges.items()}, histograms
+    
+    def _incorporar_encerrado(self, caminho: str):
+        """Soma o retrato de um worker encerrado aos totais e remove o arquivo"""
+        caminho_encerrados = os.path.join(self._diretorio, ARQUIVO_ENCERRADOS)
+        fd = os.open(caminho_encerrados + '.lock', os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            if FCNTL_AVAILABLE:
+                fcntl.flock(fd, fcntl.LOCK_EX)
+            # Outro worker pode ter incorporado o retrato enquanto esperávamos o lock
+            retrato = _ler_json(caminho)
+            if retrato is None:
+                return
+            counters: Dict[ChaveSerie, float] = {}
+            histograms: Dict[ChaveSerie, Histograma] = {}
+            anterior = _ler_json(caminho_encerrados)
+            if anterior:
+                _somar_retrato(anterior, counters, histograms)
+            _somar_retrato(retrato, counters, histograms)
+            _gravar_json(caminho_encerrados, {
+                'pid': 0,
+                'timestamp': 0,
+                'counters': [[n, l, v] for (n, l), v in counters.items()],
+                'histograms': [
+                    [n, l, list(h.limites), h.contagens, h.soma, h.minimo, h.maximo]
+                    for (n, l), h in histograms.items()
+                ]
+            })
+            os.unlink(caminho)
+        finally:
+            os.close(fd)
+    
     def get_metrics_summary(self) -> Dict[str, Any]:
         """Retorna resumo das métricas coletadas"""
-        with self.lock:
-            summary = {
-                'timestamp': datetime.now().isoformat(),
-                'counters': dict(self.counters),
-                'gauges': dict(self.gauges),
-                'system_metrics': dict(self.system_metrics),
-                'histograms': {}
-            }
-            
-            # Calcular estatísticas dos histogramas
-            for name, values in self.histograms.items():
-                if values:
-                    summary['histograms'][name] = {
-                        'count': len(values),
-                        'min': min(values),
-                        'max': max(values),
-                        'avg': sum(values) / len(values),
-                        'p95': self._percentile(values, 95),
-                        'p99': self._percentile(values, 99)
-                    }
-            
-            return summary
-    
-    def _percentile(self, values: List[float], percentile: int) -> float:
-        """Calcula percentil de uma lista de valores"""
-        if not values:
-            return 0.0
+        counters, gauges, histograms = self._coletar()
+        summary = {
+            'timestamp': datetime.now().isoformat(),
+            'counters': {self._format_key(n, dict(l)): v for (n, l), v in counters.items()},
+            'gauges': {self._format_key(n, dict(l)): v for (n, l), v in gauges.items()},
+            'system_metrics': dict(self.system_metrics),
+            'histograms': {}
+        }
+        
+        # Estatísticas dos histogramas (percentis estimados pelos buckets)
+        for (name, labels), histograma in histograms.items():
+            count = histograma.total
+            if count:
+                summary['histograms'][self._format_key(name, dict(labels))] = {
+                    'count': count,
+                    'min': histograma.minimo,
+                    'max': histograma.maximo,
+                    'avg': histograma.soma / count,
+                    'p95': histograma.percentil(95),
+                    'p99': histograma.percentil(99)
+                }
+        
+        return summary
+    
+    def render_prometheus(self) -> str:
+        """Métricas no formato de texto do Prometheus (versão 0.0.4)"""
+        counters, gauges, histograms = self._coletar()
+        linhas: List[str] = []
         
-        sorted_values = sorted(values)
-        index = int(len(sorted_values) * percentile / 100)
-        return sorted_values[min(index, len(sorted_values) - 1)]
+        for tipo, series in (('counter', counters), ('gauge', gauges)):
+            for name, itens in _agrupar(series):
+                nome = _nome_prometheus(name)
+                linhas.append(f"# TYPE {nome} {tipo}")
+                for labels, value in itens:
+                    linhas.append(f"{nome}{_labels_prometheus(labels)} {_valor_prometheus(value)}")
+        
+        for name, itens in _agrupar(histograms):
+            nome = _nome_prometheus(name)
+            linhas.append(f"# TYPE {nome} histogram")
+            for labels, histograma in itens:
+                acumulado = 0
+                for limite, contagem in zip(histograma.limites + (math.inf,), histograma.contagens):
+                    acumulado += contagem
+                    le = labels + (('le', _valor_prometheus(limite)),)
+                    linhas.append(f"{nome}_bucket{_labels_prometheus(le)} {acumulado}")
+                linhas.append(f"{nome}_sum{_labels_prometheus(labels)} {_valor_prometheus(histograma.soma)}")
+                linhas.append(f"{nome}_count{_labels_prometheus(labels)} {acumulado}")
+        
+        return "\n".join(linhas) + "\n"
     
     def reset_metrics(self):
         """Reseta todas as métricas"""
         with self.lock:
             self.metrics.clear()
-            self.counters.clear()
             self.gauges.clear()
-            self.histograms.clear()
+            self._series = {}
+            # Shards antigos são abandonados; cada thread cria um novo no próximo registro
+            self._geracao += 1
+            self._shards = []
+            self._encerrados = _Shard(self._geracao)
+
+def _gravar_json(caminho: str, dados: dict):
+    """Grava em um temporário e troca de nome: leitores nunca veem o arquivo pela metade"""
+    temporario = f"{caminho}.{os.getpid()}.tmp"
+    with open(temporario, 'w', encoding='utf-8') as arquivo:
+        json.dump(dados, arquivo, separators=(',', ':'))
+    os.replace(temporario, caminho)
+
+def _ler_json(caminho: str) -> Optional[dict]:
+    try:
+        with open(caminho, encoding='utf-8') as arquivo:
+            return json.load(arquivo)
+    except FileNotFoundError:
+        return None
+
+def _processo_vivo(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+def _somar_retrato(retrato: dict, counters: Dict[ChaveSerie, float], histograms: Dict[ChaveSerie, Histograma]):
+    """Acumula counters e histogramas de um retrato gravado por um worker"""
+    for name, labels, value in retrato.get('counters', []):
+        key = (name, tuple(map(tuple, labels)))
+        counters[key] = counters.get(key, 0) + value
+    for name, labels, limites, contagens, soma, minimo, maximo in retrato.get('histograms', []):
+        key = (name, tuple(map(tuple, labels)))
+        histograma = Histograma(limites)
+        histograma.contagens, histograma.soma, histograma.minimo, histograma.maximo = list(contagens), soma, minimo, maximo
+        total = histograms.get(key)
+        if total is None:
+            histograms[key] = histograma
+        elif total.limites == histograma.limites:
+            total.somar(histograma)
+        # Limites diferentes (buckets alterados entre versões): mantém a primeira série
+
+def _agrupar(series: Dict[ChaveSerie, Any]) -> List[Tuple[str, List[Tuple[tuple, Any]]]]:
+    """Agrupa as séries por nome de métrica, em ordem estável"""
+    grupos: Dict[str, List[Tuple[tuple, Any]]] = defaultdict(list)
+    for (name, labels), value in series.items():
+        grupos[name].append((labels, value))
+    return [(name, sorted(grupos[name], key=lambda item: item[0])) for name in sorted(grupos)]
+
+def _nome_prometheus(name: str) -> str:
+    nome = re.sub(r'[^a-zA-Z0-9_:]', '_', name)
+    return nome if not nome[:1].isdigit() else f"_{nome}"
+
+def _escapar_label(valor: str) -> str:
+    return valor.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+def _labels_prometheus(labels: tuple) -> str:
+    if not labels:
+        return ''
+    pares = ','.join(f'{re.sub(r"[^a-zA-Z0-9_]", "_", k)}="{_escapar_label(str(v))}"' for k, v in labels)
+    return '{' + pares + '}'
+
+def _valor_prometheus(valor: float) -> str:
+    if valor == math.inf:
+        return '+Inf'
+    if isinstance(valor, float) and valor.is_integer():
+        return str(int(valor)) if abs(valor) < 1e15 else repr(valor)
+    return repr(valor)
+
+class _CorpoMedido:
+    """Envolve o corpo da resposta para medir a requisição até o envio terminar"""
+    
+    def __init__(self, corpo, ao_fechar):
+        self._corpo = corpo
+        self._ao_fechar = ao_fechar
+    
+    def __iter__(self):
+        yield from self._corpo
+        self._finalizar()
+    
+    def close(self):
+        # O servidor WSGI chama close() depois de enviar o último byte
+        try:
+            if hasattr(self._corpo, 'close'):
+                self._corpo.close()
+        finally:
+            self._finalizar()
+    
+    def _finalizar(self):
+        # Fim da iteração ou close(), o que vier primeiro; registra uma única vez
+        ao_fechar, self._ao_fechar = self._ao_fechar, None
+        if ao_fechar is not None:
+            ao_fechar()
 
 class MetricsMiddleware:
-    """Middleware para coletar métricas automaticamente"""
+    """Middleware para coletar métricas automaticamente.
+
+    As requisições são rotuladas pela regra de URL do Flask (ex.:
+    ``/verificar-login/<matricula>``), não pelo caminho bruto; caminhos sem
+    rota ficam em ``SEM_ROTA``. A duração vai até o fechamento do corpo da
+    resposta, que é o tempo que o cliente de fato espera.
+
+    Streams (``text/event-stream``) ficam abertos por dezenas de segundos e
+    distorceriam os percentis: a duração deles vai para
+    ``http_stream_duration``. Corpos ``wsgi.file_wrapper`` (arquivos
+    estáticos) não são envolvidos, para o servidor continuar usando
+    sendfile; para eles a duração vai até o início da resposta.
+    """
+    
+    SEM_ROTA = '<sem_rota>'
     
     def __init__(self, app, metrics_collector: MetricsCollector):
         self.app = app
         self.metrics = metrics_collector
     
+    def init_app(self, flask_app):
+        """Registra no app Flask o hook que anota a regra de URL no environ"""
+        def marcar_rota():
+            from flask import request
+            if request.url_rule is not None:
+                request.environ[ENVIRON_ROTA] = request.url_rule.rule
+        # Primeiro hook: roda mesmo que outro before_request responda antes da view
+        flask_app.before_request_funcs.setdefault(None, []).insert(0, marcar_rota)
+    
     def __call__(self, environ, start_response):
-        start_time = time.time()
-        
-        # Contar requisição
-        self.metrics.increment_counter('http_requests_total', labels={
-            'method': environ.get('REQUEST_METHOD', 'UNKNOWN'),
-            'endpoint': environ.get('PATH_INFO', '/')
-        })
+        start_time = time.perf_counter()
+        status_code = []
+        stream = []
         
         def custom_start_response(status, headers, exc_info=None):
+            status_code[:] = [status.split()[0]]
+            stream[:] = [any(
+                nome.lower() == 'content-type' and valor.startswith('text/event-stream')
+                for nome, valor in headers
+            )]
+            return start_response(status, headers, exc_info)
+        
+        def registrar():
+            endpoint = environ.get(ENVIRON_ROTA, self.SEM_ROTA)
+            # Contar requisição
+            self.metrics.increment_counter('http_requests_total', labels={
+                'method': environ.get('REQUEST_METHOD', 'UNKNOWN'),
+                'endpoint': endpoint
+            })
             # Registrar status da resposta
-            status_code = int(status.split()[0])
             self.metrics.increment_counter('http_responses_total', labels={
-                'status_code': str(status_code)
+                'status_code': status_code[0] if status_code else '500'
             })
-            
             # Registrar tempo de resposta
-            duration = time.time() - start_time
-            self.metrics.record_timing('http_request_duration', duration, labels={
-                'endpoint': environ.get('PATH_INFO', '/')
+            metrica = 'http_stream_duration' if stream and stream[0] else 'http_request_duration'
+            self.metrics.record_timing(metrica, time.perf_counter() - start_time, labels={
+                'endpoint': endpoint
             })
-            
-            return start_response(status, headers, exc_info)
         
-        return self.app(environ, custom_start_response)
+        try:
+            corpo = self.app(environ, custom_start_response)
+        except Exception:
+            registrar()
+            raise
+        
+        file_wrapper = environ.get('wsgi.file_wrapper')
+        if isinstance(file_wrapper, type) and isinstance(corpo, file_wrapper):
+            # Envolver esconderia o file_wrapper do servidor e desligaria o sendfile
+            registrar()
+            return corpo
+        return _CorpoMedido(corpo, registrar)
 
 # Instância global do coletor de métricas
-metrics_collector = MetricsCollector()
+metrics_collector = MetricsCollector(max_series=active_config.METRICAS_MAX_SERIES)
+# Streams SSE duram até EVENTOS_SSE_DURACAO
+metrics_collector.set_buckets('http_stream_duration_duration', (1.0, 5.0, 15.0, 30.0, 60.0, 120.0))
+if active_config.METRICAS_MULTIPROCESSO:
+    metrics_collector.ativar_multiprocesso(active_config.METRICAS_DIR, active_config.METRICAS_INTERVALO_GRAVACAO)
 
 # Decorator para medir tempo de execução
 def measure_time(metric_name: str, labels: Optional[Dict[str, str]] = None):
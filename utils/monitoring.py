@@ -1,13 +1,136 @@
 """
 Sistema de monitoramento e verificação de status
 """
+import os
+import time
+import socket
+import threading
 import psutil
-import requests
+from collections import deque
 from datetime import datetime
+from typing import Dict, Optional, Tuple
+from urllib.parse import urlparse
 import pytz
 from sqlalchemy import text
+from config import active_config
 from db import engine
 from utils.error_logger import ErrorLogger
+from utils.cache import cache_manager
+
+class ResourceSampler:
+    """Amostra os recursos do sistema em segundo plano.
+
+    Uma thread por worker lê CPU, memória e disco a cada ``intervalo``
+    segundos (``cpu_percent`` sem intervalo: a CPU é medida entre duas
+    amostras, sem bloquear) e guarda uma janela móvel de ``janela``
+    segundos. Os serviços externos são verificados na mesma thread, por
+    conexão TCP, a cada ``ttl_servicos`` segundos. O /status só lê o
+    último retrato e nunca espera por psutil ou pela rede.
+    """
+    def __init__(self, intervalo: float = 5, janela: float = 300, ttl_servicos: float = 30,
+                 timeout_tcp: float = 1):
+        self.intervalo = intervalo
+        self.ttl_servicos = ttl_servicos
+        self.timeout_tcp = timeout_tcp
+        self._amostras: deque = deque(maxlen=max(int(janela / intervalo), 1))
+        self._servicos: Dict[str, dict] = {}
+        self._servicos_em = 0.0
+        self._lock = threading.Lock()
+        self._pid: Optional[int] = None
+
+    def iniciar(self):
+        """Inicia a thread de amostragem neste processo (uma por pid)"""
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            self._amostras.clear()
+        threading.Thread(target=self._executar, name='monitor-recursos', daemon=True).start()
+
+    def _executar(self):
+        # Primeira leitura só define a referência da CPU; a primeira amostra sai logo depois
+        psutil.cpu_percent(interval=None)
+        espera = min(self.intervalo, 1.0)
+        while True:
+            time.sleep(espera)
+            espera = self.intervalo
+            try:
+                self._amostrar()
+            except Exception as e:
+                ErrorLogger.log_error('SYSTEM', 'Falha ao amostrar recursos do sistema', {'error': str(e)})
+            if time.time() - self._servicos_em >= self.ttl_servicos:
+                self._servicos = self._verificar_servicos()
+                self._servicos_em = time.time()
+
+    def _amostrar(self):
+        self._amostras.append((
+            time.time(),
+            psutil.cpu_percent(interval=None),
+            psutil.virtual_memory().percent,
+            psutil.disk_usage('/').percent
+        ))
+
+    def retrato(self) -> Optional[dict]:
+        """Última amostra e médias/máximos da janela, ou None antes da primeira"""
+        amostras = list(self._amostras)
+        if not amostras:
+            return None
+        instante, cpu, memoria, disco = amostras[-1]
+        cpus = [a[1] for a in amostras]
+        memorias = [a[2] for a in amostras]
+        return {
+            "cpu_percent": cpu,
+            "memory_percent": memoria,
+            "disk_percent": disco,
+            "amostrado_em": datetime.fromtimestamp(instante, pytz.timezone('America/Sao_Paulo')).isoformat(),
+            "janela": {
+                "amostras": len(amostras),
+                "segundos": round(instante - amostras[0][0], 1),
+                "cpu_media": round(sum(cpus) / len(cpus), 1),
+                "cpu_max": max(cpus),
+                "memory_media": round(sum(memorias) / len(memorias), 1),
+                "memory_max": max(memorias)
+            }
+        }
+
+    def servicos(self) -> Dict[str, dict]:
+        return dict(self._servicos)
+
+    def _verificar_servicos(self) -> Dict[str, dict]:
+        resultados = {}
+        for nome, (host, porta) in servicos_externos().items():
+            inicio = time.monotonic()
+            try:
+                with socket.create_connection((host, porta), timeout=self.timeout_tcp):
+                    pass
+                resultados[nome] = {
+                    "status": "ok",
+                    "response_time": round(time.monotonic() - inicio, 4),
+                    "verificado_em": datetime.now(pytz.timezone('America/Sao_Paulo')).isoformat()
+                }
+            except OSError as e:
+                ErrorLogger.log_error(
+                    'SERVICE',
+                    f'Falha ao conectar com serviço {nome}',
+                    {'error': str(e)}
+                )
+                resultados[nome] = {
+                    "status": "error",
+                    "error": str(e),
+                    "verificado_em": datetime.now(pytz.timezone('America/Sao_Paulo')).isoformat()
+                }
+        return resultados
+
+def servicos_externos() -> Dict[str, Tuple[str, int]]:
+    """Host e porta TCP dos serviços dos quais a aplicação depende"""
+    servicos = {}
+    if engine.url.host:
+        servicos["database"] = (engine.url.host, engine.url.port or 5432)
+    if active_config.REDIS_URL:
+        redis_url = urlparse(active_config.REDIS_URL)
+        if redis_url.hostname:
+            servicos["redis"] = (redis_url.hostname, redis_url.port or 6379)
+    return servicos
 
 class SystemMonitor:
     @staticmethod
@@ -33,10 +156,25 @@ class SystemMonitor:
             }
 
     @staticmethod
-    def check_system_resources():
-        """Verifica recursos do sistema"""
+    def check_system_resources(interval: Optional[float] = None):
+        """Verifica recursos do sistema.
+
+        Sem ``interval`` lê o retrato do amostrador em segundo plano (não
+        bloqueia); com ``interval`` mede na hora, esperando esse tempo pela
+        CPU (uso em linha de comando).
+        """
         try:
-            cpu = psutil.cpu_percent(interval=1)
+            if interval is None:
+                resource_sampler.iniciar()
+                retrato = resource_sampler.retrato()
+                if retrato is None:
+                    return {
+                        "status": "starting",
+                        "message": "Aguardando a primeira amostra de recursos"
+                    }
+                return {"status": "ok", "resources": retrato}
+            
+            cpu = psutil.cpu_percent(interval=interval)
             memory = psutil.virtual_memory()
             disk = psutil.disk_usage('/')
             
@@ -62,30 +200,11 @@ class SystemMonitor:
 
     @staticmethod
     def check_external_services():
-        """Verifica serviços externos necessários"""
-        services = {
-            "database": "http://localhost:5432",  # Exemplo - ajuste para URL real
-        }
-        
-        results = {}
-        for service_name, url in services.items():
-            try:
-                response = requests.get(url, timeout=5)
-                results[service_name] = {
-                    "status": "ok" if response.status_code == 200 else "error",
-                    "response_time": response.elapsed.total_seconds()
-                }
-            except requests.RequestException as e:
-                ErrorLogger.log_error(
-                    'SERVICE',
-                    f'Falha ao conectar com serviço {service_name}',
-                    {'error': str(e)}
-                )
-                results[service_name] = {
-                    "status": "error",
-                    "error": str(e)
-                }
-        
+        """Verifica serviços externos necessários (resultado em cache da última verificação TCP)"""
+        resource_sampler.iniciar()
+        results = resource_sampler.servicos()
+        for service_name in servicos_externos():
+            results.setdefault(service_name, {"status": "pending"})
         return results
 
     @staticmethod
@@ -95,5 +214,14 @@ class SystemMonitor:
             "timestamp": datetime.now(pytz.timezone('America/Sao_Paulo')).isoformat(),
             "database": SystemMonitor.check_database(),
             "system_resources": SystemMonitor.check_system_resources(),
-            "external_services": SystemMonitor.check_external_services()
+            "external_services": SystemMonitor.check_external_services(),
+            "cache": cache_manager.stats()
         }
+
+# Instância global
+resource_sampler = ResourceSampler(
+    intervalo=active_config.MONITOR_INTERVALO,
+    janela=active_config.MONITOR_JANELA_SEGUNDOS,
+    ttl_servicos=active_config.MONITOR_TTL_SERVICOS,
+    timeout_tcp=active_config.MONITOR_TIMEOUT_TCP
+)
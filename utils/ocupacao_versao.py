@@ -0,0 +1,159 @@
+"""
+Versão do estado de ocupação das vagas e respostas HTTP com ETag
+"""
+import os
+import time
+import threading
+from typing import Any, Callable, Dict, Optional, Tuple
+from flask import Response, jsonify, request
+from config import active_config
+from utils.cache import cache_manager
+
+try:
+    import fcntl
+    FCNTL_AVAILABLE = True
+except ImportError:
+    FCNTL_AVAILABLE = False
+
+# Chave usada quando a versão fica no Redis
+CHAVE_REDIS_VERSAO = 'ocupacao:versao'
+
+class OcupacaoVersao:
+    """Contador monotônico da ocupação, compartilhado entre os workers.
+
+    Usa o Redis quando disponível; caso contrário um arquivo local protegido
+    por flock (workers do mesmo host). O valor inicial é o horário atual em
+    milissegundos, para que um contador recriado não repita ETags antigas.
+    """
+    def __init__(self, caminho: str):
+        self._caminho = caminho
+        self._lock = threading.Lock()
+        self._local = 0
+
+    def atual(self) -> int:
+        """Retorna a versão atual sem tocar no banco de dados"""
+        redis_client = cache_manager.redis_client
+        if redis_client:
+            try:
+                valor = redis_client.get(CHAVE_REDIS_VERSAO)
+                if valor is not None:
+                    return int(valor)
+                return self._iniciar_redis(redis_client)
+            except Exception:
+                pass
+
+        if FCNTL_AVAILABLE:
+            try:
+                return self._atualizar_arquivo(incrementar=False)
+            except OSError:
+                pass
+
+        with self._lock:
+            if not self._local:
+                self._local = self._valor_inicial()
+            return self._local
+
+    def incrementar(self) -> int:
+        """Avança a versão após uma mudança de ocupação"""
+        redis_client = cache_manager.redis_client
+        if redis_client:
+            try:
+                self._iniciar_redis(redis_client)
+                return int(redis_client.incr(CHAVE_REDIS_VERSAO))
+            except Exception:
+                pass
+
+        if FCNTL_AVAILABLE:
+            try:
+                return self._atualizar_arquivo(incrementar=True)
+            except OSError:
+                pass
+
+        # Sem Redis nem flock: contador apenas deste processo
+        with self._lock:
+            self._local = max(self._local, self._valor_inicial()) + 1
+            return self._local
+
+    @staticmethod
+    def _valor_inicial() -> int:
+        return int(time.time() * 1000)
+
+    def _iniciar_redis(self, redis_client) -> int:
+        redis_client.set(CHAVE_REDIS_VERSAO, self._valor_inicial(), nx=True)
+        return int(redis_client.get(CHAVE_REDIS_VERSAO))
+
+    def _atualizar_arquivo(self, incrementar: bool) -> int:
+        fd = os.open(self._caminho, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX if incrementar else fcntl.LOCK_SH)
+            conteudo = os.pread(fd, 32, 0).strip()
+            if conteudo and not incrementar:
+                return int(conteudo)
+
+            if not conteudo and not incrementar:
+                # Arquivo novo: trocar para lock exclusivo para gravar o valor inicial
+                fcntl.flock(fd, fcntl.LOCK_EX)
+                conteudo = os.pread(fd, 32, 0).strip()
+                if conteudo:
+                    return int(conteudo)
+
+            versao = int(conteudo) + 1 if conteudo else self._valor_inicial()
+            # Largura fixa: a gravação nunca deixa o arquivo truncado para leitores
+            os.pwrite(fd, str(versao).rjust(20).encode(), 0)
+            return versao
+        finally:
+            os.close(fd)
+
+class SnapshotCache:
+    """Guarda, por endpoint, o último corpo serializado e a ETag correspondente"""
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._corpos: Dict[str, Tuple[str, bytes]] = {}
+
+    def get(self, chave: str, etag: str) -> Optional[bytes]:
+        with self._lock:
+            item = self._corpos.get(chave)
+        if item and item[0] == etag:
+            return item[1]
+        return None
+
+    def set(self, chave: str, etag: str, corpo: bytes):
+        with self._lock:
+            self._corpos[chave] = (etag, corpo)
+
+def resposta_versionada(
+    chave: str,
+    gerar: Callable[[], Tuple[Any, int]],
+    sufixo: str = ''
+) -> Response:
+    """Responde com o snapshot da versão atual de ocupação.
+
+    ``gerar`` só é chamado quando não há corpo em cache para a versão atual e
+    deve retornar (dados, status). Se o cliente envia ``If-None-Match`` com a
+    ETag vigente, a resposta é 304 sem acessar o banco. ``sufixo`` entra na
+    ETag para dados que também mudam com o tempo.
+    """
+    # A versão é lida antes de gerar: um corpo nunca fica mais velho que sua ETag
+    etag = f"{chave}-{ocupacao_versao.atual()}{sufixo}"
+
+    if request.if_none_match.contains(etag):
+        response = Response(status=304)
+    else:
+        corpo = snapshot_cache.get(chave, etag)
+        if corpo is not None:
+            response = Response(corpo, mimetype='application/json')
+        else:
+            dados, status = gerar()
+            response = jsonify(dados)
+            response.status_code = status
+            if status != 200:
+                return response
+            snapshot_cache.set(chave, etag, response.get_data())
+
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
+
+# Instâncias globais
+ocupacao_versao = OcupacaoVersao(active_config.OCUPACAO_VERSAO_ARQUIVO)
+snapshot_cache = SnapshotCache()
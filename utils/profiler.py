@@ -0,0 +1,216 @@
+"""
+Profiler por amostragem das threads do worker (sem dependências externas)
+"""
+import os
+import sys
+import json
+import glob
+import time
+import threading
+from collections import Counter
+from typing import Dict, List, Optional, Tuple
+from config import active_config
+from utils.logger import setup_logger
+
+logger = setup_logger(__name__)
+
+# Quadro da pilha: (função, arquivo, linha de definição)
+Quadro = Tuple[str, str, int]
+Pilha = Tuple[Quadro, ...]
+
+# Chamadas da biblioteca padrão em que uma thread fica apenas esperando
+# (evento, join, fila, socket), como (módulo, função): nomes genéricos como
+# "get" sozinhos esconderiam getters do cache, da sessão e dos repositórios
+ESPERAS = {
+    ('threading', 'wait'),
+    ('threading', '_wait_for_tstate_lock'),
+    ('queue', 'get'),
+    ('selectors', 'select'),
+    ('socket', 'accept'),
+    ('socketserver', 'serve_forever'),
+}
+
+class SamplingProfiler:
+    """Amostra periodicamente a pilha de todas as threads do processo.
+
+    Uma thread de fundo lê ``sys._current_frames()`` a cada ``intervalo``
+    segundos e conta as pilhas iguais; o custo por amostra é proporcional
+    à profundidade das pilhas, e as threads amostradas não são
+    instrumentadas. Ao terminar, as contagens ficam num arquivo por worker
+    em ``diretorio``, e ``resultado`` soma os arquivos de todos os workers.
+    """
+    def __init__(self, diretorio: str, max_segundos: float = 60):
+        self.diretorio = diretorio
+        self.max_segundos = max_segundos
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self._parar = threading.Event()
+        self._amostras: Counter = Counter()
+        self._inicio = 0.0
+        self._fim = 0.0
+
+    @property
+    def ativo(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def iniciar(self, segundos: float, intervalo: float = 0.01, ignorar: Tuple[int, ...] = (),
+                incluir_ociosas: bool = False) -> bool:
+        """Inicia uma amostragem de ``segundos``; False se já houver uma em andamento.
+
+        Sem ``incluir_ociosas``, pilhas paradas em espera (threads de fundo
+        dormindo, lock, socket) são descartadas.
+        """
+        with self._lock:
+            if self.ativo:
+                return False
+            self._parar.clear()
+            self._amostras = Counter()
+            self._inicio = time.time()
+            self._fim = self._inicio + min(segundos, self.max_segundos)
+            self._thread = threading.Thread(
+                target=self._amostrar, args=(max(intervalo, 0.001), set(ignorar), incluir_ociosas),
+                name='profiler-amostragem', daemon=True
+            )
+            self._thread.start()
+            return True
+
+    def parar(self):
+        self._parar.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def aguardar(self):
+        if self._thread is not None:
+            self._thread.join()
+
+    def _amostrar(self, intervalo: float, ignorar: set, incluir_ociosas: bool):
+        ignorar.add(threading.get_ident())
+        nomes: Dict[int, str] = {}
+        while not self._parar.is_set() and time.time() < self._fim:
+            for thread in threading.enumerate():
+                nomes.setdefault(thread.ident, thread.name)
+            for ident, frame in sys._current_frames().items():
+                if ident in ignorar:
+                    continue
+                if not incluir_ociosas and _ociosa(frame):
+                    continue
+                pilha = []
+                while frame is not None:
+                    codigo = frame.f_code
+                    pilha.append((codigo.co_name, codigo.co_filename, codigo.co_firstlineno))
+                    frame = frame.f_back
+                # Raiz primeiro, com a thread como quadro inicial
+                pilha.append((f"thread:{nomes.get(ident, ident)}", '', 0))
+                self._amostras[tuple(reversed(pilha))] += 1
+            self._parar.wait(intervalo)
+        self._fim = time.time()
+        try:
+            self._gravar()
+        except OSError as e:
+            logger.warning(f"Falha ao gravar amostras do profiler: {e}")
+
+    def _gravar(self):
+        os.makedirs(self.diretorio, exist_ok=True)
+        caminho = os.path.join(self.diretorio, f"perfil_{os.getpid()}.json")
+        temporario = f"{caminho}.tmp"
+        with open(temporario, 'w', encoding='utf-8') as arquivo:
+            json.dump({
+                'pid': os.getpid(),
+                'inicio': self._inicio,
+                'fim': self._fim,
+                'amostras': [[list(map(list, pilha)), contagem] for pilha, contagem in self._amostras.items()]
+            }, arquivo)
+        os.replace(temporario, caminho)
+
+    def limpar(self):
+        """Descarta os resultados gravados por todos os workers"""
+        for caminho in glob.glob(os.path.join(self.diretorio, 'perfil_*.json')):
+            try:
+                os.unlink(caminho)
+            except OSError:
+                pass
+
+    def resultado(self, todos_workers: bool = True) -> Counter:
+        """Contagem por pilha: deste worker (inclusive em andamento) ou de todos"""
+        if not todos_workers:
+            return Counter(self._amostras.copy())
+        total: Counter = Counter()
+        for caminho in glob.glob(os.path.join(self.diretorio, 'perfil_*.json')):
+            try:
+                with open(caminho, encoding='utf-8') as arquivo:
+                    dados = json.load(arquivo)
+            except (OSError, ValueError):
+                continue
+            if dados['pid'] == os.getpid() and self.ativo:
+                continue
+            for pilha, contagem in dados['amostras']:
+                total[tuple(map(tuple, pilha))] += contagem
+        if self.ativo:
+            total.update(self._amostras.copy())
+        return total
+
+def _ociosa(frame) -> bool:
+    """Thread parada numa espera da biblioteca padrão"""
+    codigo = frame.f_code
+    modulo = os.path.splitext(os.path.basename(codigo.co_filename))[0]
+    if (modulo, codigo.co_name) not in ESPERAS:
+        return False
+    return codigo.co_filename.startswith((sys.base_prefix, sys.prefix))
+
+def _nome_quadro(quadro: Quadro) -> str:
+    funcao, arquivo, linha = quadro
+    if not arquivo:
+        return funcao
+    return f"{funcao} ({_arquivo_relativo(arquivo)}:{linha})"
+
+def _arquivo_relativo(arquivo: str) -> str:
+    for prefixo in sys.path:
+        if prefixo and arquivo.startswith(prefixo.rstrip(os.sep) + os.sep):
+            return arquivo[len(prefixo.rstrip(os.sep)) + 1:]
+    return arquivo
+
+def formatar_collapsed(amostras: Counter) -> str:
+    """Formato "pilha;colapsada contagem" (flamegraph.pl, speedscope, inferno)"""
+    linhas = [
+        f"{';'.join(_nome_quadro(q).replace(';', ',') for q in pilha)} {contagem}"
+        for pilha, contagem in amostras.most_common()
+    ]
+    return "\n".join(linhas) + "\n"
+
+def formatar_speedscope(amostras: Counter, nome: str = 'estacionamento') -> dict:
+    """Perfil "sampled" no formato de arquivo do speedscope"""
+    indices: Dict[Quadro, int] = {}
+    quadros: List[dict] = []
+    samples: List[List[int]] = []
+    weights: List[int] = []
+    for pilha, contagem in amostras.most_common():
+        sample = []
+        for quadro in pilha:
+            if quadro not in indices:
+                indices[quadro] = len(quadros)
+                funcao, arquivo, linha = quadro
+                descricao = {'name': funcao}
+                if arquivo:
+                    descricao.update({'file': _arquivo_relativo(arquivo), 'line': linha})
+                quadros.append(descricao)
+            sample.append(indices[quadro])
+        samples.append(sample)
+        weights.append(contagem)
+    return {
+        '$schema': 'https://www.speedscope.app/file-format-schema.json',
+        'shared': {'frames': quadros},
+        'profiles': [{
+            'type': 'sampled',
+            'name': nome,
+            'unit': 'none',
+            'startValue': 0,
+            'endValue': sum(weights),
+            'samples': samples,
+            'weights': weights
+        }],
+        'name': nome,
+        'exporter': 'estacionamento-profiler'
+    }
+
+# Instância global
+sampling_profiler = SamplingProfiler(active_config.PERFIL_DIR, max_segundos=active_config.PERFIL_MAX_SEGUNDOS)
@@ -0,0 +1,162 @@
+"""
+Serializadores para o cache e para as respostas JSON
+"""
+import json
+from datetime import date, datetime
+from decimal import Decimal
+from typing import Any, Dict, Optional
+from flask.json.provider import DefaultJSONProvider
+
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    ORJSON_AVAILABLE = False
+
+try:
+    import msgpack
+    MSGPACK_AVAILABLE = True
+except ImportError:
+    MSGPACK_AVAILABLE = False
+
+# Valores sem tipo nativo em JSON/msgpack viram {"__t": tipo, "v": texto}
+MARCA_TIPO = '__t'
+
+def _codificar_especial(valor: Any) -> dict:
+    """Converte datetime, date e Decimal em um dicionário marcado"""
+    if isinstance(valor, datetime):
+        return {MARCA_TIPO: 'dt', 'v': valor.isoformat()}
+    if isinstance(valor, date):
+        return {MARCA_TIPO: 'd', 'v': valor.isoformat()}
+    if isinstance(valor, Decimal):
+        return {MARCA_TIPO: 'dec', 'v': str(valor)}
+    if isinstance(valor, (set, frozenset)):
+        return list(valor)
+    raise TypeError(f"Tipo não serializável: {type(valor).__name__}")
+
+def _decodificar_especial(obj: dict) -> Any:
+    """Inverso de _codificar_especial (usado como object_hook)"""
+    tipo = obj.get(MARCA_TIPO)
+    if tipo is None or len(obj) != 2:
+        return obj
+    if tipo == 'dt':
+        return datetime.fromisoformat(obj['v'])
+    if tipo == 'd':
+        return date.fromisoformat(obj['v'])
+    if tipo == 'dec':
+        return Decimal(obj['v'])
+    return obj
+
+def _reviver(valor: Any) -> Any:
+    """Aplica _decodificar_especial na estrutura, no lugar (para decodificadores sem object_hook)"""
+    if type(valor) is dict:
+        if MARCA_TIPO in valor:
+            return _decodificar_especial(valor)
+        for chave, item in valor.items():
+            if type(item) in (dict, list):
+                valor[chave] = _reviver(item)
+    elif type(valor) is list:
+        for indice, item in enumerate(valor):
+            if type(item) in (dict, list):
+                valor[indice] = _reviver(item)
+    return valor
+
+class Serializer:
+    """Converte valores do cache em bytes e de volta, preservando datetime e Decimal"""
+    nome = 'base'
+
+    def dumps(self, valor: Any) -> bytes:
+        raise NotImplementedError
+
+    def loads(self, dados: bytes) -> Any:
+        raise NotImplementedError
+
+class JsonSerializer(Serializer):
+    """Implementação com a biblioteca padrão (sempre disponível)"""
+    nome = 'json'
+
+    def dumps(self, valor: Any) -> bytes:
+        return json.dumps(valor, default=_codificar_especial, separators=(',', ':')).encode('utf-8')
+
+    def loads(self, dados: bytes) -> Any:
+        return json.loads(dados, object_hook=_decodificar_especial)
+
+class OrjsonSerializer(Serializer):
+    """JSON via orjson; lê e grava o mesmo formato do JsonSerializer"""
+    nome = 'orjson'
+
+    def dumps(self, valor: Any) -> bytes:
+        # Datetimes passam pelo default para manter a marca de tipo
+        return orjson.dumps(
+            valor,
+            default=_codificar_especial,
+            option=orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_NON_STR_KEYS
+        )
+
+    def loads(self, dados: bytes) -> Any:
+        valor = orjson.loads(dados)
+        if isinstance(dados, str):
+            dados = dados.encode('utf-8')
+        # Só percorre a estrutura se houver algum valor marcado
+        if f'"{MARCA_TIPO}"'.encode() in dados:
+            return _reviver(valor)
+        return valor
+
+class MsgpackSerializer(Serializer):
+    """Formato binário msgpack (menor, mas incompatível com valores JSON já gravados)"""
+    nome = 'msgpack'
+
+    def dumps(self, valor: Any) -> bytes:
+        return msgpack.packb(valor, default=_codificar_especial, datetime=False, use_bin_type=True)
+
+    def loads(self, dados: bytes) -> Any:
+        return msgpack.unpackb(dados, object_hook=_decodificar_especial, raw=False, strict_map_key=False)
+
+SERIALIZADORES: Dict[str, type] = {
+    'json': JsonSerializer,
+    'orjson': OrjsonSerializer,
+    'msgpack': MsgpackSerializer
+}
+
+def get_serializer(nome: Optional[str] = None) -> Serializer:
+    """Retorna o serializador pelo nome; 'auto' usa orjson se instalado, senão json.
+
+    msgpack só é usado quando pedido explicitamente, pois não lê valores JSON
+    gravados antes da troca.
+    """
+    nome = (nome or 'auto').lower()
+    if nome == 'auto':
+        nome = 'orjson' if ORJSON_AVAILABLE else 'json'
+    if nome == 'orjson' and not ORJSON_AVAILABLE:
+        nome = 'json'
+    if nome == 'msgpack' and not MSGPACK_AVAILABLE:
+        nome = 'json'
+    return SERIALIZADORES.get(nome, JsonSerializer)()
+
+class FastJSONProvider(DefaultJSONProvider):
+    """Provider JSON do Flask que usa orjson quando disponível.
+
+    A saída é equivalente à do provider padrão: chaves ordenadas, datas no
+    formato HTTP e Decimal como texto (via ``default`` do Flask). Sem orjson,
+    ou para valores que ele não aceita, usa o caminho padrão.
+    """
+    def dumps(self, obj: Any, **kwargs: Any) -> str:
+        if ORJSON_AVAILABLE and not kwargs.get('cls'):
+            opcoes = orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_NON_STR_KEYS
+            if kwargs.get('sort_keys', self.sort_keys):
+                opcoes |= orjson.OPT_SORT_KEYS
+            if kwargs.get('indent'):
+                opcoes |= orjson.OPT_INDENT_2
+            try:
+                return orjson.dumps(obj, default=kwargs.get('default', self.default), option=opcoes).decode('utf-8')
+            except (orjson.JSONEncodeError, TypeError):
+                pass
+        return super().dumps(obj, **kwargs)
+
+    def loads(self, s: Any, **kwargs: Any) -> Any:
+        if ORJSON_AVAILABLE and not kwargs:
+            try:
+                return orjson.loads(s)
+            except orjson.JSONDecodeError:
+                pass
+        return super().loads(s, **kwargs)
@@ -1,64 +1,348 @@
 """
-Gerenciador de sessões thread-safe
+Gerenciador de sessões de login compartilhado entre os workers
 """
+import os
+import math
+import time
+import sqlite3
+import threading
 from threading import Lock
-from typing import Set, Dict, Optional
-from datetime import datetime, timedelta
+from typing import Set, Dict, List, Optional, Tuple
+from config import active_config
+from utils.cache import cache_manager
+
+class TimingWheel:
+    """Roda de temporização: agenda, cancela e expira chaves em O(1).
+
+    Cada chave fica no slot do seu prazo (em ticks de ``resolucao``
+    segundos); ao avançar, só os slots dos ticks decorridos são visitados.
+    Chaves com prazo além de uma volta completa continuam no slot até a
+    volta certa.
+    """
+    def __init__(self, resolucao: float = 60.0, slots: int = 512):
+        self._resolucao = resolucao
+        self._slots: List[Set[str]] = [set() for _ in range(slots)]
+        self._prazos: Dict[str, int] = {}
+        self._tick = int(time.time() // resolucao)
+
+    def agendar(self, chave: str, expira_em: float):
+        self.cancelar(chave)
+        tick = max(math.ceil(expira_em / self._resolucao), self._tick + 1)
+        self._prazos[chave] = tick
+        self._slots[tick % len(self._slots)].add(chave)
+
+    def cancelar(self, chave: str):
+        tick = self._prazos.pop(chave, None)
+        if tick is not None:
+            self._slots[tick % len(self._slots)].discard(chave)
+
+    def avancar(self, agora: float) -> List[str]:
+        """Retorna (e remove) as chaves cujo prazo já passou"""
+        atual = int(agora // self._resolucao)
+        if atual <= self._tick:
+            return []
+        # Mais de uma volta sem avançar: basta visitar cada slot uma vez
+        ticks = range(max(self._tick + 1, atual - len(self._slots) + 1), atual + 1)
+        self._tick = atual
+
+        expiradas = []
+        for tick in ticks:
+            slot = self._slots[tick % len(self._slots)]
+            for chave in [c for c in slot if self._prazos[c] <= atual]:
+                slot.discard(chave)
+                del self._prazos[chave]
+                expiradas.append(chave)
+        return expiradas
+
+class _Sessao:
+    """Sessão em memória; só ``expira_em`` muda depois de criada (renovação)"""
+    __slots__ = ('nome', 'expira_em')
+
+    def __init__(self, nome: str, expira_em: float):
+        self.nome = nome
+        self.expira_em = expira_em
+
+class MemoriaSessionBackend:
+    """Sessões na memória do processo (um único worker ou desenvolvimento).
+
+    O dicionário de sessões é copy-on-write: escritas montam um novo dicionário
+    sob o lock e trocam a referência, e leituras usam o instantâneo atual sem
+    lock. A roda só é consultada nas escritas e na listagem; uma sessão
+    renovada que chega ao slot antigo é reagendada em vez de removida.
+    """
+    nome = 'memoria'
 
-class SessionManager:
-    """Gerencia sessões de login com thread safety"""
     def __init__(self):
         self._lock = Lock()
-        self._sessions: Dict[str, datetime] = {}
-        self._timeout = timedelta(hours=8)  # Sessão expira em 8h
-        
-    def login(self, user_id: str) -> bool:
-        """Registra login de usuário"""
+        self._sessoes: Dict[str, _Sessao] = {}
+        self._roda = TimingWheel()
+
+    def criar(self, user_id: str, nome: str, timeout: float) -> bool:
         with self._lock:
-            if user_id in self._sessions:
+            sessoes = self._expirar()
+            agora = time.time()
+            atual = sessoes.get(user_id)
+            if atual is not None and atual.expira_em > agora:
                 return False
-            self._sessions[user_id] = datetime.now()
+            expira_em = agora + timeout
+            sessoes[user_id] = _Sessao(nome, expira_em)
+            self._roda.agendar(user_id, expira_em)
+            self._sessoes = sessoes
             return True
-            
-    def logout(self, user_id: str) -> bool:
-        """Registra logout de usuário"""
+
+    def remover(self, user_id: str) -> bool:
         with self._lock:
-            if user_id not in self._sessions:
+            if user_id not in self._sessoes:
                 return False
-            del self._sessions[user_id]
+            sessoes = dict(self._sessoes)
+            del sessoes[user_id]
+            self._roda.cancelar(user_id)
+            self._sessoes = sessoes
             return True
-            
+
+    def obter(self, user_id: str) -> Optional[Tuple[str, float]]:
+        sessao = self._sessoes.get(user_id)
+        if sessao is None or sessao.expira_em <= time.time():
+            return None
+        return sessao.nome, sessao.expira_em
+
+    def renovar(self, user_id: str, expira_em: float):
+        sessao = self._sessoes.get(user_id)
+        if sessao is not None and sessao.expira_em > time.time():
+            sessao.expira_em = expira_em
+
+    def listar(self) -> Dict[str, str]:
+        # Limpeza oportunista: não espera por uma escrita em andamento
+        if self._lock.acquire(blocking=False):
+            try:
+                self._sessoes = self._expirar()
+            finally:
+                self._lock.release()
+        agora = time.time()
+        return {user_id: sessao.nome for user_id, sessao in self._sessoes.items() if sessao.expira_em > agora}
+
+    def limpar(self):
+        with self._lock:
+            self._sessoes = {}
+            self._roda = TimingWheel()
+
+    def _expirar(self) -> Dict[str, _Sessao]:
+        """Cópia do dicionário sem as sessões vencidas (chamar com o lock)"""
+        sessoes = dict(self._sessoes)
+        agora = time.time()
+        for user_id in self._roda.avancar(agora):
+            sessao = sessoes.get(user_id)
+            if sessao is None:
+                continue
+            if sessao.expira_em <= agora:
+                del sessoes[user_id]
+            else:
+                self._roda.agendar(user_id, sessao.expira_em)
+        return sessoes
+
+class SqliteSessionBackend:
+    """Sessões em um arquivo SQLite local, visível a todos os workers do host"""
+    nome = 'sqlite'
+
+    # Intervalo mínimo entre limpezas das sessões expiradas (segundos)
+    INTERVALO_LIMPEZA = 60
+
+    def __init__(self, caminho: str):
+        self._caminho = caminho
+        self._local = threading.local()
+        self._ultima_limpeza = 0.0
+        with self._conexao() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS sessoes ("
+                "user_id TEXT PRIMARY KEY, nome TEXT NOT NULL, expira_em REAL NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS ix_sessoes_expira_em ON sessoes (expira_em)")
+
+    def criar(self, user_id: str, nome: str, timeout: float) -> bool:
+        agora = time.time()
+        with self._conexao() as conn:
+            # Só substitui uma sessão existente se ela já tiver expirado
+            cursor = conn.execute(
+                "INSERT INTO sessoes (user_id, nome, expira_em) VALUES (?, ?, ?) "
+                "ON CONFLICT(user_id) DO UPDATE SET nome = excluded.nome, expira_em = excluded.expira_em "
+                "WHERE sessoes.expira_em <= ?",
+                (user_id, nome, agora + timeout, agora)
+            )
+            return cursor.rowcount > 0
+
+    def remover(self, user_id: str) -> bool:
+        with self._conexao() as conn:
+            return conn.execute("DELETE FROM sessoes WHERE user_id = ?", (user_id,)).rowcount > 0
+
+    def obter(self, user_id: str) -> Optional[Tuple[str, float]]:
+        linha = self._conexao().execute(
+            "SELECT nome, expira_em FROM sessoes WHERE user_id = ? AND expira_em > ?", (user_id, time.time())
+        ).fetchone()
+        return (linha[0], linha[1]) if linha else None
+
+    def renovar(self, user_id: str, expira_em: float):
+        with self._conexao() as conn:
+            conn.execute(
+                "UPDATE sessoes SET expira_em = ? WHERE user_id = ? AND expira_em > ?",
+                (expira_em, user_id, time.time())
+            )
+
+    def listar(self) -> Dict[str, str]:
+        agora = time.time()
+        if agora - self._ultima_limpeza >= self.INTERVALO_LIMPEZA:
+            self._ultima_limpeza = agora
+            with self._conexao() as conn:
+                conn.execute("DELETE FROM sessoes WHERE expira_em <= ?", (agora,))
+        linhas = self._conexao().execute(
+            "SELECT user_id, nome FROM sessoes WHERE expira_em > ?", (agora,)
+        ).fetchall()
+        return dict(linhas)
+
+    def limpar(self):
+        with self._conexao() as conn:
+            conn.execute("DELETE FROM sessoes")
+
+    def _conexao(self) -> sqlite3.Connection:
+        """Uma conexão por thread e por processo (conexões não sobrevivem ao fork)"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self._caminho, timeout=5)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+class RedisSessionBackend:
+    """Sessões no Redis: uma chave com expiração por sessão e um índice ordenado pelo prazo"""
+    nome = 'redis'
+
+    CHAVE_INDICE = 'sessoes:ativas'
+
+    def __init__(self, redis_client):
+        self._redis = redis_client
+
+    def criar(self, user_id: str, nome: str, timeout: float) -> bool:
+        if not self._redis.set(self._chave(user_id), nome, nx=True, ex=max(int(timeout), 1)):
+            return False
+        self._redis.zadd(self.CHAVE_INDICE, {user_id: time.time() + timeout})
+        return True
+
+    def remover(self, user_id: str) -> bool:
+        pipe = self._redis.pipeline()
+        pipe.delete(self._chave(user_id))
+        pipe.zrem(self.CHAVE_INDICE, user_id)
+        return bool(pipe.execute()[0])
+
+    def obter(self, user_id: str) -> Optional[Tuple[str, float]]:
+        pipe = self._redis.pipeline()
+        pipe.get(self._chave(user_id))
+        pipe.pttl(self._chave(user_id))
+        nome, restante_ms = pipe.execute()
+        if nome is None:
+            return None
+        expira_em = time.time() + max(restante_ms, 0) / 1000
+        return (nome.decode() if isinstance(nome, bytes) else nome), expira_em
+
+    def renovar(self, user_id: str, expira_em: float):
+        pipe = self._redis.pipeline()
+        # EXPIRE não recria uma sessão que acabou de expirar ou sair
+        pipe.expireat(self._chave(user_id), int(math.ceil(expira_em)))
+        pipe.zadd(self.CHAVE_INDICE, {user_id: expira_em}, xx=True)
+        pipe.execute()
+
+    def listar(self) -> Dict[str, str]:
+        self._redis.zremrangebyscore(self.CHAVE_INDICE, '-inf', time.time())
+        ids = [i.decode() if isinstance(i, bytes) else i for i in self._redis.zrange(self.CHAVE_INDICE, 0, -1)]
+        if not ids:
+            return {}
+        nomes = self._redis.mget([self._chave(user_id) for user_id in ids])
+        return {
+            user_id: nome.decode() if isinstance(nome, bytes) else nome
+            for user_id, nome in zip(ids, nomes)
+            if nome is not None
+        }
+
+    def limpar(self):
+        ids = self._redis.zrange(self.CHAVE_INDICE, 0, -1)
+        pipe = self._redis.pipeline()
+        for user_id in ids:
+            pipe.delete(self._chave(user_id.decode() if isinstance(user_id, bytes) else user_id))
+        pipe.delete(self.CHAVE_INDICE)
+        pipe.execute()
+
+    @staticmethod
+    def _chave(user_id: str) -> str:
+        return f"sessao:{user_id}"
+
+def criar_backend(nome: str = 'auto'):
+    """Escolhe o backend: Redis se configurado, senão SQLite compartilhado, senão memória"""
+    nome = (nome or 'auto').lower()
+    if nome in ('auto', 'redis') and cache_manager.redis_client:
+        return RedisSessionBackend(cache_manager.redis_client)
+    if nome in ('auto', 'redis', 'sqlite'):
+        try:
+            return SqliteSessionBackend(active_config.SESSAO_ARQUIVO)
+        except sqlite3.Error:
+            pass
+    return MemoriaSessionBackend()
+
+class SessionManager:
+    """Gerencia sessões de login, compartilhadas entre os workers pelo backend.
+
+    Com ``deslizante`` a sessão é renovada pelo uso: cada verificação que
+    encontra menos da metade do prazo restante estende a expiração por mais
+    ``timeout_horas``. Assim a renovação custa uma escrita a cada meio prazo,
+    não uma por requisição.
+    """
+    def __init__(self, backend=None, timeout_horas: float = 8, deslizante: bool = True):
+        self._backend = backend or MemoriaSessionBackend()
+        self._timeout = timeout_horas * 3600  # Sessão expira em 8h
+        self._deslizante = deslizante
+
+    @property
+    def backend(self) -> str:
+        return self._backend.nome
+
+    def login(self, user_id: str, nome: Optional[str] = None) -> bool:
+        """Registra login de usuário; False se já havia sessão ativa"""
+        return self._backend.criar(user_id, nome or '', self._timeout)
+
+    def logout(self, user_id: str) -> bool:
+        """Registra logout de usuário"""
+        return self._backend.remover(user_id)
+
     def is_logged_in(self, user_id: str) -> bool:
         """Verifica se usuário está logado"""
-        with self._lock:
-            if user_id not in self._sessions:
-                return False
-            # Verificar timeout
-            if datetime.now() - self._sessions[user_id] > self._timeout:
-                del self._sessions[user_id]
-                return False
-            return True
-            
+        return self.get_nome(user_id) is not None
+
+    def get_nome(self, user_id: str) -> Optional[str]:
+        """Nome guardado na sessão do usuário, ou None se não estiver logado"""
+        sessao = self._backend.obter(user_id)
+        if sessao is None:
+            return None
+        nome, expira_em = sessao
+        if self._deslizante:
+            agora = time.time()
+            if expira_em - agora < self._timeout / 2:
+                self._backend.renovar(user_id, agora + self._timeout)
+        return nome
+
     def get_active_sessions(self) -> Set[str]:
         """Retorna IDs dos usuários com sessão ativa"""
-        with self._lock:
-            now = datetime.now()
-            active = {
-                user_id
-                for user_id, login_time in self._sessions.items()
-                if now - login_time <= self._timeout
-            }
-            # Limpar sessões expiradas
-            expired = set(self._sessions.keys()) - active
-            for user_id in expired:
-                del self._sessions[user_id]
-            return active
-            
+        return set(self._backend.listar())
+
+    def get_sessoes(self) -> Dict[str, str]:
+        """Retorna {id: nome} dos usuários com sessão ativa"""
+        return self._backend.listar()
+
     def clear_all(self):
         """Limpa todas as sessões"""
-        with self._lock:
-            self._sessions.clear()
+        self._backend.limpar()
 
 # Instância global
-session_manager = SessionManager()
-
+session_manager = SessionManager(
+    criar_backend(active_config.SESSAO_BACKEND),
+    timeout_horas=active_config.SESSAO_TIMEOUT_HORAS,
+    deslizante=active_config.SESSAO_DESLIZANTE
+)
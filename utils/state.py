@@ -1,6 +0,0 @@
-"""
-Estado compartilhado da aplicação
-"""
-
-# Controle de funcionários logados (thread-safe)
-funcionarios_logados = set()